@@ -0,0 +1,86 @@
+"""
+アルバムリスト用のモデル
+
+AlbumIndex の追加・更新・削除通知を行単位で反映し、
+リスト全体の作り直し（選択状態やスクロール位置のリセット）を避ける。
+"""
+import bisect
+import os
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex
+
+
+class AlbumListModel(QAbstractListModel):
+    """アルバムフォルダ名順に並ぶアルバムリストのモデル"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._folders: list[str] = []
+        self._sort_keys: list[str] = []
+        self._names: dict[str, str] = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._folders)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or not (0 <= index.row() < len(self._folders)):
+            return None
+        folder = self._folders[index.row()]
+        if role == Qt.DisplayRole:
+            return self._names.get(folder, "")
+        if role == Qt.UserRole:
+            return folder
+        return None
+
+    def row_of(self, album_folder: str) -> int:
+        """アルバムフォルダの行番号を取得（無ければ -1）"""
+        key = self._sort_key(album_folder)
+        row = bisect.bisect_left(self._sort_keys, key)
+        if row < len(self._folders) and self._folders[row] == album_folder:
+            return row
+        return -1
+
+    def index_of(self, album_folder: str) -> QModelIndex:
+        """アルバムフォルダの QModelIndex を取得"""
+        row = self.row_of(album_folder)
+        return self.index(row, 0) if row >= 0 else QModelIndex()
+
+    def add_album(self, album_folder: str, display_name: str):
+        """行を挿入（既存なら更新）"""
+        if self.row_of(album_folder) >= 0:
+            self.update_album(album_folder, display_name)
+            return
+        key = self._sort_key(album_folder)
+        row = bisect.bisect_right(self._sort_keys, key)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._folders.insert(row, album_folder)
+        self._sort_keys.insert(row, key)
+        self._names[album_folder] = display_name
+        self.endInsertRows()
+
+    def update_album(self, album_folder: str, display_name: str):
+        """該当行の表示名のみ更新"""
+        row = self.row_of(album_folder)
+        if row < 0:
+            self.add_album(album_folder, display_name)
+            return
+        self._names[album_folder] = display_name
+        idx = self.index(row, 0)
+        self.dataChanged.emit(idx, idx, [Qt.DisplayRole])
+
+    def remove_album(self, album_folder: str):
+        """行を削除"""
+        row = self.row_of(album_folder)
+        if row < 0:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._folders[row]
+        del self._sort_keys[row]
+        self._names.pop(album_folder, None)
+        self.endRemoveRows()
+
+    @staticmethod
+    def _sort_key(album_folder: str) -> str:
+        # 同名キー衝突時も一意になるようフルパスを付加
+        return os.path.basename(album_folder).lower() + "\0" + album_folder
@@ -10,8 +10,12 @@ from PySide6.QtWidgets import (
 from PySide6.QtCore import QThread, Signal
 
 from logic.config_manager import ConfigManager
+from logic.encode_cache import EncodeCache
+from logic.encoders import EncodeRunner, get_encoder, get_worker_count, plan_album_jobs, PROFILES
+from logic.transcode_fanout import FanoutTranscoder, FlacDecoder, group_jobs
 from logic.workflow_manager import WorkflowManager
 from logic.log_manager import get_logger
+from logic.metadata_cache import get_cache, release_cache
 
 
 class BatchProcessWorker(QThread):
@@ -20,17 +24,23 @@ class BatchProcessWorker(QThread):
     album_completed = Signal(str, bool, str)  # album_name, success, error_msg
     all_completed = Signal(int, int)  # success_count, fail_count
     
-    def __init__(self, album_folders, config, start_step=4, end_step=7):
+    def __init__(self, album_folders, config, start_step=4, end_step=7, catalog=None):
         super().__init__()
         self.album_folders = album_folders
         self.config = config
+        self.catalog = catalog
         self.start_step = start_step
         self.end_step = end_step
         self.should_stop = False
+        self._current_index = 0
+        self._encode_runner = None
     
     def stop(self):
-        """処理を停止"""
+        """処理を停止（実行中のエンコードも中断）"""
         self.should_stop = True
+        runner = self._encode_runner
+        if runner is not None:
+            runner.cancel()
     
     def run(self):
         """一括処理を実行"""
@@ -42,8 +52,15 @@ class BatchProcessWorker(QThread):
                 break
             
             album_name = os.path.basename(album_folder)
+            self._current_index = idx
             self.progress.emit(idx, len(self.album_folders), f"処理中: {album_name}")
             
+            # カタログ上で対象ステップが全て完了済みなら state.json を開かずに済ませる
+            if self._is_range_completed_in_catalog(album_folder):
+                self.album_completed.emit(album_name, True, "")
+                success_count += 1
+                continue
+            
             # ワークフローマネージャーを作成
             workflow = WorkflowManager(self.config)
             if not workflow.load_album(album_folder):
@@ -93,20 +110,171 @@ class BatchProcessWorker(QThread):
                 self.album_completed.emit(album_name, False, f"予期しないエラー: {e}")
                 fail_count += 1
                 logger.error("batch", f"予期しないエラー: {album_name} - {e}")
+            finally:
+                # 次のアルバムでは使わないので保存して手放す
+                release_cache(album_folder)
         
         self.all_completed.emit(success_count, fail_count)
     
+    _STEP_KEYS = {
+        4: "step4_aac",
+        5: "step5_opus",
+        6: "step6_artwork",
+        7: "step7_transfer",
+    }
+    
+    def _is_range_completed_in_catalog(self, album_folder):
+        """カタログで処理範囲の完了フラグが全て立っているか"""
+        if not self.catalog:
+            return False
+        try:
+            self.catalog.sync_album(album_folder)
+            album = self.catalog.get_album(album_folder)
+        except Exception as e:
+            print(f"[WARN] カタログの参照に失敗: {e}")
+            return False
+        if not album:
+            return False
+        keys = [self._STEP_KEYS[s] for s in range(self.start_step, self.end_step + 1) if s in self._STEP_KEYS]
+        return all(k in album["completed_steps"] for k in keys)
+    
     def _process_step4(self, workflow, album_folder, album_name):
-        """Step4: AAC変換を実行（自動一括処理はサポートされていません）"""
+        """Step4: AAC変換を実行（[Paths] AacEncoder 未設定なら自動一括処理はできません）"""
         if workflow.state.is_step_completed("step4_aac"):
             return True
-        return False
+        # Step5 も続けて行うなら、デコード1回で AAC と Opus を同時に作る
+        if self.start_step <= 5 <= self.end_step and not workflow.state.is_step_completed("step5_opus"):
+            if self._run_fanout(workflow, album_folder, album_name, ["aac", "opus"]):
+                return workflow.state.is_step_completed("step4_aac")
+        return self._run_encoder(workflow, album_folder, album_name, "aac")
     
     def _process_step5(self, workflow, album_folder, album_name):
-        """Step5: Opus変換を実行（自動一括処理はサポートされていません）"""
+        """Step5: Opus変換を実行（[Paths] OpusEncoder 未設定なら自動一括処理はできません）"""
         if workflow.state.is_step_completed("step5_opus"):
             return True
-        return False
+        return self._run_encoder(workflow, album_folder, album_name, "opus")
+    
+    def _run_fanout(self, workflow, album_folder, album_name, codecs):
+        """
+        1回のデコードを複数エンコーダーに配って変換し、全件成功したコーデックをステップ完了にする
+        
+        Returns:
+            同時変換を実行したか（無効・準備不足なら False を返し、呼び出し側は個別変換に戻る）
+        """
+        if str(self.config.get_setting("TranscodeFanout", "1")).strip() not in ("1", "true", "True"):
+            return False
+        flac_path = self.config.get_tool_path("Flac")
+        if not flac_path:
+            return False
+        encoders = {codec: get_encoder(self.config, codec, pipe=True) for codec in codecs}
+        if any(e is None for e in encoders.values()):
+            return False
+        
+        planned = {}
+        for codec in codecs:
+            jobs, missing = plan_album_jobs(workflow.state, album_folder, codec)
+            if missing or not jobs:
+                return False  # エラー表示は個別変換側に任せる
+            planned[codec] = jobs
+        
+        # 音声が変わっていないトラックは変換済みファイルのタグ書き直しで済ませる
+        cache = EncodeCache(album_folder)
+        pending = {}
+        results = []
+        for codec in codecs:
+            pending[codec], reused = cache.reuse(encoders[codec], planned[codec])
+            results.extend(reused)
+        
+        logger = get_logger()
+        labels = "+".join(PROFILES[c].label for c in codecs)
+        total_albums = len(self.album_folders)
+        
+        def on_item(done, total, results):
+            name = results[0].job.label if results else ""
+            self.progress.emit(self._current_index, total_albums, f"{album_name}: {labels} {done}/{total} {name}")
+        
+        fanout_jobs = group_jobs([(encoders[c], pending[c]) for c in codecs])
+        runner = FanoutTranscoder(FlacDecoder(flac_path), fanout_jobs, get_worker_count(self.config), album_folder)
+        self._encode_runner = runner
+        try:
+            if self.should_stop:
+                return True
+            results.extend(runner.run(progress_callback=on_item))
+        finally:
+            self._encode_runner = None
+        
+        # 結果は出力パスでコーデックに振り分ける
+        by_output = {os.path.abspath(r.job.output_path): r for r in results}
+        for codec in codecs:
+            codec_results = [by_output.get(os.path.abspath(j.output_path)) for j in planned[codec]]
+            cache.record(encoders[codec], [r for r in codec_results if r is not None])
+            failed = [r for r in codec_results if r is None or not r.success]
+            for r in failed:
+                if r is not None and not r.cancelled:
+                    logger.error("batch", f"{PROFILES[codec].label} 変換失敗: {r.job.label}: {r.message}")
+            if not failed and not runner.is_cancelled():
+                workflow.state.mark_step_completed(PROFILES[codec].step_key)
+                logger.info("batch", f"{PROFILES[codec].label} 変換完了（同時変換）: {album_name} ({len(codec_results)} 件)")
+        cache.save()
+        get_cache(album_folder).save()
+        return True
+    
+    def _run_encoder(self, workflow, album_folder, album_name, codec):
+        """ヘッドレスエンコーダーでアルバム全トラックを変換し、全件成功ならステップ完了にする"""
+        profile = PROFILES[codec]
+        logger = get_logger()
+        encoder = get_encoder(self.config, codec)
+        if encoder is None:
+            print(f"[WARN] {profile.label}: [Paths] {profile.tool_key} が未設定のため自動変換できません")
+            logger.error("batch", f"{profile.label} エンコーダー未設定: {album_name}")
+            return False
+        
+        jobs, missing = plan_album_jobs(workflow.state, album_folder, codec)
+        if missing:
+            for name in missing:
+                print(f"[ERROR] {profile.label}: 入力ファイルが見つかりません: {name}")
+            logger.error("batch", f"{profile.label} 入力不足 ({len(missing)} 件): {album_name}")
+            return False
+        if not jobs:
+            print(f"[WARN] {profile.label}: 変換対象のトラックがありません: {album_name}")
+            return False
+        
+        total_albums = len(self.album_folders)
+        
+        def on_item(done, total, result):
+            self.progress.emit(
+                self._current_index, total_albums,
+                f"{album_name}: {profile.label} {done}/{total} {result.job.label}"
+            )
+        
+        # 音声が変わっていないトラックは変換済みファイルのタグ書き直しで済ませる
+        cache = EncodeCache(album_folder)
+        jobs, results = cache.reuse(encoder, jobs)
+        
+        runner = EncodeRunner(encoder, jobs, get_worker_count(self.config), album_folder)
+        self._encode_runner = runner
+        try:
+            if self.should_stop:
+                return False
+            results.extend(runner.run(progress_callback=on_item))
+        finally:
+            self._encode_runner = None
+        
+        cache.record(encoder, results)
+        cache.save()
+        get_cache(album_folder).save()
+        
+        failed = [r for r in results if not r.success]
+        skipped = sum(1 for r in results if r.skipped)
+        if failed or runner.is_cancelled():
+            for r in failed:
+                if not r.cancelled:
+                    logger.error("batch", f"{profile.label} 変換失敗: {r.job.label}: {r.message}")
+            return False
+        
+        workflow.state.mark_step_completed(profile.step_key)
+        logger.info("batch", f"{profile.label} 変換完了: {album_name} ({len(results)} 件, 変換済みスキップ {skipped} 件)")
+        return True
     
     def _process_step6(self, workflow, album_folder, album_name):
         """Step6: Artwork最適化を実行（自動一括処理はサポートされていません）"""
@@ -124,10 +292,11 @@ class BatchProcessWorker(QThread):
 class BatchProcessDialog(QDialog):
     """一括処理ダイアログ"""
     
-    def __init__(self, album_folders, config: ConfigManager, parent=None):
+    def __init__(self, album_folders, config: ConfigManager, parent=None, catalog=None):
         super().__init__(parent)
         self.album_folders = album_folders
         self.config = config
+        self.catalog = catalog
         self.worker = None
         
         self.setWindowTitle("一括処理 (Step4~7)")
@@ -242,7 +411,9 @@ class BatchProcessDialog(QDialog):
         self.close_button.setEnabled(False)
         
         # ワーカースレッド起動
-        self.worker = BatchProcessWorker(self.album_folders, self.config, start_step, end_step)
+        self.worker = BatchProcessWorker(
+            self.album_folders, self.config, start_step, end_step, catalog=self.catalog
+        )
         self.worker.progress.connect(self.on_progress)
         self.worker.album_completed.connect(self.on_album_completed)
         self.worker.all_completed.connect(self.on_all_completed)
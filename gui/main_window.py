@@ -7,16 +7,19 @@
 import os
 from PySide6.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QListWidget, QStackedWidget, QToolBar, QPushButton,
-    QStatusBar, QMessageBox, QLabel, QListWidgetItem
+    QListView, QStackedWidget, QToolBar, QPushButton,
+    QStatusBar, QMessageBox, QLabel
 )
-from PySide6.QtCore import Qt, QTimer
+from PySide6.QtCore import Qt
 from PySide6.QtGui import QAction
 from send2trash import send2trash
 
 from logic.config_manager import ConfigManager
 from logic.workflow_manager import WorkflowManager
 from logic.state_manager import StateManager
+from logic.album_index import AlbumIndex
+from logic.album_catalog import AlbumCatalog
+from gui.album_list_model import AlbumListModel
 
 # ステップパネルのインポート(後で実装)
 from gui.step_panels.step0_music_center import Step0MusicCenterPanel
@@ -41,12 +44,16 @@ class MainWindow(QMainWindow):
         self.current_album_folder = None
         
         self.init_ui()
-        self.refresh_album_list()
         
-        # 定期的にアルバムリストを更新（5秒ごと）
-        self.refresh_timer = QTimer()
-        self.refresh_timer.timeout.connect(self.refresh_album_list)
-        self.refresh_timer.start(5000)
+        # アルバム状態カタログ（WorkDir 直下の SQLite）
+        self.catalog = self._open_catalog(self.config.get_directory("WorkDir"))
+        
+        # アルバムリストは変更監視で差分更新（定期フル再スキャンは行わない）
+        self.album_index = AlbumIndex(self.config.get_directory("WorkDir"), self.catalog, self)
+        self.album_index.album_added.connect(self.album_model.add_album)
+        self.album_index.album_updated.connect(self.album_model.update_album)
+        self.album_index.album_removed.connect(self.on_album_removed)
+        self.album_index.start()
     
     def init_ui(self):
         """UIを初期化"""
@@ -62,9 +69,11 @@ class MainWindow(QMainWindow):
         main_widget.setLayout(main_layout)
         
         # 左ペイン: アルバムリスト
-        self.album_list = QListWidget()
+        self.album_model = AlbumListModel(self)
+        self.album_list = QListView()
+        self.album_list.setModel(self.album_model)
         self.album_list.setMaximumWidth(350)
-        self.album_list.currentItemChanged.connect(self.on_album_selected)
+        self.album_list.selectionModel().currentChanged.connect(self.on_album_selected)
         main_layout.addWidget(self.album_list)
         
         # 右ペイン: 作業エリア
@@ -180,59 +189,41 @@ class MainWindow(QMainWindow):
         self.step7_transfer_panel.step_completed.connect(self.on_step_completed)
         self.step_stack.addWidget(self.step7_transfer_panel)
     
-    def refresh_album_list(self):
-        """アルバムリストを更新"""
-        work_dir = self.config.get_directory("WorkDir")
-        
-        if not work_dir or not os.path.exists(work_dir):
-            return
-        
-        # 現在の選択を保存
-        current_selection = None
-        if self.album_list.currentItem():
-            current_selection = self.album_list.currentItem().data(Qt.UserRole)
-        
-        # 自動リフレッシュ時のチラつき/選択変更イベント抑止
-        self.album_list.blockSignals(True)
-        self.album_list.clear()
-        
-        # work フォルダ内のサブフォルダをスキャン
+    def _open_catalog(self, work_dir: str):
+        """WorkDir のカタログを開く（開けない場合は None）"""
+        if not work_dir or not os.path.isdir(work_dir):
+            return None
         try:
-            for item in os.listdir(work_dir):
-                item_path = os.path.join(work_dir, item)
-                if not os.path.isdir(item_path):
-                    continue
-                
-                # state.json があるフォルダのみ表示
-                state_path = os.path.join(item_path, "state.json")
-                if not os.path.exists(state_path):
-                    continue
-                
-                # state.json を読み込んで表示名を生成
-                state = StateManager(item_path)
-                if state.load():
-                    # WorkflowManager を一時的に作成して表示名を取得
-                    temp_workflow = WorkflowManager(self.config)
-                    temp_workflow.load_album(item_path)
-                    display_name = temp_workflow.get_album_display_name()
-                    
-                    list_item = QListWidgetItem(display_name)
-                    list_item.setData(Qt.UserRole, item_path)
-                    self.album_list.addItem(list_item)
-                    
-                    # 以前の選択を復元
-                    if item_path == current_selection:
-                        self.album_list.setCurrentItem(list_item)
-        
+            return AlbumCatalog(work_dir)
         except Exception as e:
-            print(f"[ERROR] アルバムリストの更新に失敗: {e}")
+            print(f"[WARN] アルバムカタログを開けませんでした: {e}")
+            return None
+    
+    def refresh_album_list(self):
+        """アルバムリストを更新（state.json が変化したアルバムのみ読み直す）"""
+        self.album_index.refresh()
+    
+    def on_album_removed(self, album_folder: str):
+        """アルバムがリストから消えたときの処理"""
+        # 行削除に伴う選択移動で別アルバムが読み込まれないよう抑止
+        selection_model = self.album_list.selectionModel()
+        selection_model.blockSignals(True)
+        try:
+            self.album_model.remove_album(album_folder)
         finally:
-            self.album_list.blockSignals(False)
+            selection_model.blockSignals(False)
+    
+    def _selected_album_folder(self):
+        """リストで選択中のアルバムフォルダを取得"""
+        index = self.album_list.currentIndex()
+        if not index.isValid():
+            return None
+        return index.data(Qt.UserRole)
     
     def on_album_selected(self, current, previous):
         """アルバムが選択されたときの処理"""
         print("[DEBUG] on_album_selected called")
-        if not current:
+        if not current.isValid():
             print("[DEBUG] current is None")
             return
         
@@ -306,13 +297,11 @@ class MainWindow(QMainWindow):
             if not advanced:
                 print("[WARN] advance_step returned False at Step1")
 
-        # リスト更新（シグナル再発火抑止のため blockSignals 中で選択復元）
+        # リスト更新後に取り込んだアルバムを選択
         self.refresh_album_list()
-        for i in range(self.album_list.count()):
-            item = self.album_list.item(i)
-            if item.data(Qt.UserRole) == album_folder:
-                self.album_list.setCurrentItem(item)
-                break
+        index = self.album_model.index_of(album_folder)
+        if index.isValid():
+            self.album_list.setCurrentIndex(index)
 
         # 念のため現在ステップを再評価し表示パネルを強制同期
         step = self.workflow.get_current_step()
@@ -378,6 +367,12 @@ class MainWindow(QMainWindow):
         if dialog.exec():
             # 設定が保存された場合、config を再読み込み
             self.config.load()
+            work_dir = self.config.get_directory("WorkDir")
+            if os.path.abspath(work_dir or "") != os.path.abspath(self.album_index.work_dir or ""):
+                if self.catalog:
+                    self.catalog.close()
+                self.catalog = self._open_catalog(work_dir)
+                self.album_index.set_work_dir(work_dir, self.catalog)
             self.status_bar.showMessage("設定を更新しました", 3000)
     
     def on_show_log_viewer(self):
@@ -403,15 +398,19 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "一括処理", "作業フォルダ (WorkDir) が設定されていません。")
             return
         
-        # アルバムフォルダを収集（state.jsonがあるもの）
+        # カタログから Step4~7 の未完了アルバムを取得（変化した state.json だけ同期）
         album_folders = []
         try:
-            for item_name in os.listdir(work_dir):
-                item_path = os.path.join(work_dir, item_name)
-                if os.path.isdir(item_path):
-                    state_file = os.path.join(item_path, "state.json")
-                    if os.path.exists(state_file):
-                        album_folders.append(item_path)
+            if self.catalog:
+                self.catalog.sync_all()
+                album_folders = [a["album_folder"] for a in self.catalog.albums_in_step_range(4, 7)]
+            else:
+                for item_name in os.listdir(work_dir):
+                    item_path = os.path.join(work_dir, item_name)
+                    if os.path.isdir(item_path):
+                        state_file = os.path.join(item_path, "state.json")
+                        if os.path.exists(state_file):
+                            album_folders.append(item_path)
         except Exception as e:
             QMessageBox.critical(self, "エラー", f"アルバム一覧の取得に失敗しました:\n{e}")
             return
@@ -422,7 +421,7 @@ class MainWindow(QMainWindow):
         
         # 一括処理ダイアログを表示
         from gui.batch_process_dialog import BatchProcessDialog
-        dialog = BatchProcessDialog(album_folders, self.config, self)
+        dialog = BatchProcessDialog(album_folders, self.config, self, catalog=self.catalog)
         if dialog.exec():
             # 完了後、アルバムリストを再スキャン
             self.refresh_album_list()
@@ -431,14 +430,15 @@ class MainWindow(QMainWindow):
     def on_rollback_step(self):
         """選択中アルバムを前のステップに戻す"""
         # 対象取得
-        target_folder = None
-        selected = self.album_list.currentItem()
-        if selected:
-            target_folder = selected.data(Qt.UserRole)
+        target_folder = self._selected_album_folder()
         if not target_folder:
             # 現在表示中のアルバムフォルダを利用
             target_folder = self.current_album_folder
         
+        # 表示中アルバムの保留中の変更を先に書き出す
+        if self.workflow.state:
+            self.workflow.state.flush()
+        
         if not target_folder or not os.path.isdir(target_folder):
             QMessageBox.warning(self, "ロールバック", "ロールバックするアルバムを左のリストから選択してください。")
             return
@@ -481,14 +481,15 @@ class MainWindow(QMainWindow):
         
         # ロールバック実行
         try:
-            # 現在のステップの完了フラグをクリア
-            step_key = f"step{current_step}_completed"
-            if step_key in temp_workflow.state.state.get("completedSteps", {}):
-                del temp_workflow.state.state["completedSteps"][step_key]
-            
-            # ステップを戻す
-            temp_workflow.state.set_current_step(prev_step)
-            temp_workflow.state.save()
+            with temp_workflow.state.transaction():
+                # 現在のステップの完了フラグをクリア
+                step_key = f"step{current_step}_completed"
+                if step_key in temp_workflow.state.state.get("completedSteps", {}):
+                    del temp_workflow.state.state["completedSteps"][step_key]
+                    temp_workflow.state.mark_dirty()
+                
+                # ステップを戻す
+                temp_workflow.state.set_current_step(prev_step)
             
             # UIを更新
             self.refresh_album_list()
@@ -535,10 +536,7 @@ class MainWindow(QMainWindow):
     def on_discard_album(self):
         """選択中アルバムの作業フォルダをゴミ箱へ移動（作業破棄）"""
         # 対象取得
-        target_folder = None
-        selected = self.album_list.currentItem()
-        if selected:
-            target_folder = selected.data(Qt.UserRole)
+        target_folder = self._selected_album_folder()
         if not target_folder:
             # 現在表示中のアルバムフォルダを利用
             target_folder = self.current_album_folder
@@ -596,8 +594,15 @@ class MainWindow(QMainWindow):
         )
         
         if reply == QMessageBox.Yes:
-            # タイマーを停止
-            self.refresh_timer.stop()
+            # 保留中の state.json 変更を書き出す
+            if self.workflow.state:
+                self.workflow.state.flush()
+            # Demucs キューを止める（次回起動時に再開）
+            self.step2_panel.shutdown()
+            # 監視を停止
+            self.album_index.stop()
+            if self.catalog:
+                self.catalog.close()
             event.accept()
         else:
             event.ignore()
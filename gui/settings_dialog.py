@@ -250,6 +250,23 @@ class SettingsDialog(QDialog):
         self.quality_spins["ResizeWidth"] = spin_width
         form.addRow("リサイズ幅:", spin_width)
         
+        # 容量予算（埋め込み用。品質を上限として予算に収まるまで下げる）
+        for key, label in (("ArtworkJpegBudgetKB", "JPEG 容量予算:"), ("ArtworkWebpBudgetKB", "WebP 容量予算:")):
+            spin_budget = QSpinBox()
+            spin_budget.setRange(0, 5000)
+            spin_budget.setValue(0)
+            spin_budget.setSuffix(" KB")
+            spin_budget.setSpecialValueText("なし（品質固定）")
+            spin_budget.setToolTip("全トラックに埋め込む cover の1ファイルあたりの上限。品質を上限として予算に収まるまで下げます")
+            self.quality_spins[key] = spin_budget
+            form.addRow(label, spin_budget)
+        
+        # 追加サイズ（機器用サムネイル・保存用など）
+        self.edit_extra_sizes = QLineEdit()
+        self.edit_extra_sizes.setPlaceholderText("例: 300, 1200（空欄なら追加しない）")
+        self.edit_extra_sizes.setToolTip("_artwork_resized に cover_<幅>.jpg / .webp として追加で書き出します（埋め込みには使いません）")
+        form.addRow("追加サイズ:", self.edit_extra_sizes)
+        
         layout.addLayout(form)
         layout.addStretch()
         
@@ -385,6 +402,9 @@ class SettingsDialog(QDialog):
         self.quality_spins["JpegQuality"].setValue(int(self.config.get_setting("JpegQuality", "85")))
         self.quality_spins["WebpQuality"].setValue(int(self.config.get_setting("WebpQuality", "85")))
         self.quality_spins["ResizeWidth"].setValue(int(self.config.get_setting("ResizeWidth", "600")))
+        self.quality_spins["ArtworkJpegBudgetKB"].setValue(int(self.config.get_setting("ArtworkJpegBudgetKB", "0") or 0))
+        self.quality_spins["ArtworkWebpBudgetKB"].setValue(int(self.config.get_setting("ArtworkWebpBudgetKB", "0") or 0))
+        self.edit_extra_sizes.setText(self.config.get_setting("ArtworkExtraSizes", "") or "")
         
         # Demucs キーワード
         keywords = self.config.get_demucs_keywords()
@@ -484,6 +504,9 @@ class SettingsDialog(QDialog):
             self.config.config['Settings']['JpegQuality'] = jpeg_val
             self.config.config['Settings']['WebpQuality'] = webp_val
             self.config.config['Settings']['ResizeWidth'] = width_val
+            self.config.config['Settings']['ArtworkJpegBudgetKB'] = str(self.quality_spins["ArtworkJpegBudgetKB"].value())
+            self.config.config['Settings']['ArtworkWebpBudgetKB'] = str(self.quality_spins["ArtworkWebpBudgetKB"].value())
+            self.config.config['Settings']['ArtworkExtraSizes'] = self.edit_extra_sizes.text().strip()
             
             # Demucs キーワード
             if 'Demucs' not in self.config.config:
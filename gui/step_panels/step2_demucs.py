@@ -2,25 +2,86 @@
 Step 2: Demucs処理パネル
 """
 import os
+from typing import Optional
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
     QLabel, QFileDialog, QMessageBox, QListWidget,
     QListWidgetItem, QCheckBox, QProgressDialog
 )
-from PySide6.QtCore import Signal, Qt, QUrl
+from PySide6.QtCore import Signal, Qt, QUrl, QThread, QTimer
 from PySide6.QtGui import QDesktopServices
 
 from logic.config_manager import ConfigManager
+from logic.state_manager import StateManager
 from logic.workflow_manager import WorkflowManager
-from logic.demucs_detector import detect_demucs_targets, extract_instrumental_files
+from logic.demucs_detector import detect_demucs_targets, iter_instrumental_files
+from logic.keyword_engine import get_keyword_engine
 from logic.utils import sanitize_foldername
 from logic.external_tools import ExternalToolRunner
+from logic.instrumental_import import (
+    InstrumentalImporter, ImportJob, apply_import_results, instrumental_output_path
+)
+from logic.demucs_queue import DemucsQueue, DemucsQueueRunner, get_concurrency, get_demucs_command
+from logic.stem_watcher import StemWatcher
+
+
+class InstrumentalImportWorker(QThread):
+    """インスト取り込み（WAV→FLAC変換・タグコピー）をバックグラウンドで実行"""
+
+    item_finished = Signal(int, int, str, bool)  # done, total, song_name, success
+
+    def __init__(self, importer: InstrumentalImporter, parent=None,
+                 streaming: Optional[InstrumentalImporter] = None):
+        super().__init__(parent)
+        self.importer = importer
+        # 監視中に取り込みを始めたもの（終わるのを待つだけ。結果は streamed_results）
+        self.streaming = streaming
+        self.results = []
+        self.streamed_results = []
+
+    def run(self):
+        self.results = self.importer.run(self._on_progress)
+        if self.streaming is not None:
+            self.streamed_results = self.streaming.wait()
+
+    def cancel(self):
+        self.importer.cancel()
+        if self.streaming is not None:
+            self.streaming.cancel()
+
+    def _on_progress(self, done: int, total: int, result):
+        self.item_finished.emit(done, total, result.job.song_name, result.success)
+
+
+class DemucsQueueWorker(QThread):
+    """Demucs キュー（分離・取り込み）をバックグラウンドで実行"""
+
+    track_finished = Signal(str, str, bool, str)  # album_name, song_name, success, message
+    album_imported = Signal(str, str, object)  # album_folder, album_name, results
+
+    def __init__(self, runner: DemucsQueueRunner, parent=None):
+        super().__init__(parent)
+        self.runner = runner
+
+    def run(self):
+        self.runner.run(self._on_track_finished, self._on_album_imported)
+
+    def cancel(self):
+        self.runner.cancel()
+
+    def _on_track_finished(self, job, track, success: bool, message: str):
+        self.track_finished.emit(job.album_name, track.name, success, message)
+
+    def _on_album_imported(self, job, results):
+        self.album_imported.emit(job.album_folder, job.album_name, results)
 
 
 class Step2DemucsPanel(QWidget):
     """Step 2: Demucs処理パネル"""
     
     step_completed = Signal()
+    # 逐次取り込みの1件完了（ワーカースレッドから UI スレッドへ渡す）
+    _stream_item_finished = Signal(object)
     
     def __init__(self, config: ConfigManager, workflow: WorkflowManager):
         super().__init__()
@@ -28,7 +89,20 @@ class Step2DemucsPanel(QWidget):
         self.workflow = workflow
         self.album_folder = None
         self.tool_runner = ExternalToolRunner()
+        self._import_worker = None
+        self._demucs_queue = None
+        self._queue_worker = None
+        self._queue_last_message = ""
+        # Demucs 出力の監視と逐次取り込み
+        self._stem_watcher = None
+        self._stream_importer = None
+        self._streamed = {}  # song_name -> ImportResult（変換中は None）
+        # チェック操作用にジャーナル・遅延保存を有効にしている StateManager（Step2 表示中のみ）
+        self._session_state = None
+        self._stream_item_finished.connect(self._on_stream_item_finished)
         self.init_ui()
+        # 前回終了時に残っていたキューを再開
+        QTimer.singleShot(0, self._resume_demucs_queue)
     
     def init_ui(self):
         """UIを初期化"""
@@ -98,6 +172,16 @@ class Step2DemucsPanel(QWidget):
         self.demucs_button.clicked.connect(self.on_demucs_execute)
         action_layout.addWidget(self.demucs_button)
 
+        # Demucs キュー（コマンドライン版でバックグラウンド処理）
+        self.queue_button = QPushButton("キューに追加")
+        self.queue_button.setToolTip(
+            "コマンドライン版 Demucs (config.ini の DemucsCli) でバックグラウンド処理し、\n"
+            "終わったアルバムから自動でインスト版を取り込みます"
+        )
+        self.queue_button.setEnabled(False)
+        self.queue_button.clicked.connect(self.on_enqueue_demucs)
+        action_layout.addWidget(self.queue_button)
+
         # Colabリンクボタン（Demucs外部実行用サポート）
         self.colab_button = QPushButton("Colabを開く")
         self.colab_button.setToolTip("推奨: Google Colab上でDemucsを実行します")
@@ -124,11 +208,22 @@ class Step2DemucsPanel(QWidget):
         action_layout.addStretch()
         
         layout.addLayout(action_layout)
+
+        self.queue_status_label = QLabel("")
+        self.queue_status_label.setWordWrap(True)
+        layout.addWidget(self.queue_status_label)
+
+        # 監視による自動取り込みの状況
+        self.watch_status_label = QLabel("")
+        self.watch_status_label.setWordWrap(True)
+        layout.addWidget(self.watch_status_label)
         layout.addStretch()
     
     def load_album(self, album_folder: str):
         """アルバムを読み込み"""
         print("[DEBUG] Step2: load_album called")
+        if album_folder != self.album_folder:
+            self._reset_stem_watcher()
         self.album_folder = album_folder
 
         # 既存アルバムで root 直下に .flac が残っている場合は _flac_src へ自動移行
@@ -145,6 +240,10 @@ class Step2DemucsPanel(QWidget):
             self.track_list.blockSignals(False)
             return
         
+        # チェック操作はトラック単位の差分としてジャーナルに追記し、
+        # それ以外の変更はまとめて遅延保存する（Step2 を離れたら元に戻す）
+        self._begin_state_session()
+        
         # トラック情報を取得
         tracks = self.workflow.state.get_tracks()
         
@@ -166,10 +265,42 @@ class Step2DemucsPanel(QWidget):
         self.track_list.blockSignals(False)
         
         self.demucs_button.setEnabled(True)
+        self.queue_button.setEnabled(True)
         self.open_folder_button.setEnabled(True)
         self.colab_button.setEnabled(True)
         self.isolate_button.setEnabled(True)
     
+    def _begin_state_session(self):
+        """Step2 表示中だけジャーナルと遅延保存を有効にする"""
+        state = self.workflow.state
+        if state is None or state is self._session_state:
+            return
+        self._end_state_session()
+        state.enable_journal()
+        # 保存は GUI スレッドで行う（track dict を書き換えるのと同じスレッド）
+        state.enable_autoflush(QTimer.singleShot)
+        self._session_state = state
+
+    def _end_state_session(self):
+        """ジャーナル・遅延保存を解除し、保留中の変更を state.json に畳み込む"""
+        state = self._session_state
+        self._session_state = None
+        if state is None:
+            return
+        state.disable_autoflush()
+        state.disable_journal()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        state = self.workflow.state
+        if self.album_folder and state is not None and os.path.abspath(state.album_folder) == os.path.abspath(self.album_folder):
+            self._begin_state_session()
+
+    def hideEvent(self, event):
+        # 他のステップへ移ったら、以降の変更は従来どおり即保存する
+        self._end_state_session()
+        super().hideEvent(event)
+
     def on_item_changed(self, item: QListWidgetItem):
         """チェック状態が変更されたときに state.json に保存"""
         track_id = item.data(Qt.UserRole)
@@ -181,23 +312,27 @@ class Step2DemucsPanel(QWidget):
 
     def on_select_all(self):
         """全選択"""
+        if not self.workflow.state:
+            return
         self.track_list.blockSignals(True)
-        for i in range(self.track_list.count()):
-            item = self.track_list.item(i)
-            item.setCheckState(Qt.Checked)
-            track_id = item.data(Qt.UserRole)
-            if self.workflow.state:
+        with self.workflow.state.transaction():
+            for i in range(self.track_list.count()):
+                item = self.track_list.item(i)
+                item.setCheckState(Qt.Checked)
+                track_id = item.data(Qt.UserRole)
                 self.workflow.state.update_track(track_id, {"demucsTarget": True})
         self.track_list.blockSignals(False)
     
     def on_deselect_all(self):
         """全解除"""
+        if not self.workflow.state:
+            return
         self.track_list.blockSignals(True)
-        for i in range(self.track_list.count()):
-            item = self.track_list.item(i)
-            item.setCheckState(Qt.Unchecked)
-            track_id = item.data(Qt.UserRole)
-            if self.workflow.state:
+        with self.workflow.state.transaction():
+            for i in range(self.track_list.count()):
+                item = self.track_list.item(i)
+                item.setCheckState(Qt.Unchecked)
+                track_id = item.data(Qt.UserRole)
                 self.workflow.state.update_track(track_id, {"demucsTarget": False})
         self.track_list.blockSignals(False)
     
@@ -213,13 +348,14 @@ class Step2DemucsPanel(QWidget):
         targets = detect_demucs_targets(track_filenames, keywords)
         
         self.track_list.blockSignals(True)
-        for i in range(self.track_list.count()):
-            item = self.track_list.item(i)
-            filename = item.text()
-            should_select = targets.get(filename, True)
-            item.setCheckState(Qt.Checked if should_select else Qt.Unchecked)
-            track_id = item.data(Qt.UserRole)
-            self.workflow.state.update_track(track_id, {"demucsTarget": should_select})
+        with self.workflow.state.transaction():
+            for i in range(self.track_list.count()):
+                item = self.track_list.item(i)
+                filename = item.text()
+                should_select = targets.get(filename, True)
+                item.setCheckState(Qt.Checked if should_select else Qt.Unchecked)
+                track_id = item.data(Qt.UserRole)
+                self.workflow.state.update_track(track_id, {"demucsTarget": should_select})
         self.track_list.blockSignals(False)
         
         QMessageBox.information(
@@ -289,6 +425,7 @@ class Step2DemucsPanel(QWidget):
             return
 
         self._open_target_folder(target_dir)
+        self._start_stem_watcher(target_dir)
         
         # configからDemucsツールパスを取得し、設定されていれば自動起動
         demucs_path = self.config.get_tool_path("Demucs")
@@ -324,6 +461,169 @@ class Step2DemucsPanel(QWidget):
             msg_text
         )
 
+    def on_enqueue_demucs(self):
+        """キューに追加ボタン: チェックされた曲を Demucs キューに入れて実行する"""
+        checked_names = []
+        for i in range(self.track_list.count()):
+            item = self.track_list.item(i)
+            if item.checkState() == Qt.Checked:
+                checked_names.append(item.text())
+
+        if not checked_names:
+            QMessageBox.warning(self, "警告", "処理対象の曲が選択されていません。")
+            return
+        if not self.album_folder or not self.workflow.state:
+            return
+
+        if get_demucs_command(self.config) is None:
+            QMessageBox.warning(
+                self,
+                "警告",
+                "コマンドライン版 Demucs が見つかりません。\n"
+                "config.ini の [Paths] DemucsCli でパスを設定してください。"
+            )
+            return
+        if not self.config.get_tool_path("Flac"):
+            QMessageBox.warning(
+                self,
+                "警告",
+                "flac.exe が見つかりません。\n"
+                "config.ini でパスを設定してください。"
+            )
+            return
+
+        # 以前に隔離したファイルがあれば戻してから対象を集める
+        self._restore_non_target_files()
+        flac_src_dir = self._get_flac_src_dir()
+        sources = []
+        missing = []
+        for name in checked_names:
+            path = os.path.join(flac_src_dir, name)
+            if os.path.exists(path):
+                sources.append(path)
+            else:
+                missing.append(name)
+        if not sources:
+            QMessageBox.warning(self, "エラー", "対象の FLAC が見つかりませんでした。")
+            return
+
+        queue = self._get_demucs_queue()
+        added = queue.add(self.album_folder, self.workflow.state.get_album_name(), sources)
+        print(f"[INFO] Demucs キューに追加: {added} 曲 ({self.workflow.state.get_album_name()})")
+        self._start_demucs_queue()
+
+        msg_text = (
+            f"{added} 曲を Demucs キューに追加しました。\n\n"
+            "バックグラウンドで分離し、アルバムごとに終わり次第インストゥルメンタル版を取り込みます。\n"
+            "アプリを終了しても、次回起動時に続きから再開します。"
+        )
+        if missing:
+            msg_text += "\n\n見つからなかった曲:\n" + "\n".join(missing)
+        QMessageBox.information(self, "Demucs キュー", msg_text)
+
+    def _get_demucs_queue(self) -> DemucsQueue:
+        if self._demucs_queue is None:
+            self._demucs_queue = DemucsQueue(self.config.get_directory("WorkDir"))
+        return self._demucs_queue
+
+    def _start_demucs_queue(self) -> bool:
+        """キューの実行を開始する（実行中なら新しいトラックはそのまま拾われる）"""
+        if self._queue_worker is not None and self._queue_worker.isRunning():
+            self._update_queue_status()
+            return True
+        command = get_demucs_command(self.config)
+        flac_path = self.config.get_tool_path("Flac")
+        if command is None or not flac_path:
+            return False
+        max_jobs, threads = get_concurrency(self.config)
+        try:
+            convert_workers = int(self.config.get_setting("DemucsConvertWorkers", "0") or 0)
+        except (ValueError, TypeError):
+            convert_workers = 0
+        runner = DemucsQueueRunner(self._get_demucs_queue(), command, flac_path,
+                                   max_jobs, threads, convert_workers or None)
+        worker = DemucsQueueWorker(runner, self)
+        worker.track_finished.connect(self._on_queue_track_finished)
+        worker.album_imported.connect(self._on_queue_album_imported)
+        worker.finished.connect(lambda: self._on_queue_worker_finished(worker))
+        self._queue_worker = worker
+        worker.start()
+        self._update_queue_status()
+        return True
+
+    def _resume_demucs_queue(self):
+        """起動時: 残っているキューがあれば再開する"""
+        if self._queue_worker is not None:
+            return
+        try:
+            queue = self._get_demucs_queue()
+        except Exception as e:
+            print(f"[WARN] Demucs キューを開けませんでした: {e}")
+            return
+        if not queue.has_work():
+            return
+        if self._start_demucs_queue():
+            print(f"[INFO] Demucs キューを再開: 残り {queue.pending_count()} 曲")
+        else:
+            print("[WARN] Demucs キューが残っていますが、DemucsCli / Flac が見つからないため再開しません")
+        self._update_queue_status()
+
+    def _on_queue_track_finished(self, album_name: str, song_name: str, success: bool, message: str):
+        if not success:
+            print(f"[WARN] Demucs キュー: 失敗 {album_name} / {song_name}: {message}")
+        self._update_queue_status()
+
+    def _on_queue_album_imported(self, album_folder: str, album_name: str, results: list):
+        """キューのアルバムが取り込まれた: state.json へ反映"""
+        current = self.workflow.state
+        if current and self.album_folder and \
+                os.path.normcase(os.path.abspath(self.album_folder)) == os.path.normcase(album_folder):
+            state = current
+        else:
+            state = StateManager(album_folder)
+            if not state.load():
+                print(f"[WARN] state.json を読み込めないため反映できません: {album_folder}")
+                state = None
+        applied = apply_import_results(state, results) if state else 0
+        failed = [r for r in results if not r.success and not r.cancelled]
+        summary = f"{album_name}: インスト版 {applied} 曲を取り込みました"
+        if failed:
+            summary += f"（失敗 {len(failed)} 曲）"
+        print(f"[INFO] Demucs キュー: {summary}")
+        self._update_queue_status(summary)
+
+    def _on_queue_worker_finished(self, worker: "DemucsQueueWorker"):
+        if self._queue_worker is worker:
+            self._queue_worker = None
+        # 終了間際に追加されたトラックがあれば続けて実行
+        if not worker.runner.is_cancelled() and self._demucs_queue and self._demucs_queue.has_work():
+            self._start_demucs_queue()
+        self._update_queue_status()
+
+    def _update_queue_status(self, last_message: str = ""):
+        if self._demucs_queue is None:
+            return
+        if last_message:
+            self._queue_last_message = last_message
+        remaining = self._demucs_queue.pending_count()
+        running = self._queue_worker is not None and self._queue_worker.isRunning()
+        lines = []
+        if remaining:
+            lines.append(f"Demucs キュー: 残り {remaining} 曲" + ("（実行中）" if running else "（停止中）"))
+        if self._queue_last_message:
+            lines.append(f"最後の取り込み: {self._queue_last_message}")
+        self.queue_status_label.setText("\n".join(lines))
+
+    def shutdown(self):
+        """アプリ終了時: キューと監視を止める（途中のトラックは次回起動時にやり直す）"""
+        self._reset_stem_watcher()
+        self._end_state_session()
+        worker = self._queue_worker
+        if worker is not None and worker.isRunning():
+            print("[INFO] Demucs キューを停止します（次回起動時に再開）")
+            worker.cancel()
+            worker.wait(10000)
+
     def on_open_colab(self):
         """Colabリンクを開く"""
         # チェックされた項目を集計
@@ -350,6 +650,7 @@ class Step2DemucsPanel(QWidget):
         target_dir = self._get_target_dir()
         if target_dir:
             self._open_target_folder(target_dir)
+            self._start_stem_watcher(target_dir)
 
         # 完了ボタンを有効化
         self.completed_button.setEnabled(True)
@@ -384,6 +685,7 @@ class Step2DemucsPanel(QWidget):
         target_dir = self._get_target_dir()
         if target_dir:
             self._open_target_folder(target_dir)
+            self._start_stem_watcher(target_dir)
 
         # 完了ボタンを有効化
         self.completed_button.setEnabled(True)
@@ -397,6 +699,12 @@ class Step2DemucsPanel(QWidget):
     
     def on_demucs_completed(self):
         """Demucs完了ボタン"""
+        if self._import_worker is not None and self._import_worker.isRunning():
+            return
+
+        # 監視を止め、残りは従来どおり一括で取り込む（監視中に始めた変換は完了を待つ）
+        self._stop_stem_watcher()
+        streamed = {name for name, result in self._streamed.items() if result is None or result.success}
         
         # 対象フォルダ（_flac_src/アルバム名）を取得
         target_dir = ""
@@ -409,19 +717,14 @@ class Step2DemucsPanel(QWidget):
         
         # まず処理前ファイルが有る場所（target_dir）以下を探索して自動検出を試みる
         if target_dir and os.path.exists(target_dir):
-            for root, dirs, files in os.walk(target_dir):
-                if "demucs_ignore" in root:
-                    continue
-                if any(f.lower() in ['no_vocals.wav', 'minus_vocals.flac'] for f in files):
-                    # インストファイルが見つかったフォルダの親をDemucs出力ルートとみなす
-                    possible_folder = os.path.dirname(root)
-                    if extract_instrumental_files(possible_folder):
-                        folder = possible_folder
-                        print(f"[DEBUG] ローカル処理済みフォルダを自動検出: {folder}")
-                        break
-
-        # 自動検出で見つからなかった場合のみダイアログを表示
-        if not folder:
+            first = next(iter_instrumental_files(target_dir), None)
+            if first:
+                # インストファイルが見つかったフォルダの親をDemucs出力ルートとみなす
+                folder = os.path.dirname(first[0])
+                print(f"[DEBUG] ローカル処理済みフォルダを自動検出: {folder}")
+
+        # 自動検出で見つからなかった場合のみダイアログを表示（監視で取り込んだ分だけで済む場合は不要）
+        if not folder and not streamed:
             default_dir = self.config.get_default_directory('demucs_output')
             if not default_dir or not os.path.isdir(default_dir):
                 # フォールバック: ユーザーのダウンロードフォルダ
@@ -439,23 +742,14 @@ class Step2DemucsPanel(QWidget):
         # 初めに退避したファイルを元に戻す（完了処理が進行するため）
         self._restore_non_target_files()
 
-        # インストファイルを抽出
-        inst_files = extract_instrumental_files(folder)
-
-        if not inst_files:
-            QMessageBox.warning(
-                self,
-                "エラー",
-                "指定されたフォルダ内に no_vocals.wav または minus_vocals.flac が見つかりませんでした。"
-            )
-            return
-
-        # アクティブアルバムの曲に対応するものだけにフィルタリング（重複排除）
+        # インストファイルを見つけた順に、アクティブアルバムの曲に対応するものだけにフィルタリング（重複排除）
+        found_any = False
         filtered_inst_files = []
         seen_song_names = set()
-        for song_folder, inst_file in inst_files:
+        for song_folder, inst_file in (iter_instrumental_files(folder) if folder else ()):
+            found_any = True
             song_name = os.path.basename(song_folder)
-            if song_name in seen_song_names:
+            if song_name in seen_song_names or song_name in streamed:
                 continue
             orig_file_path = self._find_original_for_song(song_name)
             if orig_file_path:
@@ -464,7 +758,15 @@ class Step2DemucsPanel(QWidget):
             else:
                 print(f"[DEBUG] 他アルバムの曲のためスキップ: {song_name}")
 
-        if not filtered_inst_files:
+        if not found_any and not streamed:
+            QMessageBox.warning(
+                self,
+                "エラー",
+                "指定されたフォルダ内に no_vocals.wav または minus_vocals.flac が見つかりませんでした。"
+            )
+            return
+
+        if not filtered_inst_files and not streamed:
             QMessageBox.warning(
                 self,
                 "エラー",
@@ -473,7 +775,6 @@ class Step2DemucsPanel(QWidget):
             return
 
         # FLAC変換・移動処理
-        success_count = 0
         flac_path = self.config.get_tool_path("Flac")
 
         if not flac_path:
@@ -484,164 +785,176 @@ class Step2DemucsPanel(QWidget):
                 "config.ini でパスを設定してください。"
             )
             return
-        
-        # プログレスダイアログを表示
+
+        if not self.album_folder:
+            print("[ERROR] album_folder が未設定のため処理を中断")
+            return
+
+        # 出力先は root ではなく _flac_src/アルバム名 を優先
+        flac_album_dir = self._get_instrumental_output_dir()
+        try:
+            os.makedirs(flac_album_dir, exist_ok=True)
+        except Exception as e:
+            print(f"[ERROR] 出力ディレクトリの作成に失敗: {e}")
+            QMessageBox.warning(self, "エラー", f"出力フォルダを作成できませんでした:\n{e}")
+            return
+
+        jobs = []
+        for song_folder, inst_file, orig_file_path in filtered_inst_files:
+            song_name = os.path.basename(song_folder)
+            output_flac = instrumental_output_path(flac_album_dir, song_name)
+            jobs.append(ImportJob(song_name, inst_file, orig_file_path, output_flac))
+
+        try:
+            max_workers = int(self.config.get_setting("DemucsConvertWorkers", "0") or 0)
+        except (ValueError, TypeError):
+            max_workers = 0
+        importer = InstrumentalImporter(flac_path, jobs, max_workers or None, self.album_folder)
+        # 監視中に始めた変換はこのワーカーで完了を待つ
+        streaming, self._stream_importer = self._stream_importer, None
+
+        # プログレスダイアログを表示（変換はバックグラウンドで行い UI は止めない）
         progress = QProgressDialog(
             "インストゥルメンタル版を作成中...",
             "キャンセル",
             0,
-            len(filtered_inst_files),
+            len(jobs),
             self
         )
         progress.setWindowTitle("処理中")
         progress.setWindowModality(Qt.WindowModal)
         progress.setMinimumDuration(0)  # 即座に表示
-        
-        for idx, (song_folder, inst_file, orig_file_path) in enumerate(filtered_inst_files):
-            # キャンセルチェック
-            if progress.wasCanceled():
-                QMessageBox.information(
-                    self,
-                    "キャンセル",
-                    f"{success_count} 個のインストゥルメンタル版を作成しました（中断）"
-                )
-                return
-            
-            # プログレス更新
-            song_name = os.path.basename(song_folder)
-            progress.setLabelText(f"処理中: {song_name}")
-            progress.setValue(idx)
-            
-            # 出力FLACファイル名
-            if not self.album_folder:
-                print("[ERROR] album_folder が未設定のため処理を中断")
-                break
-            # 出力先は root ではなく _flac_src を優先
-            flac_src_dir = self._get_flac_src_dir()
-            try:
-                os.makedirs(flac_src_dir, exist_ok=True)
-            except Exception as e:
-                print(f"[ERROR] 出力ディレクトリの作成に失敗: {e}")
-                continue
-            
-            # アルバム名サブフォルダを含むパス
-            album_name = self.workflow.state.get_album_name() if self.workflow.state else "Unknown"
-            sanitized_album_name = self._sanitize_foldername(album_name)
-            flac_album_dir = os.path.join(flac_src_dir, sanitized_album_name)
-            os.makedirs(flac_album_dir, exist_ok=True)
-            
-            output_flac = os.path.join(flac_album_dir, f"{song_name} (Inst).flac")
-            
-            # パスの長さチェック（Windows の MAX_PATH 制限対策）
-            if len(output_flac) > 260:
-                print(f"[WARNING] 出力パスが長すぎます ({len(output_flac)} 文字): {output_flac}")
-                # 短縮版のファイル名を使用
-                short_name = song_name[:50] if len(song_name) > 50 else song_name
-                output_flac = os.path.join(flac_album_dir, f"{short_name} (Inst).flac")
-                print(f"[INFO] 短縮パスを使用: {output_flac}")
-            
-            # WAVの場合はFLACに変換
-            if inst_file.lower().endswith('.wav'):
-                # 絶対パスに変換
-                inst_file_abs = os.path.abspath(inst_file)
-                output_flac_abs = os.path.abspath(output_flac)
-                
-                # 既に出力ファイルが存在する場合は削除
-                if os.path.exists(output_flac_abs):
-                    try:
-                        os.remove(output_flac_abs)
-                        print(f"[INFO] 既存ファイルを削除: {output_flac_abs}")
-                    except Exception as e:
-                        print(f"[ERROR] 既存ファイルの削除に失敗: {e}")
-                        continue
-                
-                # flac -8 input.wav -o output.flac
-                # --keep-foreign-metadata オプションを追加してWARNINGを回避
-                runner = ExternalToolRunner()
-                success, stdout, stderr = runner.run_cli_tool(
-                    flac_path,
-                    ["-8", "--keep-foreign-metadata", inst_file_abs, "-o", output_flac_abs],
-                    self.album_folder
-                )
-                
-                if not success:
-                    print(f"[ERROR] FLAC変換失敗: {stderr}")
-                    print(f"[INFO] 入力ファイル: {inst_file_abs}")
-                    print(f"[INFO] 出力ファイル: {output_flac_abs}")
-                    print(f"[INFO] 出力ディレクトリの存在: {os.path.exists(os.path.dirname(output_flac_abs))}")
-                    print(f"[INFO] 出力ディレクトリの書き込み権限: {os.access(os.path.dirname(output_flac_abs), os.W_OK)}")
-                    continue
-            else:
-                # 既にFLACの場合は移動（重複時は上書き）
-                import shutil
-                try:
-                    if os.path.exists(output_flac):
-                        os.remove(output_flac)
-                    shutil.move(inst_file, output_flac)
-                except Exception as e:
-                    print(f"[ERROR] ファイル移動失敗: {e}")
-                    continue
-            
-            # 元のトラックのタグをコピーし、ジャンルのみ "Instrumental" に変更
-            try:
-                from mutagen.flac import FLAC
-                dest = FLAC(output_flac)
-                if orig_file_path and os.path.exists(orig_file_path):
-                    src = FLAC(orig_file_path)
-                    # 既存タグをクリアしてコピー
-                    dest.delete()
-                    for k, v in src.tags.items():
-                        dest[k] = v
-                    # 画像もコピー
-                    dest.clear_pictures()
-                    for pic in src.pictures:
-                        dest.add_picture(pic)
-                # ジャンルだけ上書き
-                dest["genre"] = ["Instrumental"]
-                dest.save()
-                
-                # state.json を更新: 元トラックに instrumentalFile を追加
-                if orig_file_path and self.workflow.state:
-                    # 元トラックのIDを探す
-                    orig_basename = os.path.basename(orig_file_path)
-                    track_id = None
-                    state = self.workflow.state.state
-                    for track in state.get("tracks", []):
-                        if track.get("originalFile") == orig_basename or track.get("currentFile") == orig_basename:
-                            track_id = track.get("id")
-                            break
-                    
-                    if track_id:
-                        # インストファイルの相対パス（ファイル名のみ）
-                        inst_filename = os.path.basename(output_flac)
-                        print(f"[INFO] state.json を更新: {track_id} に instrumentalFile = {inst_filename}")
-                        self.workflow.state.update_track(track_id, {
-                            "instrumentalFile": inst_filename,
-                            "hasInstrumental": True
-                        })
-                    else:
-                        print(f"[WARNING] 元トラックのIDが見つかりません: {orig_basename}")
-                
-                success_count += 1
-            except Exception as e:
-                print(f"[ERROR] タグコピー失敗: {e}")
-        
-        # プログレス完了
-        progress.setValue(len(filtered_inst_files))
+        progress.setAutoClose(False)
+        progress.setAutoReset(False)
+        if not jobs:
+            progress.setLabelText("自動取り込み中の変換が終わるのを待っています...")
+
+        worker = InstrumentalImportWorker(importer, self, streaming)
+
+        def on_item_finished(done: int, total: int, song_name: str, success: bool):
+            mark = "完了" if success else "失敗"
+            progress.setLabelText(f"{mark}: {song_name} ({done}/{total})")
+            progress.setValue(done)
+
+        def on_canceled():
+            if worker.isRunning():
+                progress.setLabelText("キャンセル中（実行中の変換を停止しています）...")
+                worker.cancel()
+
+        worker.item_finished.connect(on_item_finished)
+        progress.canceled.connect(on_canceled)
+        worker.finished.connect(lambda: self._on_instrumental_import_finished(worker, progress))
+        self._import_worker = worker
+        self.completed_button.setEnabled(False)
+        worker.start()
+
+    def _on_instrumental_import_finished(self, worker: "InstrumentalImportWorker", progress: QProgressDialog):
+        """インスト取り込み完了: state.json へ一括反映して結果を表示"""
+        batch_names = {r.job.song_name for r in worker.results}
+        # 監視中に取り込んだ分（一括側でやり直したものを除く）
+        streamed_results = [r for r in worker.streamed_results if r.job.song_name not in batch_names]
+        results = streamed_results + worker.results
+        succeeded = [r for r in results if r.success]
+        cancelled = [r for r in results if r.cancelled]
+        failed = [r for r in results if not r.success and not r.cancelled]
+        was_cancelled = bool(cancelled) or worker.importer.is_cancelled()
         progress.close()
-        
-        if success_count > 0:
-            # サイレント化（ログとして一覧に表示する方針ならここで別UI要素に追加予定）
-            print(f"[INFO] {success_count} 個のインストゥルメンタル版を作成しました")
-            QMessageBox.information(
-                self,
-                "完了",
-                f"{success_count} 個のインストゥルメンタル版を作成しました"
+        self.completed_button.setEnabled(True)
+        self._import_worker = None
+
+        # state.json を更新: 元トラックに instrumentalFile を追加（1回で保存）
+        # 監視中に終わったものは反映済みなので、まだ反映していない分だけ
+        pending = [r for r in streamed_results if r.success and self._streamed.get(r.job.song_name) is None]
+        apply_import_results(self.workflow.state, pending + [r for r in worker.results if r.success])
+        self._streamed = {}
+        self.watch_status_label.setText("")
+
+        print(f"[INFO] インスト取り込み結果: 成功 {len(succeeded)} / 失敗 {len(failed)} / キャンセル {len(cancelled)}")
+        summary = f"{len(succeeded)} 個のインストゥルメンタル版を作成しました"
+        if failed:
+            summary += f"\n\n失敗 ({len(failed)} 件):\n" + "\n".join(
+                f"・{r.job.song_name}: {r.message.strip()[:200]}" for r in failed
             )
+
+        if was_cancelled:
+            QMessageBox.information(self, "キャンセル", summary + "（中断）")
+            return
+
+        if succeeded:
+            QMessageBox.information(self, "完了", summary)
             self.step_completed.emit()
         else:
-            QMessageBox.warning(self, "エラー", "インストゥルメンタル版の作成に失敗しました。")
+            QMessageBox.warning(self, "エラー", "インストゥルメンタル版の作成に失敗しました。\n\n" + summary)
     
+    # ------------------------
+    # Demucs 出力の監視（分離し終わった曲から取り込む）
+    # ------------------------
+    def _start_stem_watcher(self, target_dir: str):
+        """対象フォルダの監視を始める（flac.exe が無い場合は従来どおり完了ボタンで一括処理）"""
+        flac_path = self.config.get_tool_path("Flac")
+        if not flac_path:
+            return
+        self._stop_stem_watcher()
+        if self._stream_importer is None:
+            try:
+                max_workers = int(self.config.get_setting("DemucsConvertWorkers", "0") or 0)
+            except (ValueError, TypeError):
+                max_workers = 0
+            self._stream_importer = InstrumentalImporter(flac_path, [], max_workers or None, self.album_folder)
+        watcher = StemWatcher(target_dir, ["demucs_ignore"], self)
+        watcher.stem_ready.connect(self._on_stem_ready)
+        self._stem_watcher = watcher
+        watcher.start()
+
+    def _stop_stem_watcher(self):
+        if self._stem_watcher is not None:
+            self._stem_watcher.stop()
+            self._stem_watcher.deleteLater()
+            self._stem_watcher = None
+
+    def _reset_stem_watcher(self):
+        """アルバム切り替え時: 監視をやめ、変換中のものは中止する"""
+        self._stop_stem_watcher()
+        if self._stream_importer is not None:
+            self._stream_importer.cancel()
+            self._stream_importer = None
+        self._streamed = {}
+        self.watch_status_label.setText("")
+
+    def _on_stem_ready(self, song_name: str, inst_file: str):
+        """書き込みが終わったインスト音源をすぐに FLAC 変換へ回す"""
+        if self._stream_importer is None or song_name in self._streamed:
+            return
+        orig_file_path = self._find_original_for_song(song_name)
+        if not orig_file_path:
+            print(f"[DEBUG] 他アルバムの曲のためスキップ: {song_name}")
+            return
+        output_dir = self._get_instrumental_output_dir()
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+        except Exception as e:
+            print(f"[ERROR] 出力ディレクトリの作成に失敗: {e}")
+            return
+        output_flac = instrumental_output_path(output_dir, song_name)
+        job = ImportJob(song_name, inst_file, orig_file_path, output_flac)
+        self._streamed[song_name] = None
+        self._stream_importer.submit(job, self._stream_item_finished.emit)
+        self.watch_status_label.setText(f"自動取り込み中: {song_name}")
+
+    def _on_stream_item_finished(self, result):
+        """逐次取り込みの1件完了: その場で state.json に反映"""
+        song_name = result.job.song_name
+        # 完了ボタン側で反映済み・アルバム切り替え済みなら何もしない
+        if song_name not in self._streamed or self._streamed[song_name] is not None:
+            return
+        self._streamed[song_name] = result
+        if result.success:
+            apply_import_results(self.workflow.state, [result])
+        else:
+            print(f"[WARN] 自動取り込みに失敗（完了ボタンでやり直します）: {song_name}: {result.message.strip()[:200]}")
+        done = sum(1 for r in self._streamed.values() if r is not None and r.success)
+        self.watch_status_label.setText(f"自動取り込み済み: {done} 曲（最新: {song_name}）")
+
     def on_skip(self):
         """スキップボタン"""
         reply = QMessageBox.question(
@@ -683,14 +996,12 @@ class Step2DemucsPanel(QWidget):
             return None
 
         import re, os
-        keywords = self.config.get_demucs_keywords() or []
-        # 正規化関数
+        skip_keywords = get_keyword_engine(self.config).skip
+        # 正規化関数（キーワード除去はコンパイル済みの1パス）
         def norm(s: str) -> str:
             base = re.sub(r'\.[^.]+$', '', s)
             base = re.sub(r'^\d+[\s\-\.]*', '', base)
-            # キーワード除去
-            for kw in keywords:
-                base = re.sub(fr'(?i)\s*[\(\[\-]?{re.escape(kw)}[\)\]\-]?','', base)
+            base = skip_keywords.strip(base)
             return base.strip().lower()
 
         target_norm = norm(song_name)
@@ -712,6 +1023,11 @@ class Step2DemucsPanel(QWidget):
                     return candidate2
         return None
 
+    def _get_instrumental_output_dir(self) -> str:
+        """インストFLACの出力先"""
+        album_name = self.workflow.state.get_album_name() if self.workflow.state else "Unknown"
+        return os.path.join(self._get_flac_src_dir(), self._sanitize_foldername(album_name))
+
     def _get_flac_src_dir(self) -> str:
         """FLAC のソース置き場 (_flac_src/アルバム名) の実パスを返す。state の設定があればそれを使う。"""
         raw_dirname = None
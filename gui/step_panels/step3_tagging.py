@@ -2,19 +2,57 @@
 Step 3: Mp3Tag (FLAC完成・タグ付け・リネーム)パネル
 """
 import os
+import time
+from typing import Callable, Optional
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
-    QLabel, QMessageBox, QListWidget, QListWidgetItem, QGroupBox
+    QLabel, QMessageBox, QListWidget, QListWidgetItem, QGroupBox, QProgressDialog
 )
-from PySide6.QtCore import Signal, Qt
+from PySide6.QtCore import Signal, Qt, QThread
 
 from logic.config_manager import ConfigManager
 from logic.workflow_manager import WorkflowManager
 from logic.external_tools import ExternalToolRunner
 from logic.artwork_handler import check_album_has_artwork
+from logic.metadata_cache import get_cache
+from logic.track_matcher import TrackMatcher
+from logic.tag_writer import save_with_padding, WriteStats
+from logic.keyword_engine import get_keyword_engine
+from logic.replaygain import ReplayGainScanner, write_replaygain_tags
+from logic.picture_normalizer import PictureNormalizer, summarize as summarize_pictures
 from logic.utils import sanitize_foldername, sanitize_filename
 
 
+class ProgressWorker(QThread):
+    """
+    トラック単位の一括処理をバックグラウンドで実行する
+
+    task は run(progress_callback) と cancel() を持つもの（ReplayGainScanner / PictureNormalizer）。
+    progress_callback には (完了数, 総数, path と ok を持つ結果) が渡される。
+    after_run を渡すと、task.run の結果（キャンセル時の None を除く）に対して同じスレッドで続けて実行する。
+    """
+
+    item_finished = Signal(int, int, str, bool)  # done, total, file_name, success
+
+    def __init__(self, task, after_run: Optional[Callable] = None, parent=None):
+        super().__init__(parent)
+        self.task = task
+        self.after_run = after_run
+        self.result = None
+        self.after_result = None
+
+    def run(self):
+        self.result = self.task.run(self._on_progress)
+        if self.result is not None and self.after_run is not None:
+            self.after_result = self.after_run(self.result)
+
+    def cancel(self):
+        self.task.cancel()
+
+    def _on_progress(self, done: int, total: int, result):
+        self.item_finished.emit(done, total, os.path.basename(result.path), result.ok)
+
+
 class Step3TaggingPanel(QWidget):
     """Step 3: Mp3Tag (FLAC完成)パネル"""
     
@@ -28,6 +66,8 @@ class Step3TaggingPanel(QWidget):
         self.tool_runner = None
         # 自動リフレッシュでも確認画面が消えないように維持フラグ
         self._force_show_mapping = False
+        # ReplayGain 測定・埋め込み画像の正規化（同時には1つだけ）
+        self._worker: Optional[ProgressWorker] = None
         self.init_ui()
     
     def init_ui(self):
@@ -321,435 +361,39 @@ class Step3TaggingPanel(QWidget):
         for idx, flac_path in enumerate(current_flac_files, start=1):
             print(f"[DEBUG][Step3]   SCAN[{idx:02d}] {flac_path}")
 
-        def _get_basename(fpath: str) -> str:
-            return os.path.basename(fpath)
-
-        def _find_by_basename(filename: str) -> str | None:
-            # ベース名だけで一致するものを current_flac_files から見つける
-            target = _get_basename(filename)
-            for f in current_flac_files:
-                if _get_basename(f) == target:
-                    return f
-            return None
-
-        # 1) 先頭のトラック番号で紐づけ辞書を作る (最優先)
-        #    同じトラック番号で「(Inst)」と通常版が両方ある場合は Inst を優先
-        import re
-        by_tracknum: dict[int, str] = {}
-        by_title_no_ver_vocal: dict[str, list[str]] = {}
-
-        def prefer_normal(existing: str | None, candidate: str) -> str:
-            # 既存が通常版なら維持、候補が通常版なら置換、どちらもInstなら候補で上書き
-            if existing:
-                ex_is_inst = self._is_instrumental_by_name(_get_basename(existing).lower())
-            else:
-                ex_is_inst = True # 既存がない場合は通常版の方を優先して受け入れるためダミーでTrue
-            cand_is_inst = self._is_instrumental_by_name(_get_basename(candidate).lower())
-            if not existing:
-                return candidate
-            if not ex_is_inst:
-                return existing  # 既に通常版を採用済み
-            if not cand_is_inst:
-                return candidate  # 通常版を優先して採用
-            return candidate      # どちらもInstなら最後のもの
-
-        for fname in current_flac_files:
-            m = re.match(r"^(\d{1,3})\s*[-．\. ]?\s*", _get_basename(fname))
-            if m:
-                try:
-                    idx = int(m.group(1))
-                    prev = by_tracknum.get(idx)
-                    by_tracknum[idx] = prefer_normal(prev, fname)
-                except ValueError:
-                    pass
-
-        # 2) トラック番号が無い/重複時のフォールバック: タイトル正規化での一致
-        def norm_title(name: str, remove_version_info: bool = False) -> str:
-            """
-            ファイル名を正規化してマッチングに使用
-            remove_version_info: Trueの場合はバージョン情報も削除（インスト検索用）
-            """
-            base = _get_basename(name)
-            base = re.sub(r"\.[^.]+$", "", base)            # 拡張子除去
-            base = re.sub(r"^(\d{1,3})\s*[-．\. ]?\s*", "", base)  # 先頭番号除去
-            # インスト関連の括弧を除去
-            base = re.sub(r"\s*\((?i:inst|off\s*vocal|instrumental|stemroller)\)\s*", "", base)
-            
-            if remove_version_info:
-                # バージョン情報も削除（M@STER VERSION, GAME VERSION, オリジナル・カラオケなど）
-                base = re.sub(r"\s*\((?i:m@ster\s*version|game\s*version|original\s*version|オリジナル[・・]カラオケ|カラオケ)\)\s*", "", base)
-                # その他の末尾括弧も削除
-                base = re.sub(r"\s*(\([^)]*\)\s*)+$", "", base)
-            
-            return base.strip().lower()
-
-        by_title: dict[str, str] = {}
-        by_title_inst: dict[str, str] = {}
-        
-        # 元曲ファイル名からトラック番号なしのタイトルへのマッピング
-        # 例: "02-虹.flac" -> "虹"
-        original_to_title_map: dict[str, str] = {}
-        
-        for f in current_flac_files:
-            # 通常マッチング: バージョン情報を保持
-            key = norm_title(f, remove_version_info=False)
-            prev = by_title.get(key)
-            by_title[key] = prefer_normal(prev, f)
-
-            if not self._is_instrumental_by_name(f.lower()):
-                key_no_ver_vocal = norm_title(f, remove_version_info=True)
-                if key_no_ver_vocal not in by_title_no_ver_vocal:
-                    by_title_no_ver_vocal[key_no_ver_vocal] = []
-                by_title_no_ver_vocal[key_no_ver_vocal].append(f)
-
-            # Inst専用マップ: バージョン情報を削除して広くマッチング
-            if self._is_instrumental_by_name(f.lower()):
-                key_no_ver = norm_title(f, remove_version_info=True)
-                # 複数のインストファイルがある場合、最新のものを使用
-                if key_no_ver not in by_title_inst:
-                    by_title_inst[key_no_ver] = f
-                    print(f"[DEBUG] Instマップに追加: '{key_no_ver}' -> '{f}'")
-                else:
-                    # 既存のファイルと比較して、より適切な方を選択
-                    existing = by_title_inst[key_no_ver]
-                    # "02-虹 (Inst).flac" よりも "2 虹 (Instrumental) (StemRoller).flac" を優先
-                    # 判定: より長いファイル名、または (StemRoller) を含む方を優先
-                    if "(StemRoller)" in f or len(f) > len(existing):
-                        by_title_inst[key_no_ver] = f
-                        print(f"[DEBUG] Instマップを更新: '{key_no_ver}' -> '{f}' (旧: '{existing}')")
-            else:
-                # 元曲の場合、トラック番号なしのタイトルをマッピング
-                key_no_ver = norm_title(f, remove_version_info=True)
-                original_to_title_map[key_no_ver] = f
-        
-        # トラック情報を更新
-        tracks = self.workflow.state.get_tracks()
-        print(f"[DEBUG][Step3] state tracks 読込: track_count={len(tracks)}")
-        
-        # 既存のoriginalFileを記録（インストファイルの重複登録を防ぐ）
-        existing_original_files = {track.get("originalFile", "") for track in tracks}
-        # 処理済みの物理ファイルを記録
-        processed_files = set()
-        # ボーカルトラックへの重複割当防止
-        assigned_vocal_files = set()
-
-        def get_tracknum_from_filename(name: str) -> int | None:
-            m_num = re.match(r"^(\d{1,3})", _get_basename(name))
-            if not m_num:
-                return None
-            try:
-                return int(m_num.group(1))
-            except ValueError:
-                return None
-
-        def is_vocal_candidate_available(track_obj: dict, candidate_file: str | None) -> bool:
-            if not candidate_file:
-                return False
-            if self._is_instrumental_by_name(candidate_file.lower()):
-                return False
-            if candidate_file in assigned_vocal_files:
-                current = track_obj.get("currentFile", "")
-                return bool(current and _get_basename(current) == _get_basename(candidate_file))
-            return True
-
-        for i, track in enumerate(tracks):
-            original_file = track.get("originalFile", "")
-            orig_norm = norm_title(original_file, remove_version_info=False)
-            orig_norm_no_ver = norm_title(original_file, remove_version_info=True)
-            original_track_num = get_tracknum_from_filename(original_file)
-            print(
-                f"[DEBUG][Step3][TRACK] idx={i} id={track.get('id','')} original='{original_file}' "
-                f"track_num={original_track_num} orig_norm='{orig_norm}' orig_norm_no_ver='{orig_norm_no_ver}'"
-            )
-            
-            # originalFileがインストファイルそのものの場合、紐づけをスキップして独立表示
-            if self._is_instrumental_by_name(original_file.lower()):
-                # 物理ファイルとして存在するか確認
-                found_original = _find_by_basename(original_file)
-                if found_original:
-                    final_filename = self._generate_final_filename(found_original)
-                    track["finalFile"] = final_filename
-                    track["currentFile"] = found_original
-                    track["isInstrumental"] = True
-                    processed_files.add(found_original)
-
-                    # 独立インストトラックとして表示
-                    self._append_mapping_row_inst_only(found_original, final_filename)
-                    print(f"[DEBUG] 独立インストトラック: {found_original} -> {final_filename}")
-                continue
-            
-            # 先頭番号でマッチ（ボーカル入りトラック用）
-            m = re.match(r"^(\d{1,3})", original_file)
-            new_file = None
-            if m:
-                try:
-                    idx = int(m.group(1))
-                    candidate = by_tracknum.get(idx)
-                    # トラック番号だけが変わった場合に誤紐づけしないよう、タイトル正規化で一致確認
-                    if candidate is not None:
-                        cand_norm = norm_title(candidate, remove_version_info=False)
-                        # 候補がインストファイルの場合は除外（ボーカル入りを優先）
-                        if not self._is_instrumental_by_name(candidate.lower()) and is_vocal_candidate_available(track, candidate):
-                            import difflib
-                            # 完全一致、または類似度が一定以上（タイポ修正等）なら許容する
-                            if (cand_norm == orig_norm or not orig_norm 
-                                    or difflib.SequenceMatcher(None, cand_norm, orig_norm).ratio() > 0.4):
-                                new_file = candidate
-                                print(f"[DEBUG][Step3][MATCH] strategy=tracknum idx={idx} candidate='{candidate}'")
-                            else:
-                                # 番号マッチは不一致と見なし、タイトルで改めて探す
-                                new_file = None
-                                print(f"[DEBUG][Step3][MATCH] strategy=tracknum-rejected idx={idx} candidate='{candidate}' cand_norm='{cand_norm}'")
-                        else:
-                            new_file = None
-                            print(f"[DEBUG][Step3][MATCH] strategy=tracknum-skip idx={idx} candidate='{candidate}' reason=inst_or_assigned")
-                except ValueError:
-                    new_file = None
-            # タイトル正規化でマッチ（インストファイルを除外）
-            if not new_file:
-                candidate = by_title.get(orig_norm)
-                if candidate and is_vocal_candidate_available(track, candidate):
-                    new_file = candidate
-                    print(f"[DEBUG][Step3][MATCH] strategy=title-exact candidate='{candidate}'")
-                else:
-                    # バージョン情報を除いたキーで一意に特定できる場合のみ採用
-                    vocal_candidates_no_ver = [
-                        path for path in by_title_no_ver_vocal.get(orig_norm_no_ver, [])
-                        if is_vocal_candidate_available(track, path)
-                    ]
-                    if len(vocal_candidates_no_ver) == 1:
-                        new_file = vocal_candidates_no_ver[0]
-                        print(f"[DEBUG][Step3][MATCH] strategy=title-no-ver-unique candidate='{new_file}'")
-                    elif len(vocal_candidates_no_ver) > 1:
-                        print(f"[WARN][Step3][MATCH] strategy=title-no-ver-ambiguous key='{orig_norm_no_ver}' candidates={vocal_candidates_no_ver}")
-
-            # トラック番号が付いている曲は、他番号への誤紐づけ防止のため fuzzy を抑制
-            allow_fuzzy = original_track_num is None
-            if not new_file and allow_fuzzy:
-                # difflibを使って類似タイトルを探す
-                import difflib
-                best_match = None
-                best_ratio = 0
-                for title_key, file_path in by_title.items():
-                    if is_vocal_candidate_available(track, file_path):
-                        ratio = difflib.SequenceMatcher(None, title_key, orig_norm).ratio()
-                        if ratio > best_ratio and ratio >= 0.4:
-                            best_ratio = ratio
-                            best_match = file_path
-                if best_match:
-                    new_file = best_match
-                    print(f"[DEBUG][Step3][MATCH] strategy=fuzzy best_match='{best_match}' best_ratio={best_ratio}")
-            elif not new_file:
-                print(f"[DEBUG][Step3][MATCH] strategy=fuzzy-skipped reason=has_track_number original='{original_file}'")
-
-            # マッチしない場合は、従来の安全策: 同名が存在すればそれを使う
-            if not new_file:
-                found_original = _find_by_basename(original_file)
-                if found_original:
-                    if not self._is_instrumental_by_name(found_original.lower()) and is_vocal_candidate_available(track, found_original):
-                        new_file = found_original
-                        print(f"[DEBUG][Step3][MATCH] strategy=basename candidate='{found_original}'")
-
-            # もし全てのマッチングに失敗した場合でも、現在設定されている currentFile が有効（ディスクに存在し、かつ誤ってInstが割り当てられていない）なら、それを尊重する
-            if not new_file:
-                old_curr = track.get("currentFile", "")
-                found_old = _find_by_basename(old_curr) if old_curr else None
-                if found_old and not self._is_instrumental_by_name(found_old.lower()) and is_vocal_candidate_available(track, found_old):
-                    new_file = found_old
-                    print(f"[DEBUG][Step3][MATCH] strategy=currentFile candidate='{found_old}'")
-                elif old_curr:
-                    base_dir = self.album_folder
-                    if self.workflow.state:
-                        raw_dirname = self.workflow.state.get_path('rawFlacSrc') or '_flac_src'
-                        album_name = self.workflow.state.get_album_name()
-                        candidate_dir = os.path.join(self.album_folder, raw_dirname, self._sanitize_foldername(album_name))
-                        if os.path.isdir(candidate_dir):
-                            base_dir = candidate_dir
-                    check_path = os.path.join(base_dir, old_curr) if not os.path.isabs(old_curr) else old_curr
-                    if os.path.exists(check_path) and not self._is_instrumental_by_name(old_curr.lower()):
-                        new_file = old_curr
-                        print(f"[DEBUG][Step3][MATCH] strategy=currentFile-direct candidate='{old_curr}'")
-
-            # それでも無ければスキップ（ユーザーに後で表示）
-            if not new_file:
-                # 未検出の行
-                self._append_mapping_row_not_found(original_file)
-                print(f"[WARN][Step3][MATCH] strategy=not-found original='{original_file}'")
-                # ファイルが見つからない場合は古い（誤った）情報を残さないようクリアする
-                track["currentFile"] = ""
-                track.pop("isInstrumental", None)
-                track.pop("instrumentalFile", None)
-                track.pop("currentInstFile", None)
-                continue
-            
-            assigned_vocal_files.add(new_file)
-            processed_files.add(new_file)
-            print(f"[DEBUG][Step3][MATCH] selected original='{original_file}' -> current='{new_file}'")
-
-            # 同タイトルのInstパートナーを探す
-            inst_partner = None
-            # new_file のタイトルから探す（original_fileのタイポが修正されている可能性があるため）
-            new_norm_no_ver = norm_title(new_file, remove_version_info=True)
-
-            # まず完全一致で自動検出を試す
-            auto_detected = by_title_inst.get(new_norm_no_ver)
-            if not auto_detected:
-                # originalFileのタイトルでも一応試す
-                auto_detected = by_title_inst.get(orig_norm_no_ver)
-
-            if not auto_detected:
-                # difflibを使って類似タイトルをインストマップから探す
-                import difflib
-                best_inst_match = None
-                best_inst_ratio = 0
-                for title_key, file_path in by_title_inst.items():
-                    ratio = difflib.SequenceMatcher(None, title_key, new_norm_no_ver).ratio()
-                    if ratio > best_inst_ratio and ratio >= 0.4:
-                        best_inst_ratio = ratio
-                        best_inst_match = file_path
-                if best_inst_match:
-                    auto_detected = best_inst_match
-
-            if auto_detected:
-                inst_partner = auto_detected
-                print(f"[DEBUG][Step3][INST] 自動検出でinstrumentalFileを発見: title_key='{new_norm_no_ver}' -> '{inst_partner}'")
-            else:
-                # 自動検出できない場合、state.jsonに記録済みのinstrumentalFileを使用
-                existing_inst = track.get("instrumentalFile")
-                found_inst = _find_by_basename(existing_inst) if existing_inst else None
-                
-                # if existing_inst was not found, check currentInstFile just in case
-                if not found_inst:
-                    existing_inst_curr = track.get("currentInstFile")
-                    found_inst = _find_by_basename(existing_inst_curr) if existing_inst_curr else None
-
-                if found_inst:
-                    inst_partner = found_inst
-                    print(f"[DEBUG][Step3][INST] 既存のinstrumentalFileを使用: {original_file} -> {inst_partner}")
-                else:
-                    print(f"[DEBUG][Step3][INST] インストファイルが見つかりません: {original_file} (normalized: '{new_norm_no_ver}')")
-                    # inst関連の古い情報をクリア
-                    track.pop("instrumentalFile", None)
-                    track.pop("currentInstFile", None)
-
-            # FLACファイルからタグ情報を読み取り、最終ファイル名を生成
-            final_filename = self._generate_final_filename(new_file)
-            
-            # new_file がインストかどうか判定
-            is_new_file_inst = self._is_instrumental_by_name(new_file.lower())
-            
-            # 通常ケース: new_file を最終成果物とし、Instが別にあれば派生として表示
-            track["finalFile"] = final_filename
-            track["isInstrumental"] = is_new_file_inst
-            
-            # インストファイルの表示判定
-            # new_fileがインストの場合は、inst_partnerは表示しない（自分自身がインスト）
-            if inst_partner and inst_partner != new_file and not is_new_file_inst:
-                # インストゥルメンタル版のファイル名（現在のファイル名をそのまま使用）
-                inst_display_name = inst_partner
-                # state.jsonには最終ファイル名を記録
-                inst_final_filename = self._generate_final_filename(inst_partner)
-                track["instrumentalFile"] = inst_final_filename
-                track["currentInstFile"] = inst_partner
-                track["hasInstrumental"] = True
-                track["currentFile"] = new_file
-                processed_files.add(inst_partner)
-                
-                print(f"[DEBUG][Step3][UI] 表示に追加: {original_file} -> {final_filename} + Inst: {inst_display_name}")
-                
-                # 表示: 親トラック + 子インスト
-                self._append_mapping_row_with_inst(
-                    original_file,
-                    final_filename,
-                    inst_display_name  # 生のファイル名を表示
-                )
-                
-                # instrumentalFileとして紐づいたファイルは独立トラックとして追加しない
-                # （重複登録を防ぐため）
-            else:
-                # new_file 自体が Inst の場合はバッジ表示、それ以外は通常表示
-                track["currentFile"] = new_file
-                if track["isInstrumental"]:
-                    self._append_mapping_row_inst_only(
-                        original_file,
-                        final_filename
-                    )
-                else:
-                    self._append_mapping_row_normal(
-                        original_file,
-                        final_filename
-                    )
-        
-        # 未処理のインストファイル（state.jsonに存在しない新規Demucs生成ファイル）を独立トラックとして追加
-        for flac_file in current_flac_files:
-            if flac_file not in processed_files and self._is_instrumental_by_name(flac_file.lower()):
-                # 新規インストトラックとして追加
-                final_filename = self._generate_final_filename(flac_file)
-                new_track = {
-                    "id": f"track_{len(tracks) + 1:03d}",
-                    "originalFile": flac_file,
-                    "finalFile": final_filename,
-                    "currentFile": flac_file,
-                    "demucsTarget": False,
-                    "isInstrumental": True,
-                    "hasInstrumental": False
-                }
-                tracks.append(new_track)
-                processed_files.add(flac_file)
-                
-                # 表示に追加
-                self._append_mapping_row_inst_only(flac_file, final_filename)
-                print(f"[DEBUG][Step3][INST] 未処理の新規インストトラックを追加: {flac_file} -> {final_filename}")
-        
-        # 独立インストトラックのトラック番号を再採番
-        # ボーカル入りトラック（isInstrumental=False）の後に連番で配置
-        
-        import re
-        
-        # トラックを分類
-        vocal_tracks = []  # ボーカル入りトラック
-        independent_inst_tracks = []  # 独立インストトラック
-        
-        for track in tracks:
-            is_inst = track.get("isInstrumental", False)
-            has_final = bool(track.get("finalFile"))
-            
-            if not has_final:
-                continue
-            
-            if is_inst:
-                independent_inst_tracks.append(track)
+        # タグ読み取りを先にまとめて並列実行（以降の判定・ファイル名生成はキャッシュを参照するだけ）
+        try:
+            workers = int(self.config.get_setting("MetadataReadWorkers", "8") or 8)
+        except (ValueError, TypeError):
+            workers = 8
+        started = time.perf_counter()
+        read_count = get_cache(self.album_folder).prefetch(
+            [os.path.join(base_dir, f) for f in current_flac_files], max_workers=workers
+        )
+        print(f"[DEBUG][Step3] タグ先読み完了: {read_count}/{len(current_flac_files)} 件, {time.perf_counter() - started:.2f}s (workers={workers})")
+
+        # 紐づけ本体は logic.track_matcher（Qt 非依存）で行い、ここでは表示だけを担当
+        matcher = TrackMatcher(
+            current_flac_files,
+            is_instrumental_name=self._is_instrumental_by_name,
+            final_name=self._generate_final_filename,
+            base_dir=base_dir,
+        )
+        result = matcher.apply(self.workflow.state.get_album())
+        for row in result.rows:
+            if row.kind == "with_inst":
+                # 親トラック + 子インスト（インストは生のファイル名を表示）
+                self._append_mapping_row_with_inst(row.original, row.final, row.inst)
+            elif row.kind == "inst_only":
+                self._append_mapping_row_inst_only(row.original, row.final)
+            elif row.kind == "not_found":
+                self._append_mapping_row_not_found(row.original)
             else:
-                vocal_tracks.append(track)
-        
-        # 独立インストトラックのトラック番号を再採番
-        if independent_inst_tracks:
-            next_track_num = len(vocal_tracks) + 1  # ボーカル入りトラックの後から
-            
-            for inst_track in independent_inst_tracks:
-                final_file = inst_track.get("finalFile", "")
-                if not final_file:
-                    continue
-                
-                # 既存のトラック番号を抽出
-                m = re.match(r"^(?:Disc \d+-)?(\d{2,3})\s+(.+)$", final_file)
-                if m:
-                    old_num = m.group(1)
-                    title_part = m.group(2)
-                    
-                    # 新しいトラック番号を生成
-                    new_num = str(next_track_num).zfill(2)
-                    new_final_file = f"{new_num} {title_part}"
-                    
-                    inst_track["finalFile"] = new_final_file
-                    print(f"[DEBUG][Step3][INST] 独立インストトラックのトラック番号を再採番: {old_num} -> {new_num} ({title_part})")
-                    next_track_num += 1
+                self._append_mapping_row_normal(row.original, row.final)
 
-        print(f"[DEBUG][Step3] update_file_mapping 完了: assigned_vocal={len(assigned_vocal_files)}, processed_files={len(processed_files)}, final_tracks={len(tracks)}")
-        
         # state.json に保存
-        self.workflow.state.state["tracks"] = tracks
         self.workflow.state.save()
+        get_cache(self.album_folder).save()
 
     # ------------------------
     # internal helpers
@@ -919,16 +563,12 @@ class Step3TaggingPanel(QWidget):
         if self._is_instrumental_by_name(name):
             return True
         try:
-            if filepath and os.path.exists(filepath):
-                from mutagen.flac import FLAC
-                flac = FLAC(filepath)
+            if filepath and os.path.exists(filepath) and self.album_folder:
+                tags = get_cache(self.album_folder).get_tags(filepath) or {}
                 # genre / comment などに Instrumental を含むか
                 def contains_key(key: str) -> bool:
-                    try:
-                        vals = flac.get(key, [])
-                        return any("instrumental" in str(v).lower() for v in vals)
-                    except Exception:
-                        return False
+                    vals = tags.get(key, [])
+                    return any("instrumental" in str(v).lower() for v in vals)
                 if contains_key("genre") or contains_key("comment") or contains_key("description"):
                     return True
         except Exception:
@@ -937,8 +577,7 @@ class Step3TaggingPanel(QWidget):
 
     def _is_instrumental_by_name(self, lower_name: str) -> bool:
         """ファイル名だけで簡易判定（小文字を渡す）"""
-        keywords = ["inst", "instrumental", "off vocal", "off-vocal", "offvocal", "backing track", "karaoke", "voiceless", "minus one", "オリジナル・カラオケ", "インスト", "オフボーカル", "オフボ", "カラオケ", "歌無し"]
-        return any(k in lower_name for k in keywords)
+        return get_keyword_engine(self.config).is_instrumental_name(lower_name)
 
     def _generate_final_filename(self, current_filename: str) -> str:
         """FLACファイルからタグ情報を読み取り、最終的なファイル名を生成する
@@ -965,13 +604,13 @@ class Step3TaggingPanel(QWidget):
                 return current_filename
         
         try:
-            from mutagen.flac import FLAC
-            audio = FLAC(flac_path)
-            
-            # タグから情報取得
-            track_num = audio.get("tracknumber", [""])[0]
-            disc_num = audio.get("discnumber", ["1"])[0]
-            title = audio.get("title", ["Unknown"])[0]
+            # タグから情報取得（メタデータキャッシュ経由）
+            cache = get_cache(self.album_folder)
+            if cache.get_tags(flac_path) is None:
+                return current_filename
+            track_num = cache.get_tag(flac_path, "tracknumber", "")
+            disc_num = cache.get_tag(flac_path, "discnumber", "1")
+            title = cache.get_tag(flac_path, "title", "Unknown")
             
             # トラック番号を整形（分数形式の場合は最初の数値のみ、0埋め2桁）
             if "/" in str(track_num):
@@ -1064,6 +703,9 @@ class Step3TaggingPanel(QWidget):
         from mutagen.flac import FLAC
         import shutil
 
+        cache = get_cache(self.album_folder)
+        write_stats = WriteStats("インストタグ同期")
+
         # ディスクごとの最大トラック番号と、生成されるインストの数を事前計算する
         max_track_per_disc = {}
         inst_count_per_disc = {}
@@ -1079,12 +721,13 @@ class Step3TaggingPanel(QWidget):
                 orig_path = os.path.join(flac_src_dir, orig_filename)
                 if os.path.exists(orig_path):
                     try:
-                        tmp_flac = FLAC(orig_path)
-                        t_num = str(tmp_flac.get("tracknumber", ["0"])[0])
+                        if cache.get_tags(orig_path) is None:
+                            continue
+                        t_num = cache.get_tag(orig_path, "tracknumber", "0")
                         if "/" in t_num:
                             t_num = t_num.split("/")[0]
                             
-                        d_num = str(tmp_flac.get("discnumber", ["1"])[0])
+                        d_num = cache.get_tag(orig_path, "discnumber", "1")
                         if "/" in d_num:
                             d_num = d_num.split("/")[0]
                             
@@ -1175,7 +818,10 @@ class Step3TaggingPanel(QWidget):
                     if orig_total.isdigit():
                         inst_flac["totaltracks"] = [str(int(orig_total) + inst_adds)]
 
-                inst_flac.save()
+                report = write_stats.add(save_with_padding(inst_flac))
+                if not report.ok:
+                    raise OSError(report.error)
+                cache.invalidate(inst_path)
 
                 # 5. ファイル名のリネーム
                 ext = os.path.splitext(orig_filename)[1]
@@ -1205,9 +851,12 @@ class Step3TaggingPanel(QWidget):
                 print(f"[ERROR] インスト同期エラー ({orig_filename}): {e}")
                 error_count += 1
                 
+        write_stats.print_summary()
+
         # stateを保存
         self.workflow.state.state["tracks"] = tracks
         self.workflow.state.save()
+        cache.save()
 
         # UIを再更新
         self.update_file_mapping()
@@ -1244,13 +893,20 @@ class Step3TaggingPanel(QWidget):
         )
         
         if reply == QMessageBox.Yes:
+            if self._worker is not None and self._worker.isRunning():
+                return
             # 完了時にサブフォルダ内ファイルを直下へ移動し、フラットな状態にする
             self._flatten_flac_dir()
             
-            # ReplayGain 自動実行（設定で有効時のみ）
-            self._apply_replaygain_if_enabled()
             # 完了後は維持フラグを解除
             self._force_show_mapping = False
+            # 巨大な埋め込み画像の置き換え（設定で有効時のみ）。処理中なら終了後に ReplayGain へ進む
+            if not self._normalize_pictures_if_enabled():
+                self._continue_complete()
+
+    def _continue_complete(self):
+        """ReplayGain 自動実行（設定で有効時のみ）。内蔵スキャナで測定中なら終了後に次へ進む"""
+        if not self._apply_replaygain_if_enabled():
             self.step_completed.emit()
 
     def _flatten_flac_dir(self):
@@ -1306,22 +962,126 @@ class Step3TaggingPanel(QWidget):
             # 配置変更を state に反映させるため、改めて再マッピングを実行
             self.update_file_mapping()
 
-    def _apply_replaygain_if_enabled(self):
-        """ReplayGain を foobar2000 で測定（アルバムゲイン含む、config.ini 設定に基づく）"""
+    def _normalize_pictures_if_enabled(self) -> bool:
+        """
+        FLAC の巨大な埋め込み画像を最適化した表紙1枚に置き換える（config.ini の NormalizePictures が有効な場合のみ）
+
+        ReplayGain のタグ書き込みより先に行い、以降の読み込み・転送を軽くする。
+
+        Returns:
+            バックグラウンド処理を開始したか（True なら終了後に _continue_complete を呼ぶ）
+        """
+        enabled = str(self.config.get_setting("NormalizePictures", "0")).strip() not in ("0", "false", "False", "")
+        if not enabled or not self.workflow.state or not self.album_folder:
+            return False
+
+        raw_dirname = self.workflow.state.get_path("rawFlacSrc") or "_flac_src"
+        album_name = self.workflow.state.get_album_name()
+        flac_src_dir = os.path.join(self.album_folder, raw_dirname, self._sanitize_foldername(album_name))
+        if not os.path.isdir(flac_src_dir):
+            return False
+        flac_files = sorted(os.path.join(flac_src_dir, f) for f in os.listdir(flac_src_dir)
+                            if f.lower().endswith('.flac'))
+        if not flac_files:
+            return False
+
+        def number(key: str, default: int) -> int:
+            try:
+                return int(self.config.get_setting(key, str(default)) or default)
+            except (ValueError, TypeError):
+                return default
+
+        normalizer = PictureNormalizer(
+            flac_files,
+            max_kb=number("PictureMaxKB", 1024),
+            width=number("PictureMaxWidth", 1000),
+            quality=number("PictureJpegQuality", 90),
+            max_workers=number("PictureNormalizeWorkers", 4),
+        )
+
+        self._start_with_progress(
+            ProgressWorker(normalizer, parent=self), len(flac_files),
+            "埋め込み画像を確認中...", "処理中", self._on_pictures_normalized
+        )
+        return True
+
+    def _start_with_progress(self, worker: ProgressWorker, total: int, label: str, busy_text: str,
+                             on_finished: Callable[[ProgressWorker], None]):
+        """
+        ProgressWorker を進捗ダイアログ付きで開始する
+
+        キャンセルは未着手のトラックだけを取りやめ、処理中のトラックの終了を待つ。
+        終了後（キャンセル時も）ダイアログを閉じて on_finished(worker) を呼ぶ。
+        """
+        progress = QProgressDialog(label, "キャンセル", 0, total, self)
+        progress.setWindowTitle("処理中")
+        progress.setWindowModality(Qt.WindowModal)
+        progress.setMinimumDuration(0)
+        progress.setAutoClose(False)
+        progress.setAutoReset(False)
+
+        def on_item_finished(done: int, total: int, file_name: str, success: bool):
+            mark = "完了" if success else "失敗"
+            progress.setLabelText(f"{mark}: {file_name} ({done}/{total})")
+            progress.setValue(done)
+
+        def on_canceled():
+            if worker.isRunning():
+                progress.setLabelText(f"キャンセル中（{busy_text}のトラックの終了を待っています）...")
+                worker.cancel()
+
+        def on_worker_finished():
+            progress.close()
+            self._worker = None
+            on_finished(worker)
+
+        worker.item_finished.connect(on_item_finished)
+        progress.canceled.connect(on_canceled)
+        worker.finished.connect(on_worker_finished)
+        self._worker = worker
+        worker.start()
+
+    def _on_pictures_normalized(self, worker: ProgressWorker):
+        """埋め込み画像の置き換え完了: 結果を表示して ReplayGain へ"""
+        results = worker.result
+
+        if results is None:
+            # キャンセル時はステップを完了させない（置き換え済みのトラックはそのまま。再度「完了」で続きから）
+            QMessageBox.information(self, "埋め込み画像", "埋め込み画像の正規化をキャンセルしました。")
+            return
+
+        failed = [r for r in results if not r.ok]
+        if failed:
+            lines = [f"- {os.path.basename(r.path)}: {r.error}" for r in failed]
+            QMessageBox.warning(
+                self,
+                "埋め込み画像",
+                "一部のファイルで埋め込み画像を置き換えられませんでした（元のまま残しています）。\n\n"
+                + "\n".join(lines[:10])
+            )
+        elif any(r.changed for r in results):
+            QMessageBox.information(self, "埋め込み画像", summarize_pictures(results))
+        self._continue_complete()
+
+    def _apply_replaygain_if_enabled(self) -> bool:
+        """
+        ReplayGain を測定してタグを付与（アルバムゲイン含む、config.ini 設定に基づく）
+
+        flac.exe があれば内蔵スキャナ（logic/replaygain.py）でバックグラウンド測定し、
+        無ければ従来どおり foobar2000 に追加して手動スキャンを案内する。
+
+        Returns:
+            内蔵スキャナの測定を開始したか（True なら完了時に step_completed を発行する）
+        """
         try:
             enabled = str(self.config.get_setting("AutoReplayGain", "1")).strip() not in ("0", "false", "False")
         except Exception:
             enabled = True
         if not enabled:
-            return
-
-        foobar_path = self.config.get_tool_path("Foobar2000")
-        if not foobar_path or not os.path.exists(foobar_path):
-            print("[WARN] foobar2000 が見つかりません。ReplayGain をスキップします。")
-            return
+            return False
 
         if not self.workflow.state or not self.album_folder:
-            return
+            return False
 
         # _flac_src/アルバム名 配下の全 FLAC へ適用
         try:
@@ -1336,7 +1096,17 @@ class Step3TaggingPanel(QWidget):
 
         flac_files = [os.path.join(flac_src_dir, f) for f in os.listdir(flac_src_dir) if f.lower().endswith('.flac')]
         if not flac_files:
-            return
+            return False
+
+        flac_path = self.config.get_tool_path("Flac")
+        if flac_path:
+            self._start_replaygain_scan(flac_path, sorted(flac_files))
+            return True
+
+        foobar_path = self.config.get_tool_path("Foobar2000")
+        if not foobar_path or not os.path.exists(foobar_path):
+            print("[WARN] flac / foobar2000 が見つかりません。ReplayGain をスキップします。")
+            return False
 
         # foobar2000 で ReplayGain スキャン実行
         # コマンド: foobar2000.exe /playlist_command:"ReplayGain/Scan per-file track gain" <files>
@@ -1360,6 +1130,43 @@ class Step3TaggingPanel(QWidget):
             print(f"[INFO] foobar2000 で ReplayGain 測定を開始しました（{len(flac_files)} ファイル）")
         except Exception as e:
             print(f"[WARN] ReplayGain 測定起動に失敗（非致命）: {e}")
+        return False
+
+    def _start_replaygain_scan(self, flac_path: str, flac_files: list[str]):
+        """内蔵スキャナで測定を開始（終了後に結果を反映して step_completed を発行）"""
+        try:
+            max_workers = int(self.config.get_setting("ReplayGainWorkers", "0") or 0)
+        except (ValueError, TypeError):
+            max_workers = 0
+        scanner = ReplayGainScanner(flac_path, flac_files, max_workers or None)
+
+        self._start_with_progress(
+            ProgressWorker(scanner, after_run=write_replaygain_tags, parent=self), len(flac_files),
+            "ReplayGain を測定中...", "測定中", self._on_replaygain_finished
+        )
+
+    def _on_replaygain_finished(self, worker: ProgressWorker):
+        """ReplayGain 測定完了: 結果を表示して次のステップへ"""
+        album = worker.result
+
+        if album is None:
+            # キャンセル時はステップを完了させない（再度「完了」で測定し直せる）
+            QMessageBox.information(self, "ReplayGain", "ReplayGain 測定をキャンセルしました。")
+            return
+
+        failed = album.failed
+        write_failed = worker.after_result.failed if worker.after_result else []
+        if failed or write_failed:
+            lines = [f"- {os.path.basename(t.path)}: {t.error}" for t in failed]
+            lines += [f"- {os.path.basename(p)}: {e}" for p, e in write_failed]
+            QMessageBox.warning(
+                self,
+                "ReplayGain",
+                "一部のファイルで ReplayGain を付与できませんでした。\n\n" + "\n".join(lines[:10])
+            )
+        elif album.gain is not None:
+            print(f"[INFO] ReplayGain 付与完了: アルバムゲイン {album.gain:+.2f} dB / {len(album.tracks)} トラック")
+        self.step_completed.emit()
     
     def on_manual_mapping(self):
         """手動紐づけダイアログを表示"""
@@ -15,6 +15,7 @@ from PySide6.QtCore import Signal, QTimer
 from logic.config_manager import ConfigManager
 from logic.workflow_manager import WorkflowManager
 from logic.utils import sanitize_foldername
+from logic.keyword_engine import get_keyword_engine
 
 
 class Step4AacPanel(QWidget):
@@ -274,6 +275,7 @@ class Step4AacPanel(QWidget):
 
         import shutil
         count = 0
+        output_instrumental = get_keyword_engine(self.config).output_instrumental
         for name in os.listdir(src):
             if name.lower().endswith(".m4a"):
                 src_file = os.path.join(src, name)
@@ -283,7 +285,7 @@ class Step4AacPanel(QWidget):
                 if m:
                     track_num = str(int(m.group(1))).zfill(2)
                     # Instかどうかを判定
-                    is_inst = any(k in name.lower() for k in ["(inst)", "instrumental", "off vocal", "off-vocal", "offvocal", "backing track", "karaoke"])
+                    is_inst = output_instrumental.contains(name)
                     
                     # 期待されるファイル名を取得
                     key = track_num + "_inst" if is_inst else track_num
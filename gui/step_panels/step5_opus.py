@@ -15,6 +15,7 @@ from PySide6.QtWidgets import (
 from logic.config_manager import ConfigManager
 from logic.workflow_manager import WorkflowManager
 from logic.utils import sanitize_foldername
+from logic.keyword_engine import get_keyword_engine
 
 
 class Step5OpusPanel(QWidget):
@@ -286,6 +287,7 @@ class Step5OpusPanel(QWidget):
             self.log_list.addItem(QListWidgetItem(f"listdirエラー: {err}"))
             opus_files = []
 
+        output_instrumental = get_keyword_engine(self.config).output_instrumental
         for name in opus_files:
             src_file = os.path.join(src, name)
             
@@ -294,7 +296,7 @@ class Step5OpusPanel(QWidget):
             if m:
                 track_num = str(int(m.group(1))).zfill(2)
                 # Instかどうかを判定
-                is_inst = any(k in name.lower() for k in ["(inst)", "instrumental", "off vocal", "off-vocal", "offvocal", "backing track", "karaoke"])
+                is_inst = output_instrumental.contains(name)
                 
                 # 期待されるファイル名を取得
                 key = track_num + "_inst" if is_inst else track_num
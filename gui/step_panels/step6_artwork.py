@@ -16,6 +16,8 @@ from PySide6.QtWidgets import (
 from logic.config_manager import ConfigManager
 from logic.workflow_manager import WorkflowManager
 from logic import artwork_handler as ah
+from logic.artwork_cache import get_artwork_cache
+from logic.tag_writer import WriteStats
 from logic.utils import sanitize_foldername
 
 
@@ -27,7 +29,8 @@ class Step6ArtworkPanel(QWidget):
         self.config = config
         self.workflow = workflow
         self.album_folder: Optional[str] = None
-        self.source_image: Optional[str] = None
+        # 選択した画像のパス、または FLAC から読んだ画像データ
+        self.source_image: Optional[str | bytes] = None
         self.init_ui()
 
     def init_ui(self):
@@ -148,10 +151,15 @@ class Step6ArtworkPanel(QWidget):
         if not target:
             QMessageBox.warning(self, "見つからない", "アートワーク付き FLAC が見つかりません。")
             return
-        tmp = os.path.join(self.album_folder, "_cover_src.jpg")
-        if ah.extract_artwork_from_flac(target, tmp):
-            self.source_image = tmp
-            self.lbl_source.setText(f"抽出: {os.path.basename(target)} → {os.path.basename(tmp)}")
+        # 一時ファイルには書かずメモリ上で扱う（最適化・キャッシュ照合はこのデータから）
+        try:
+            data = ah.read_artwork_from_flac(target)
+        except Exception as e:
+            print(f"[ERROR] アートワーク抽出エラー: {e}")
+            data = None
+        if data:
+            self.source_image = data
+            self.lbl_source.setText(f"抽出: {os.path.basename(target)} ({len(data) // 1024} KB)")
         else:
             QMessageBox.warning(self, "失敗", "抽出に失敗しました。")
 
@@ -172,23 +180,27 @@ class Step6ArtworkPanel(QWidget):
     def on_optimize(self):
         if not self.album_folder:
             return
-        if not self.source_image or not os.path.exists(self.source_image):
+        if not self.source_image or (isinstance(self.source_image, str) and not os.path.exists(self.source_image)):
             QMessageBox.warning(self, "未選択", "先にアートワーク元を抽出/選択してください。")
             return
         magick = self.config.get_tool_path("Magick")
-        if not magick:
-            QMessageBox.warning(self, "未設定", "magick.exe のパスを config.ini に設定してください。")
+        if not magick and not ah.pillow_available():
+            QMessageBox.warning(self, "未設定", "Pillow をインストールするか、magick.exe のパスを config.ini に設定してください。")
             return
-        width = int(self.config.get_setting("ResizeWidth", "600"))
-        jpg_q = int(self.config.get_setting("JpegQuality", "85"))
-        webp_q = int(self.config.get_setting("WebpQuality", "85"))
-        ok, p1, p2 = ah.ensure_artwork_resized_outputs(self.album_folder, magick, self.source_image, width, jpg_q, webp_q)
-        if not ok:
-            QMessageBox.critical(self, "失敗", f"最適化失敗: {p1}")
+        result = ah.optimize_album_artwork(self.album_folder, magick, self.source_image,
+                                          ah.ArtworkOptions.from_config(self.config),
+                                          cache=get_artwork_cache(self.config))
+        if not result.ok:
+            QMessageBox.critical(self, "失敗", f"最適化失敗: {result.error}")
             return
-        self.lbl_result.setText(f"生成: {os.path.relpath(p1, self.album_folder)}, {os.path.relpath(p2, self.album_folder)}")
+        self.lbl_result.setText(
+            f"生成: {os.path.relpath(result.jpg_path, self.album_folder)}, "
+            f"{os.path.relpath(result.webp_path, self.album_folder)} ({result.summary()})"
+        )
         if self.workflow.state:
-            self.workflow.state.set_artwork(True)
+            with self.workflow.state.transaction():
+                self.workflow.state.set_artwork(True)
+                self.workflow.state.set_artwork_params(result.params)
         
         # 最適化完了後、自動的にAAC/Opusに埋め込む
         self._auto_embed_artwork()
@@ -232,6 +244,32 @@ class Step6ArtworkPanel(QWidget):
 
         return candidates[0]
 
+    def _embed_folder(self, folder: str, ext: str, image_path: str, label: str) -> tuple[int, int, WriteStats]:
+        """
+        フォルダ内の ext のファイル全てに表紙を並列で埋め込む
+
+        表紙（画像データ・MP4Cover / base64 の Picture）はここで一度だけ用意して使い回す。
+
+        Returns:
+            (成功数, 失敗数, 集計)
+        """
+        stats = WriteStats(f"{label} アートワーク埋め込み")
+        paths = [os.path.join(folder, name) for name in sorted(os.listdir(folder))
+                 if name.lower().endswith(ext)]
+        cover = ah.prepare_cover(image_path)
+        if cover is None:
+            return 0, len(paths), stats
+        try:
+            workers = int(self.config.get_setting("ArtworkEmbedWorkers", str(ah.DEFAULT_EMBED_WORKERS)) or 0)
+        except ValueError:
+            workers = ah.DEFAULT_EMBED_WORKERS
+        reports = ah.embed_artwork_batch(paths, cover, stats, max_workers=workers or ah.DEFAULT_EMBED_WORKERS)
+        for report in reports:
+            if not report.ok:
+                print(f"[WARN] {label} embed failed: {os.path.basename(report.path)}: {report.error}")
+        stats.print_summary()
+        return len(reports) - len(stats.failed), len(stats.failed), stats
+
     def _auto_embed_artwork(self):
         """最適化完了後に自動的にAAC/Opusへアートワークを埋め込む"""
         if not self.album_folder or not self.workflow.state:
@@ -245,19 +283,8 @@ class Step6ArtworkPanel(QWidget):
             aac_dir = self._resolve_codec_output_dir("aacOutput")
             
             if aac_dir and os.path.isdir(aac_dir):
-                aac_ok = 0
-                aac_err = 0
-                for name in os.listdir(aac_dir):
-                    if not name.lower().endswith('.m4a'):
-                        continue
-                    path = os.path.join(aac_dir, name)
-                    ok, err = ah.embed_artwork_to_mp4(path, jpg_img)
-                    if ok:
-                        aac_ok += 1
-                    else:
-                        aac_err += 1
-                        print(f"[WARN] AAC embed failed: {name}: {err}")
-                results.append(f"AAC (JPG): {aac_ok}成功 / {aac_err}失敗")
+                aac_ok, aac_err, aac_stats = self._embed_folder(aac_dir, '.m4a', jpg_img, "AAC")
+                results.append(f"AAC (JPG): {aac_ok}成功 / {aac_err}失敗 (全体書き直し {len(aac_stats.rewritten)})")
             else:
                 print(f"[INFO] AAC出力フォルダが存在しません: {aac_dir}")
         
@@ -267,19 +294,8 @@ class Step6ArtworkPanel(QWidget):
             opus_dir = self._resolve_codec_output_dir("opusOutput")
             
             if opus_dir and os.path.isdir(opus_dir):
-                opus_ok = 0
-                opus_err = 0
-                for name in os.listdir(opus_dir):
-                    if not name.lower().endswith('.opus'):
-                        continue
-                    path = os.path.join(opus_dir, name)
-                    ok, err = ah.embed_artwork_to_opus(path, webp_img)
-                    if ok:
-                        opus_ok += 1
-                    else:
-                        opus_err += 1
-                        print(f"[WARN] Opus embed failed: {name}: {err}")
-                results.append(f"Opus (WebP): {opus_ok}成功 / {opus_err}失敗")
+                opus_ok, opus_err, opus_stats = self._embed_folder(opus_dir, '.opus', webp_img, "Opus")
+                results.append(f"Opus (WebP): {opus_ok}成功 / {opus_err}失敗 (全体書き直し {len(opus_stats.rewritten)})")
             else:
                 print(f"[INFO] Opus出力フォルダが存在しません: {opus_dir}")
         
@@ -310,18 +326,8 @@ class Step6ArtworkPanel(QWidget):
         if not os.path.isdir(aac_dir):
             QMessageBox.warning(self, "未取り込み", f"_aac_output/{sanitized_artist_name}/{sanitized_album_name} が見つかりません。先に Step4 を完了してください。")
             return
-        ok_cnt = 0
-        err_cnt = 0
-        for name in os.listdir(aac_dir):
-            if not name.lower().endswith('.m4a'):
-                continue
-            path = os.path.join(aac_dir, name)
-            ok, err = ah.embed_artwork_to_mp4(path, img)
-            if ok: ok_cnt += 1
-            else:
-                err_cnt += 1
-                print(f"[WARN] AAC embed failed: {name}: {err}")
-        QMessageBox.information(self, "AAC 埋め込み", f"成功: {ok_cnt} / 失敗: {err_cnt}")
+        ok_cnt, err_cnt, stats = self._embed_folder(aac_dir, '.m4a', img, "AAC")
+        QMessageBox.information(self, "AAC 埋め込み", f"成功: {ok_cnt} / 失敗: {err_cnt}\n全体書き直し: {len(stats.rewritten)}")
 
     def on_embed_opus(self):
         """Opus ファイルにカバー画像を埋め込む（WebP形式を優先使用）"""
@@ -346,18 +352,8 @@ class Step6ArtworkPanel(QWidget):
         if not os.path.isdir(opus_dir):
             QMessageBox.warning(self, "未取り込み", f"_opus_output/{sanitized_artist_name}/{sanitized_album_name} が見つかりません。先に Step5 を完了してください。")
             return
-        ok_cnt = 0
-        err_cnt = 0
-        for name in os.listdir(opus_dir):
-            if not name.lower().endswith('.opus'):
-                continue
-            path = os.path.join(opus_dir, name)
-            ok, err = ah.embed_artwork_to_opus(path, img)
-            if ok: ok_cnt += 1
-            else:
-                err_cnt += 1
-                print(f"[WARN] Opus embed failed: {name}: {err}")
-        QMessageBox.information(self, "Opus 埋め込み", f"WebP埋め込み 成功: {ok_cnt} / 失敗: {err_cnt}")
+        ok_cnt, err_cnt, stats = self._embed_folder(opus_dir, '.opus', img, "Opus")
+        QMessageBox.information(self, "Opus 埋め込み", f"WebP埋め込み 成功: {ok_cnt} / 失敗: {err_cnt}\n全体書き直し: {len(stats.rewritten)}")
 
     def _launch_mp3tag(self, target_dir: str):
         exe = self.config.get_tool_path("Mp3Tag")
@@ -441,8 +437,9 @@ class Step6ArtworkPanel(QWidget):
         
         # ステップ完了フラグを設定
         if self.workflow.state:
-            self.workflow.state.set_artwork(True)
-            self.workflow.state.mark_step_completed("step6_artwork")
+            with self.workflow.state.transaction():
+                self.workflow.state.set_artwork(True)
+                self.workflow.state.mark_step_completed("step6_artwork")
             print("[DEBUG] Step6: ステップ完了フラグを設定しました")
         
         self.step_completed.emit()
@@ -12,7 +12,8 @@ from PySide6.QtCore import Signal
 from logic.config_manager import ConfigManager
 from logic.workflow_manager import WorkflowManager
 from logic.external_tools import ExternalToolRunner
-from logic.artwork_handler import extract_artwork_from_flac, resize_artwork_with_magick
+from logic.artwork_handler import ArtworkOptions, optimize_album_artwork, pillow_available, read_artwork_from_flac
+from logic.artwork_cache import get_artwork_cache
 from send2trash import send2trash
 
 
@@ -108,8 +109,8 @@ class GenericStepPanel(QWidget):
                 "【自動処理】\n"
                 "「実行」ボタンを押すと、自動的に:\n"
                 "1. 1曲目のFLACからアートワークを抽出\n"
-                "2. ImageMagick で JPG (Q85) にリサイズ\n"
-                "3. ImageMagick で WebP (Q85) にリサイズ\n"
+                "2. 600x600 にリサイズし JPG (Q85) で保存\n"
+                "3. 同じ画像から WebP (Q85) で保存\n"
                 "4. '_artwork_resized' フォルダに保存"
             )
             self.action_button.setText("自動実行")
@@ -254,52 +255,39 @@ class GenericStepPanel(QWidget):
             QMessageBox.warning(self, "エラー", "1曲目のFLACファイルが見つかりません。")
             return
         
-        # 出力フォルダを作成
-        artwork_dir = os.path.join(self.album_folder, "_artwork_resized")
-        os.makedirs(artwork_dir, exist_ok=True)
-        
-        # アートワークを抽出
-        temp_image = os.path.join(artwork_dir, "cover_temp.jpg")
-        if not extract_artwork_from_flac(first_flac, temp_image):
+        # アートワークを抽出（一時ファイルには書かずメモリ上で扱う）
+        try:
+            artwork_data = read_artwork_from_flac(first_flac)
+        except Exception as e:
+            print(f"[ERROR] アートワーク抽出エラー: {e}")
+            artwork_data = None
+        if not artwork_data:
             QMessageBox.critical(self, "エラー", "アートワークの抽出に失敗しました。")
             return
         
-        # magick でリサイズ
+        # Pillow でリサイズ（使えない場合のみ magick）
         magick_path = self.config.get_tool_path("Magick")
-        if not magick_path:
-            QMessageBox.warning(self, "警告", "magick.exe が見つかりません。")
-            return
-        
-        jpeg_quality = int(self.config.get_setting("JpegQuality", "85"))
-        webp_quality = int(self.config.get_setting("WebpQuality", "85"))
-        width = int(self.config.get_setting("ResizeWidth", "600"))
-        
-        # JPG
-        jpg_output = os.path.join(artwork_dir, "cover.jpg")
-        success, error = resize_artwork_with_magick(
-            magick_path, temp_image, jpg_output, width, jpeg_quality, "jpg"
-        )
-        if not success:
-            QMessageBox.critical(self, "エラー", f"JPGリサイズ失敗:\n{error}")
+        if not magick_path and not pillow_available():
+            QMessageBox.warning(self, "警告", "Pillow がインストールされておらず、magick.exe も見つかりません。")
             return
         
-        # WebP
-        webp_output = os.path.join(artwork_dir, "cover.webp")
-        success, error = resize_artwork_with_magick(
-            magick_path, temp_image, webp_output, width, webp_quality, "webp"
+        result = optimize_album_artwork(
+            self.album_folder, magick_path, artwork_data, ArtworkOptions.from_config(self.config),
+            cache=get_artwork_cache(self.config)
         )
-        if not success:
-            QMessageBox.critical(self, "エラー", f"WebPリサイズ失敗:\n{error}")
+        if not result.ok:
+            QMessageBox.critical(self, "エラー", f"リサイズ失敗:\n{result.error}")
             return
-        
-        # 一時ファイルを削除
-        os.remove(temp_image)
+        artwork_dir = os.path.dirname(result.jpg_path)
+        if self.workflow.state:
+            self.workflow.state.set_artwork_params(result.params)
         
         QMessageBox.information(
             self,
             "完了",
             f"アートワークのリサイズが完了しました。\n\n"
-            f"出力先: {artwork_dir}"
+            f"出力先: {artwork_dir}\n"
+            f"{result.summary()}"
         )
     
     def copy_to_final_flac(self):
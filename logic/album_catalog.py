@@ -0,0 +1,370 @@
+"""
+WorkDir 全体のアルバム状態カタログ (SQLite)
+
+各アルバムの state.json を正とし、その要約（アルバム名・ステップ・ステータス・
+エラー・トラック数・完了フラグ）を WorkDir 直下の SQLite ファイルに写しておく。
+「Step4 のアルバム一覧」「ERROR のアルバム一覧」などを state.json を開かずに取得できる。
+
+コマンドラインからの再構築・整合性チェック:
+    python -m logic.album_catalog --rebuild
+    python -m logic.album_catalog --check [--work-dir DIR]
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Optional
+
+from .state_manager import StateManager
+
+
+CATALOG_FILENAME = "_album_catalog.sqlite3"
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS albums (
+    folder TEXT PRIMARY KEY,
+    album_name TEXT,
+    artist_name TEXT,
+    current_step INTEGER,
+    status TEXT,
+    last_error TEXT,
+    last_error_step INTEGER,
+    track_count INTEGER,
+    instrumental_count INTEGER,
+    paired_instrumental_count INTEGER,
+    has_artwork INTEGER,
+    completed_steps TEXT,
+    state_signature TEXT,
+    synced_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_albums_step ON albums(current_step);
+CREATE INDEX IF NOT EXISTS idx_albums_status ON albums(status);
+"""
+
+# 比較対象の列（整合性チェック用）
+_SUMMARY_COLUMNS = (
+    "album_name", "artist_name", "current_step", "status", "last_error",
+    "last_error_step", "track_count", "instrumental_count",
+    "paired_instrumental_count", "has_artwork", "completed_steps",
+)
+
+
+def state_signature(album_folder: str) -> Optional[str]:
+    """state.json（とジャーナル）の更新検知用シグネチャ。state.json が無ければ None"""
+    parts = []
+    for name in ("state.json", "state.journal"):
+        try:
+            st = os.stat(os.path.join(album_folder, name))
+            parts.append(f"{st.st_mtime_ns}:{st.st_size}")
+        except OSError:
+            if name == "state.json":
+                return None
+            parts.append("-")
+    return "|".join(parts)
+
+
+def summarize_state(state: dict) -> dict:
+    """state 辞書からカタログに載せる要約を作る"""
+    tracks = state.get("tracks", []) or []
+    last_error = state.get("lastError") or {}
+    has_artwork = state.get("hasArtwork")
+    completed = state.get("completedSteps", {}) or {}
+    return {
+        "album_name": state.get("albumName", "Unknown Album"),
+        "artist_name": state.get("artistName", "Unknown Artist"),
+        "current_step": int(state.get("currentStep", 1) or 1),
+        "status": state.get("status", "WAITING_USER"),
+        "last_error": last_error.get("message") if isinstance(last_error, dict) else None,
+        "last_error_step": last_error.get("step") if isinstance(last_error, dict) else None,
+        "track_count": len(tracks),
+        "instrumental_count": sum(1 for t in tracks if t.get("isInstrumental")),
+        "paired_instrumental_count": sum(
+            1 for t in tracks if t.get("hasInstrumental") or t.get("instrumentalFile")
+        ),
+        "has_artwork": None if has_artwork is None else int(bool(has_artwork)),
+        "completed_steps": json.dumps(
+            sorted(k for k, v in completed.items() if v), ensure_ascii=False
+        ),
+    }
+
+
+class AlbumCatalog:
+    """WorkDir 直下の SQLite カタログ"""
+
+    def __init__(self, work_dir: str, db_path: Optional[str] = None):
+        self.work_dir = work_dir
+        self.db_path = db_path or os.path.join(work_dir, CATALOG_FILENAME)
+        self._lock = threading.RLock()
+        # GUI スレッドと一括処理スレッドの両方から使うため、接続は共有してロックで直列化する
+        # （WAL は NAS 上で使えないため既定のジャーナルモードのまま）
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._init_schema()
+
+    def close(self):
+        with self._lock:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+
+    def _init_schema(self):
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+            row = self._conn.execute(
+                "SELECT value FROM meta WHERE key = 'schema_version'"
+            ).fetchone()
+            if row is None or int(row["value"]) != SCHEMA_VERSION:
+                # カタログは state.json から再生成できるので、スキーマ変更時は作り直す
+                self._conn.execute("DELETE FROM albums")
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta(key, value) VALUES ('schema_version', ?)",
+                    (str(SCHEMA_VERSION),)
+                )
+
+    # ------------------------
+    # 同期
+    # ------------------------
+    def _key(self, album_folder: str) -> str:
+        return os.path.basename(os.path.normpath(album_folder))
+
+    def _folder(self, key: str) -> str:
+        return os.path.join(self.work_dir, key)
+
+    def upsert_state(self, album_folder: str, state: dict, signature: Optional[str] = None):
+        """読み込み済みの state を反映（AlbumIndex など既に state を読んだ側から呼ぶ）"""
+        summary = summarize_state(state)
+        if signature is None:
+            signature = state_signature(album_folder)
+        columns = ("folder",) + _SUMMARY_COLUMNS + ("state_signature", "synced_at")
+        values = [self._key(album_folder)] + [summary[c] for c in _SUMMARY_COLUMNS]
+        values += [signature, datetime.now().isoformat()]
+        placeholders = ", ".join("?" for _ in columns)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO albums({', '.join(columns)}) VALUES ({placeholders})",
+                values
+            )
+
+    def remove_album(self, album_folder: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM albums WHERE folder = ?", (self._key(album_folder),))
+
+    def sync_album(self, album_folder: str, force: bool = False) -> bool:
+        """
+        1アルバム分を state.json から同期
+
+        Returns:
+            カタログを更新（または削除）した場合 True
+        """
+        signature = state_signature(album_folder)
+        if signature is None:
+            with self._lock, self._conn:
+                cur = self._conn.execute(
+                    "DELETE FROM albums WHERE folder = ?", (self._key(album_folder),)
+                )
+                return cur.rowcount > 0
+
+        if not force:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT state_signature FROM albums WHERE folder = ?",
+                    (self._key(album_folder),)
+                ).fetchone()
+            if row is not None and row["state_signature"] == signature:
+                return False
+
+        state = StateManager(album_folder)
+        if not state.load():
+            # 読めない場合は既存の行を残す（次回の同期で再試行）
+            return False
+        self.upsert_state(album_folder, state.state, signature)
+        return True
+
+    def _scan_album_folders(self) -> list[str]:
+        folders = []
+        if not self.work_dir or not os.path.isdir(self.work_dir):
+            return folders
+        with os.scandir(self.work_dir) as it:
+            for entry in it:
+                if entry.is_dir() and os.path.exists(os.path.join(entry.path, "state.json")):
+                    folders.append(entry.path)
+        return folders
+
+    def sync_all(self, force: bool = False) -> tuple[int, int]:
+        """
+        WorkDir 全体を同期（state.json が変化したアルバムだけ読み直す）
+
+        Returns:
+            (更新件数, 削除件数)
+        """
+        updated = 0
+        try:
+            folders = self._scan_album_folders()
+        except Exception as e:
+            print(f"[ERROR] カタログ同期: WorkDir の走査に失敗: {e}")
+            return 0, 0
+
+        present = set()
+        for folder in folders:
+            present.add(self._key(folder))
+            if self.sync_album(folder, force=force):
+                updated += 1
+
+        with self._lock, self._conn:
+            stale = [
+                row["folder"] for row in self._conn.execute("SELECT folder FROM albums")
+                if row["folder"] not in present
+            ]
+            self._conn.executemany("DELETE FROM albums WHERE folder = ?", [(k,) for k in stale])
+        return updated, len(stale)
+
+    def rebuild(self) -> int:
+        """カタログを破棄して全アルバムから作り直す。登録件数を返す"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM albums")
+        updated, _ = self.sync_all(force=True)
+        return updated
+
+    def check_consistency(self) -> list[str]:
+        """
+        カタログと state.json の食い違いを列挙（カタログは変更しない）
+
+        Returns:
+            問題点のメッセージ一覧（空なら整合）
+        """
+        issues = []
+        try:
+            folders = {self._key(f): f for f in self._scan_album_folders()}
+        except Exception as e:
+            return [f"WorkDir の走査に失敗: {e}"]
+
+        with self._lock:
+            rows = {row["folder"]: dict(row) for row in self._conn.execute("SELECT * FROM albums")}
+
+        for key in sorted(set(rows) - set(folders)):
+            issues.append(f"{key}: カタログにあるが state.json が存在しない")
+        for key in sorted(set(folders) - set(rows)):
+            issues.append(f"{key}: state.json があるがカタログに未登録")
+
+        for key in sorted(set(rows) & set(folders)):
+            folder = folders[key]
+            state = StateManager(folder)
+            if not state.load():
+                issues.append(f"{key}: state.json を読み込めない")
+                continue
+            summary = summarize_state(state.state)
+            row = rows[key]
+            for column in _SUMMARY_COLUMNS:
+                if row[column] != summary[column]:
+                    issues.append(f"{key}: {column} が不一致 (カタログ={row[column]!r}, state.json={summary[column]!r})")
+            if row["state_signature"] != state_signature(folder):
+                issues.append(f"{key}: カタログ同期後に state.json が更新されている")
+        return issues
+
+    # ------------------------
+    # 問い合わせ
+    # ------------------------
+    def _rows(self, sql: str, params: tuple = ()) -> list[dict]:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        result = []
+        for row in rows:
+            item = dict(row)
+            item["album_folder"] = self._folder(item["folder"])
+            try:
+                item["completed_steps"] = json.loads(item.get("completed_steps") or "[]")
+            except ValueError:
+                item["completed_steps"] = []
+            result.append(item)
+        return result
+
+    def get_album(self, album_folder: str) -> Optional[dict]:
+        rows = self._rows("SELECT * FROM albums WHERE folder = ?", (self._key(album_folder),))
+        return rows[0] if rows else None
+
+    def all_albums(self) -> list[dict]:
+        return self._rows("SELECT * FROM albums ORDER BY folder")
+
+    def albums_at_step(self, step: int) -> list[dict]:
+        return self._rows(
+            "SELECT * FROM albums WHERE current_step = ? ORDER BY folder", (step,)
+        )
+
+    def albums_with_status(self, status: str) -> list[dict]:
+        return self._rows(
+            "SELECT * FROM albums WHERE status = ? ORDER BY folder", (status,)
+        )
+
+    def albums_in_step_range(self, start_step: int, end_step: int, include_completed: bool = False) -> list[dict]:
+        """ステップ範囲内のアルバム（一括処理の候補）"""
+        sql = "SELECT * FROM albums WHERE current_step BETWEEN ? AND ?"
+        if not include_completed:
+            sql += " AND status != 'COMPLETED'"
+        return self._rows(sql + " ORDER BY folder", (start_step, end_step))
+
+    def step_counts(self) -> dict[int, int]:
+        """ステップごとのアルバム数"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT current_step, COUNT(*) AS n FROM albums GROUP BY current_step"
+            ).fetchall()
+        return {row["current_step"]: row["n"] for row in rows}
+
+    def is_step_completed(self, album_folder: str, step_key: str) -> Optional[bool]:
+        """カタログ上の完了フラグ（未登録なら None）"""
+        album = self.get_album(album_folder)
+        if album is None:
+            return None
+        return step_key in album["completed_steps"]
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="WorkDir のアルバムカタログを管理します")
+    parser.add_argument("--work-dir", help="作業フォルダ（省略時は config.ini の WorkDir）")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--rebuild", action="store_true", help="カタログを state.json から作り直す")
+    group.add_argument("--check", action="store_true", help="カタログと state.json の整合性をチェック")
+    group.add_argument("--sync", action="store_true", help="変更のあったアルバムだけ同期")
+    args = parser.parse_args(argv)
+
+    work_dir = args.work_dir
+    if not work_dir:
+        from .config_manager import ConfigManager
+        work_dir = ConfigManager().get_directory("WorkDir")
+    if not work_dir or not os.path.isdir(work_dir):
+        print(f"[ERROR] 作業フォルダが見つかりません: {work_dir}")
+        return 2
+
+    catalog = AlbumCatalog(work_dir)
+    try:
+        if args.rebuild:
+            count = catalog.rebuild()
+            print(f"[INFO] カタログを再構築しました: {count} アルバム")
+            return 0
+        if args.sync:
+            updated, removed = catalog.sync_all()
+            print(f"[INFO] カタログを同期しました: 更新 {updated} / 削除 {removed}")
+            return 0
+        issues = catalog.check_consistency()
+        if not issues:
+            print("[INFO] カタログは state.json と整合しています")
+            return 0
+        for issue in issues:
+            print(f"[WARN] {issue}")
+        print(f"[WARN] {len(issues)} 件の不整合があります（--rebuild で修復できます）")
+        return 1
+    finally:
+        catalog.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
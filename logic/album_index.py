@@ -0,0 +1,221 @@
+"""
+WorkDir 配下のアルバム一覧をイベント駆動で管理するモジュール
+
+QFileSystemWatcher で WorkDir と各アルバムの state.json を監視し、
+変更があった state.json だけを読み直す。NAS 等で通知が届かない環境向けに
+低頻度の定期スキャン（stat 比較のみ）をフォールバックとして併用する。
+カタログ (AlbumCatalog) が渡された場合は、読み直した state をそのまま反映する。
+"""
+import os
+from typing import Optional
+from PySide6.QtCore import QObject, QTimer, QFileSystemWatcher, Signal
+
+from .state_manager import StateManager
+from .workflow_manager import WorkflowManager
+from .album_catalog import AlbumCatalog, state_signature
+
+
+class AlbumEntry:
+    """アルバム一覧の1行分の情報"""
+
+    __slots__ = ("folder", "display_name", "signature")
+
+    def __init__(self, folder: str, display_name: str, signature: str):
+        self.folder = folder
+        self.display_name = display_name
+        # state.json / state.journal の更新シグネチャ。変化が無ければ読み直さない
+        self.signature = signature
+
+
+class AlbumIndex(QObject):
+    """WorkDir 内アルバムのインクリメンタルなインデックス"""
+
+    album_added = Signal(str, str)    # album_folder, display_name
+    album_updated = Signal(str, str)  # album_folder, display_name
+    album_removed = Signal(str)       # album_folder
+
+    # 監視イベントをまとめて処理するまでの待ち時間（ミリ秒）
+    DEBOUNCE_MS = 200
+    # 監視が効かない環境向けのフォールバック走査間隔（ミリ秒）
+    FALLBACK_INTERVAL_MS = 30000
+
+    def __init__(self, work_dir: str = "", catalog: Optional[AlbumCatalog] = None, parent=None):
+        super().__init__(parent)
+        self.work_dir = work_dir
+        self.catalog = catalog
+        self.entries: dict[str, AlbumEntry] = {}
+        self._dirty: set[str] = set()
+        self._rescan_dir = False
+
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._on_directory_changed)
+        self._watcher.fileChanged.connect(self._on_file_changed)
+
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(self.DEBOUNCE_MS)
+        self._debounce.timeout.connect(self._process_pending)
+
+        self._fallback = QTimer(self)
+        self._fallback.setInterval(self.FALLBACK_INTERVAL_MS)
+        self._fallback.timeout.connect(self.refresh)
+
+    # ------------------------
+    # public
+    # ------------------------
+    def start(self):
+        """監視を開始し、初回スキャンを行う"""
+        self._rebind_watcher()
+        self.refresh()
+        self._fallback.start()
+
+    def stop(self):
+        """監視を停止"""
+        self._fallback.stop()
+        self._debounce.stop()
+        self._clear_watcher()
+
+    def set_work_dir(self, work_dir: str, catalog: Optional[AlbumCatalog] = None):
+        """WorkDir を切り替える（設定変更時）"""
+        if os.path.abspath(work_dir or "") == os.path.abspath(self.work_dir or ""):
+            return
+        self.work_dir = work_dir
+        # 旧 WorkDir の行は旧カタログに残したまま一覧からだけ外す
+        self.catalog = None
+        for folder in list(self.entries.keys()):
+            self._remove(folder)
+        self.catalog = catalog
+        self._rebind_watcher()
+        self.refresh()
+
+    def refresh(self):
+        """WorkDir を走査し、state.json が変化したアルバムだけを読み直す"""
+        if not self.work_dir or not os.path.isdir(self.work_dir):
+            return
+
+        seen = set()
+        try:
+            with os.scandir(self.work_dir) as it:
+                for entry in it:
+                    if not entry.is_dir():
+                        continue
+                    folder = entry.path
+                    state_path = os.path.join(folder, "state.json")
+                    if not os.path.exists(state_path):
+                        continue
+                    seen.add(folder)
+                    self._sync_album(folder)
+        except Exception as e:
+            print(f"[ERROR] アルバムリストの更新に失敗: {e}")
+            return
+
+        for folder in list(self.entries.keys()):
+            if folder not in seen:
+                self._remove(folder)
+
+    def display_name(self, album_folder: str) -> Optional[str]:
+        """インデックス済みの表示名を取得"""
+        entry = self.entries.get(album_folder)
+        return entry.display_name if entry else None
+
+    # ------------------------
+    # internal
+    # ------------------------
+    def _sync_album(self, folder: str):
+        """1アルバム分の state.json を必要な場合のみ読み直す"""
+        state_path = os.path.join(folder, "state.json")
+        signature = state_signature(folder)
+        if signature is None:
+            self._remove(folder)
+            return
+
+        entry = self.entries.get(folder)
+        if entry and entry.signature == signature:
+            return
+
+        state = StateManager(folder)
+        if not state.load():
+            # 読み込み失敗（書き込み途中など）でも既存行は消さず、次回の変更通知で再読込する
+            print(f"[WARN] state.json を読み込めませんでした（次回再試行）: {state_path}")
+            return
+
+        display_name = WorkflowManager.format_album_display_name(state.state)
+        if self.catalog:
+            try:
+                self.catalog.upsert_state(folder, state.state, signature)
+            except Exception as e:
+                print(f"[WARN] カタログの更新に失敗: {e}")
+        if entry is None:
+            self.entries[folder] = AlbumEntry(folder, display_name, signature)
+            self._watch_album(folder)
+            self.album_added.emit(folder, display_name)
+        else:
+            entry.signature = signature
+            if entry.display_name != display_name:
+                entry.display_name = display_name
+                self.album_updated.emit(folder, display_name)
+            # state.json が置き換えられた場合はファイル監視が外れるため張り直す
+            self._watch_album(folder)
+
+    def _remove(self, folder: str):
+        if self.entries.pop(folder, None) is None:
+            return
+        if self.catalog:
+            try:
+                self.catalog.remove_album(folder)
+            except Exception as e:
+                print(f"[WARN] カタログからの削除に失敗: {e}")
+        self._unwatch_album(folder)
+        self.album_removed.emit(folder)
+
+    def _rebind_watcher(self):
+        self._clear_watcher()
+        if self.work_dir and os.path.isdir(self.work_dir):
+            self._watcher.addPath(self.work_dir)
+        for folder in self.entries:
+            self._watch_album(folder)
+
+    def _clear_watcher(self):
+        paths = self._watcher.directories() + self._watcher.files()
+        if paths:
+            self._watcher.removePaths(paths)
+
+    def _watch_album(self, folder: str):
+        watched_dirs = set(self._watcher.directories())
+        watched_files = set(self._watcher.files())
+        if folder not in watched_dirs and os.path.isdir(folder):
+            self._watcher.addPath(folder)
+        state_path = os.path.join(folder, "state.json")
+        if state_path not in watched_files and os.path.exists(state_path):
+            self._watcher.addPath(state_path)
+
+    def _unwatch_album(self, folder: str):
+        state_path = os.path.join(folder, "state.json")
+        for path in (folder, state_path):
+            if path in self._watcher.directories() or path in self._watcher.files():
+                self._watcher.removePath(path)
+
+    def _on_directory_changed(self, path: str):
+        if os.path.abspath(path) == os.path.abspath(self.work_dir or ""):
+            # アルバムフォルダの追加・削除
+            self._rescan_dir = True
+        else:
+            self._dirty.add(path)
+        self._debounce.start()
+
+    def _on_file_changed(self, path: str):
+        self._dirty.add(os.path.dirname(path))
+        self._debounce.start()
+
+    def _process_pending(self):
+        """まとめた変更通知を処理"""
+        dirty, self._dirty = self._dirty, set()
+        if self._rescan_dir:
+            self._rescan_dir = False
+            self.refresh()
+            return
+        for folder in dirty:
+            if os.path.exists(os.path.join(folder, "state.json")):
+                self._sync_album(folder)
+            else:
+                self._remove(folder)
@@ -0,0 +1,259 @@
+"""
+アルバム状態の型付きモデル
+
+state.json の tracks（dict のリスト）をそのまま保持しつつ、
+Track / AlbumState から型付きでアクセスし、id・originalFile・currentFile・
+instrumentalFile の索引で O(1) 検索できるようにする。
+
+Track は元の dict を包むだけなので、to_dict() で state.json のスキーマへ
+欠落なく戻せる（未知のキーや並び順もそのまま残る）。
+"""
+import copy
+from typing import Any, Iterator, Optional
+
+
+class Track:
+    """1トラック分のビュー（実体は state.json の track dict）"""
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data: Optional[dict] = None):
+        self._data = data if data is not None else {}
+
+    def __repr__(self) -> str:
+        return f"Track(id={self.id!r}, originalFile={self.original_file!r})"
+
+    @property
+    def data(self) -> dict:
+        """元の dict（既存コードとの受け渡し用）"""
+        return self._data
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._data.get(key, default)
+
+    @property
+    def id(self) -> str:
+        return self._data.get("id", "")
+
+    @property
+    def original_file(self) -> str:
+        return self._data.get("originalFile", "") or ""
+
+    @property
+    def current_file(self) -> str:
+        return self._data.get("currentFile", "") or ""
+
+    @property
+    def final_file(self) -> str:
+        return self._data.get("finalFile", "") or ""
+
+    @property
+    def instrumental_file(self) -> str:
+        return self._data.get("instrumentalFile", "") or ""
+
+    @property
+    def current_inst_file(self) -> str:
+        return self._data.get("currentInstFile", "") or ""
+
+    @property
+    def demucs_target(self) -> bool:
+        return bool(self._data.get("demucsTarget", True))
+
+    @property
+    def is_instrumental(self) -> bool:
+        return bool(self._data.get("isInstrumental", False))
+
+    @property
+    def has_instrumental(self) -> bool:
+        return bool(self._data.get("hasInstrumental", False))
+
+    def to_dict(self) -> dict:
+        return copy.deepcopy(self._data)
+
+
+class AlbumState:
+    """
+    アルバム全体のモデル（state 辞書を共有し、トラックの索引を持つ）
+
+    索引の更新は update_track / add_track 経由で行う。
+    track dict を直接書き換えた場合は reindex() するか作り直すこと
+    （StateManager.get_album() は state の差し替え・mark_dirty() の後に作り直す。
+    update_track は索引した時点の値と食い違うトラックに気付いたら作り直してから更新する）。
+    """
+
+    __slots__ = ("_state", "_tracks_ref", "tracks", "_by_id", "_pos", "_indexes", "_indexed")
+
+    # 索引を持つフィールド
+    INDEXED_FIELDS = ("originalFile", "currentFile", "instrumentalFile", "currentInstFile")
+
+    def __init__(self, state: dict):
+        self._state = state
+        self._tracks_ref = state.setdefault("tracks", [])
+        self.tracks: list[Track] = []
+        self._by_id: dict[str, Track] = {}
+        self._pos: dict[int, int] = {}
+        self._indexes: dict[str, dict[str, list[Track]]] = {}
+        # id(track) -> 索引に載せた時点の値（INDEXED_FIELDS の順）
+        self._indexed: dict[int, tuple] = {}
+        self.reindex()
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "AlbumState":
+        return cls(state)
+
+    def to_dict(self) -> dict:
+        """state.json と同じ構造の dict（コピー）を返す"""
+        return copy.deepcopy(self._state)
+
+    def is_stale(self, state: dict) -> bool:
+        """state 辞書や tracks リストが差し替えられていないか"""
+        tracks = state.get("tracks")
+        return (
+            state is not self._state
+            or tracks is not self._tracks_ref
+            or len(tracks) != len(self.tracks)
+        )
+
+    def reindex(self):
+        """索引を作り直す（O(n)）"""
+        self.tracks = [Track(d) for d in self._tracks_ref]
+        self._by_id = {}
+        self._pos = {}
+        self._indexes = {field: {} for field in self.INDEXED_FIELDS}
+        self._indexed = {}
+        for pos, track in enumerate(self.tracks):
+            self._index_track(track, pos)
+
+    def _index_track(self, track: Track, pos: int):
+        self._pos[id(track)] = pos
+        track_id = track.id
+        if track_id and track_id not in self._by_id:
+            self._by_id[track_id] = track
+        for field in self.INDEXED_FIELDS:
+            value = track.get(field)
+            if value:
+                self._indexes[field].setdefault(value, []).append(track)
+        self._indexed[id(track)] = self._indexed_values(track)
+
+    def _indexed_values(self, track: Track) -> tuple:
+        return tuple(track.get(field) for field in self.INDEXED_FIELDS)
+
+    # ------------------------
+    # アルバム情報
+    # ------------------------
+    @property
+    def album_name(self) -> str:
+        return self._state.get("albumName", "Unknown Album")
+
+    @property
+    def artist_name(self) -> str:
+        return self._state.get("artistName", "Unknown Artist")
+
+    @property
+    def current_step(self) -> int:
+        return self._state.get("currentStep", 1)
+
+    @property
+    def status(self) -> str:
+        return self._state.get("status", "WAITING_USER")
+
+    # ------------------------
+    # 検索
+    # ------------------------
+    def __len__(self) -> int:
+        return len(self.tracks)
+
+    def __iter__(self) -> Iterator[Track]:
+        return iter(self.tracks)
+
+    def get(self, track_id: str) -> Optional[Track]:
+        return self._by_id.get(track_id)
+
+    def _first(self, field: str, value: str) -> Optional[Track]:
+        if not value:
+            return None
+        found = self._indexes[field].get(value)
+        return found[0] if found else None
+
+    def find_by_original_file(self, filename: str) -> Optional[Track]:
+        return self._first("originalFile", filename)
+
+    def find_by_current_file(self, filename: str) -> Optional[Track]:
+        return self._first("currentFile", filename)
+
+    def find_by_instrumental_file(self, filename: str) -> Optional[Track]:
+        """instrumentalFile / currentInstFile のどちらかが一致するトラック"""
+        candidates = [
+            t for t in (
+                self._first("instrumentalFile", filename),
+                self._first("currentInstFile", filename),
+            ) if t is not None
+        ]
+        return min(candidates, key=lambda t: self._pos[id(t)]) if candidates else None
+
+    def find_by_file(self, filename: str) -> Optional[Track]:
+        """originalFile / currentFile のどちらかが一致する先頭のトラック"""
+        candidates = [
+            t for t in (
+                self._first("originalFile", filename),
+                self._first("currentFile", filename),
+            ) if t is not None
+        ]
+        return min(candidates, key=lambda t: self._pos[id(t)]) if candidates else None
+
+    def has_original_file(self, filename: str) -> bool:
+        return filename in self._indexes["originalFile"]
+
+    # ------------------------
+    # 更新
+    # ------------------------
+    def update_track(self, track_id: str, updates: dict) -> Optional[Track]:
+        """トラックを更新し、変わった索引だけ付け替える（O(1)）"""
+        track = self._by_id.get(track_id)
+        if track is None:
+            return None
+        if self._indexed.get(id(track)) != self._indexed_values(track):
+            # track dict が直接書き換えられていて索引と食い違っている
+            print(f"[DEBUG] トラックの索引が古いため作り直します: {track_id}")
+            self.reindex()
+            track = self._by_id.get(track_id)
+            if track is None:
+                return None
+        for field in self.INDEXED_FIELDS:
+            if field not in updates:
+                continue
+            old = track.get(field)
+            new = updates[field]
+            if old == new:
+                continue
+            if old:
+                bucket = self._indexes[field].get(old)
+                if bucket:
+                    bucket[:] = [t for t in bucket if t is not track]
+                    if not bucket:
+                        del self._indexes[field][old]
+            if new:
+                bucket = self._indexes[field].setdefault(new, [])
+                bucket.append(track)
+                if len(bucket) > 1:
+                    bucket.sort(key=lambda t: self._pos[id(t)])
+        track.data.update(updates)
+        self._indexed[id(track)] = self._indexed_values(track)
+        return track
+
+    def add_track(self, data: dict) -> Track:
+        """トラックを末尾に追加（id 未指定なら採番する）"""
+        if not data.get("id"):
+            data["id"] = self.next_track_id()
+        self._tracks_ref.append(data)
+        track = Track(data)
+        self.tracks.append(track)
+        self._index_track(track, len(self.tracks) - 1)
+        return track
+
+    def next_track_id(self) -> str:
+        """既存 id と衝突しない次のトラック id（track_001 形式）"""
+        n = len(self.tracks) + 1
+        while f"track_{n:03d}" in self._by_id:
+            n += 1
+        return f"track_{n:03d}"
@@ -0,0 +1,175 @@
+"""
+アルバムをまたいだアートワークのキャッシュ
+
+複数枚組を別アルバムとして取り込んだ場合など、同じ表紙を何度も最適化しないよう、
+元画像のハッシュと出力パラメータ（幅・JPG 品質・WebP 品質）をキーに
+最適化済みの cover.jpg / cover.webp を WorkDir/_artwork_cache に保存しておく。
+容量予算で品質を探索した場合は、キーに予算を含め、選ばれた品質を .json に残す。
+
+最終利用順はファイルの更新時刻で管理し（ヒットしたら更新時刻を今にする）、
+合計サイズが上限を超えたら古いものから消す（LRU）。
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Optional, Union
+
+
+CACHE_DIRNAME = "_artwork_cache"
+
+# 既定のキャッシュ上限（MB）
+DEFAULT_CACHE_MB = 64
+
+# 出力の形式（拡張子）。キーの一部になる
+FORMATS = ("jpg", "webp")
+
+# 付随情報（選ばれた品質など）の拡張子
+META_EXT = "json"
+
+
+def source_digest(source: Union[str, bytes]) -> str:
+    """元画像（パスまたはデータ）の SHA-256"""
+    h = hashlib.sha256()
+    if isinstance(source, bytes):
+        h.update(source)
+    else:
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+class ArtworkCache:
+    """
+    最適化済みアートワークの LRU キャッシュ（スレッドセーフ）
+
+    Args:
+        cache_dir: 保存先フォルダ（無ければ作る）
+        max_bytes: 合計サイズの上限（0 以下ならキャッシュしない）
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_CACHE_MB * 1024 * 1024):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def entry_name(digest: str, width: int, jpg_q: int, webp_q: int, variant: str = "") -> str:
+        name = f"{digest[:40]}-w{width}-jq{jpg_q}-wq{webp_q}"
+        return f"{name}-{variant}" if variant else name
+
+    def _paths(self, name: str) -> dict[str, str]:
+        return {fmt: os.path.join(self.cache_dir, f"{name}.{fmt}") for fmt in FORMATS}
+
+    def get(self, digest: str, width: int, jpg_q: int, webp_q: int, variant: str = "") -> Optional[dict[str, str]]:
+        """キャッシュ済みなら {形式: パス}（最終利用時刻を更新）、無ければ None"""
+        if not self.enabled:
+            return None
+        paths = self._paths(self.entry_name(digest, width, jpg_q, webp_q, variant))
+        with self._lock:
+            now = time.time()
+            try:
+                for path in paths.values():
+                    os.utime(path, (now, now))
+            except OSError:
+                return None
+        return paths
+
+    def get_meta(self, digest: str, width: int, jpg_q: int, webp_q: int, variant: str = "") -> dict:
+        """put で一緒に保存した付随情報（無ければ空）"""
+        name = self.entry_name(digest, width, jpg_q, webp_q, variant)
+        try:
+            with open(os.path.join(self.cache_dir, f"{name}.{META_EXT}"), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def put(self, digest: str, width: int, jpg_q: int, webp_q: int, outputs: dict[str, str],
+            variant: str = "", meta: Optional[dict] = None) -> bool:
+        """
+        最適化結果を保存して上限を超えた分を消す
+
+        Args:
+            outputs: {形式: 出力ファイルのパス}（FORMATS の全形式）
+            variant: 幅・品質以外で結果が変わる設定（容量予算など）
+            meta: 一緒に保存する付随情報（選ばれた品質など）
+        """
+        if not self.enabled:
+            return False
+        name = self.entry_name(digest, width, jpg_q, webp_q, variant)
+        paths = self._paths(name)
+        with self._lock:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                for fmt, dest in paths.items():
+                    # 別プロセスが同時に読んでも壊れないよう一時ファイルから置き換える
+                    fd, tmp_path = tempfile.mkstemp(prefix=".artwork.", suffix=".tmp", dir=self.cache_dir)
+                    os.close(fd)
+                    try:
+                        shutil.copyfile(outputs[fmt], tmp_path)
+                        os.replace(tmp_path, dest)
+                    finally:
+                        if os.path.exists(tmp_path):
+                            os.remove(tmp_path)
+                if meta is not None:
+                    meta_path = os.path.join(self.cache_dir, f"{name}.{META_EXT}")
+                    with open(meta_path, 'w', encoding='utf-8') as f:
+                        json.dump(meta, f)
+            except Exception as e:
+                print(f"[WARN] アートワークキャッシュの保存に失敗: {e}")
+                return False
+            self._evict()
+        return True
+
+    def _evict(self):
+        """合計サイズが上限以下になるまで、最終利用が古いエントリから消す"""
+        entries: dict[str, list] = {}  # name -> [最終利用時刻, サイズ, [パス]]
+        total = 0
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    name, ext = os.path.splitext(entry.name)
+                    if ext.lstrip('.') not in FORMATS + (META_EXT,) or not entry.is_file():
+                        continue
+                    st = entry.stat()
+                    item = entries.setdefault(name, [0.0, 0, []])
+                    item[0] = max(item[0], st.st_mtime)
+                    item[1] += st.st_size
+                    item[2].append(entry.path)
+                    total += st.st_size
+        except OSError as e:
+            print(f"[WARN] アートワークキャッシュの走査に失敗: {e}")
+            return
+
+        for name, (_mtime, size, paths) in sorted(entries.items(), key=lambda kv: kv[1][0]):
+            if total <= self.max_bytes:
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+            print(f"[DEBUG] アートワークキャッシュから削除: {name}")
+
+
+def get_artwork_cache(config) -> Optional[ArtworkCache]:
+    """config.ini の WorkDir / [Settings] ArtworkCacheMB からキャッシュを作る（0 / 未設定なら None）"""
+    work_dir = config.get_directory("WorkDir")
+    if not work_dir:
+        return None
+    try:
+        max_mb = int(config.get_setting("ArtworkCacheMB", str(DEFAULT_CACHE_MB)) or 0)
+    except (ValueError, TypeError):
+        max_mb = DEFAULT_CACHE_MB
+    if max_mb <= 0:
+        return None
+    return ArtworkCache(os.path.join(work_dir, CACHE_DIRNAME), max_mb * 1024 * 1024)
@@ -1,30 +1,43 @@
 """
 アートワーク関連の処理
+
+リサイズは Pillow で行う（元画像のデコード・リサイズは1回だけで、JPG / WebP を同じ画像から書き出す）。
+Pillow が無い・読めない画像の場合のみ ImageMagick (magick.exe) を使う。
 """
 import os
 import io
+import re
 import base64
-from typing import Optional, Tuple
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional, Tuple, Union
 from mutagen.flac import FLAC, Picture
 from mutagen.mp4 import MP4, MP4Cover
 from mutagen.oggopus import OggOpus
 from .utils import sanitize_foldername
+from .metadata_cache import get_cache
+from .flac_metadata import read_flac_header, count_pictures, read_picture_data
+from .tag_writer import save_with_padding, WriteReport, WriteStats
+from .artwork_cache import ArtworkCache, source_digest
 
 
-def check_flac_has_artwork(flac_path: str) -> bool:
+def check_flac_has_artwork(flac_path: str, album_folder: Optional[str] = None) -> bool:
     """
     FLACファイルにアートワークが埋め込まれているかチェック
     
     Args:
         flac_path: FLACファイルのパス
+        album_folder: 指定時はそのアルバムのメタデータキャッシュを使う
     
     Returns:
         アートワークが存在する場合 True
     """
+    if album_folder:
+        return get_cache(album_folder).has_picture(flac_path)
     try:
-        audio = FLAC(flac_path)
-        # FLAC の pictures 属性をチェック
-        return len(audio.pictures) > 0
+        # ブロックヘッダだけを辿り、画像データは読まない
+        return count_pictures(flac_path) > 0
     except Exception as e:
         print(f"[WARNING] {flac_path} のアートワークチェックに失敗: {e}")
         return False
@@ -57,15 +70,19 @@ def check_album_has_artwork(album_folder: str, album_name: str = None) -> bool:
         candidates_dirs.append(flac_src_root)
     candidates_dirs.append(album_folder)
 
-    for d in candidates_dirs:
-        try:
-            for file in os.listdir(d):
-                if file.lower().endswith('.flac'):
-                    flac_path = os.path.join(d, file)
-                    if check_flac_has_artwork(flac_path):
-                        return True
-        except Exception:
-            pass
+    cache = get_cache(album_folder)
+    try:
+        for d in candidates_dirs:
+            try:
+                for file in os.listdir(d):
+                    if file.lower().endswith('.flac'):
+                        flac_path = os.path.join(d, file)
+                        if check_flac_has_artwork(flac_path, album_folder):
+                            return True
+            except Exception:
+                pass
+    finally:
+        cache.save()
 
     return False
 
@@ -74,6 +91,15 @@ def _sanitize_foldername(name: str) -> str:
     return sanitize_foldername(name)
 
 
+def read_artwork_from_flac(flac_path: str) -> Optional[bytes]:
+    """FLACファイルの最初のアートワークのデータ（無い場合は None。読めない場合は例外）"""
+    header = read_flac_header(flac_path, read_tags=False)
+    if not header.pictures:
+        return None
+    # 最初の画像だけを読む
+    return read_picture_data(flac_path, header.pictures[0])
+
+
 def extract_artwork_from_flac(flac_path: str, output_path: str) -> bool:
     """
     FLACファイルからアートワークを抽出
@@ -86,14 +112,11 @@ def extract_artwork_from_flac(flac_path: str, output_path: str) -> bool:
         抽出成功時 True
     """
     try:
-        audio = FLAC(flac_path)
-        if not audio.pictures:
+        data = read_artwork_from_flac(flac_path)
+        if data is None:
             return False
-        
-        # 最初の画像を抽出
-        picture = audio.pictures[0]
         with open(output_path, 'wb') as f:
-            f.write(picture.data)
+            f.write(data)
         
         return True
     except Exception as e:
@@ -101,6 +124,171 @@ def extract_artwork_from_flac(flac_path: str, output_path: str) -> bool:
         return False
 
 
+def pillow_available() -> bool:
+    """Pillow でリサイズできるか"""
+    try:
+        import PIL.Image  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _fit_size(size: tuple[int, int], width: int) -> tuple[int, int]:
+    """width x width の枠に収まるサイズ（縦横比維持。magick の -resize WxW と同じく拡大もする）"""
+    w, h = size
+    scale = min(width / w, width / h)
+    return max(1, round(w * scale)), max(1, round(h * scale))
+
+
+def _decode_for_resize(source: Union[str, bytes], largest_width: int):
+    """
+    元画像を1回だけデコードする（RGB / RGBA に変換済み）
+
+    JPEG は DCT 段階で縮小してデコードする（一番大きい出力の2倍以上は残す）。
+
+    Returns:
+        (画像, ICC プロファイル, 透過の有無)
+    """
+    from PIL import Image
+    with Image.open(io.BytesIO(source) if isinstance(source, bytes) else source) as img:
+        target = _fit_size(img.size, largest_width)
+        img.draft("RGB", (target[0] * 2, target[1] * 2))
+        icc_profile = img.info.get("icc_profile")
+        has_alpha = img.mode in ("RGBA", "LA", "PA") or (img.mode == "P" and "transparency" in img.info)
+        if img.mode == "CMYK":
+            # CMYK のプロファイルを RGB の出力に付けると色がおかしくなるので sRGB に変換して外す
+            img = _cmyk_to_srgb(img, icc_profile)
+            icc_profile = None
+        elif img.mode not in ("RGB", "RGBA", "P", "PA"):
+            # グレースケール等のプロファイルも RGB の出力には使えない
+            icc_profile = None
+        img = img.convert("RGBA" if has_alpha else "RGB")
+    return img, icc_profile, has_alpha
+
+
+def _cmyk_to_srgb(img, icc_profile: Optional[bytes]):
+    """CMYK 画像を埋め込みプロファイルに従って sRGB に変換（プロファイルが無い・使えない場合は単純変換）"""
+    if icc_profile:
+        try:
+            from PIL import ImageCms
+            source_profile = ImageCms.ImageCmsProfile(io.BytesIO(icc_profile))
+            return ImageCms.profileToProfile(img, source_profile, ImageCms.createProfile("sRGB"), outputMode="RGB")
+        except Exception as e:
+            print(f"[WARN] CMYK のカラープロファイルを変換できません（単純変換します）: {e}")
+    return img.convert("RGB")
+
+
+def _resize_decoded(img, width: int, has_alpha: bool):
+    """デコード済み画像を width x width の枠に収め、(WebP 用, JPEG 用) を返す"""
+    from PIL import Image
+    target = _fit_size(img.size, width)
+    resized = img.resize(target, Image.LANCZOS) if img.size != target else img
+    if not has_alpha:
+        return resized, resized
+    # JPEG は透過を持てないので白で塗りつぶす
+    opaque = Image.new("RGB", resized.size, (255, 255, 255))
+    opaque.paste(resized, mask=resized.getchannel("A"))
+    return resized, opaque
+
+
+def _encode_image(img, fmt: str, quality: int, icc_profile: Optional[bytes]) -> bytes:
+    buf = io.BytesIO()
+    extra = {"icc_profile": icc_profile} if icc_profile else {}
+    img.save(buf, "WEBP" if fmt == 'webp' else "JPEG", quality=quality, **extra)
+    return buf.getvalue()
+
+
+# 容量予算に合わせて品質を下げるときの下限（これより下げると劣化が目立つ）
+MIN_BUDGET_QUALITY = 40
+
+
+def _encode_within_budget(img, fmt: str, max_quality: int, budget_bytes: int,
+                          icc_profile: Optional[bytes]) -> tuple[bytes, int]:
+    """
+    予算（バイト）に収まる一番高い品質を二分探索で探して書き出す
+
+    max_quality で収まればそのまま。MIN_BUDGET_QUALITY でも収まらない場合はその品質で妥協する。
+
+    Returns:
+        (画像データ, 品質)
+    """
+    data = _encode_image(img, fmt, max_quality, icc_profile)
+    if budget_bytes <= 0 or len(data) <= budget_bytes:
+        return data, max_quality
+    low, high = MIN_BUDGET_QUALITY, max_quality - 1
+    best: Optional[tuple[bytes, int]] = None
+    smallest = (data, max_quality)
+    while low <= high:
+        quality = (low + high) // 2
+        data = _encode_image(img, fmt, quality, icc_profile)
+        if len(data) <= budget_bytes:
+            best = (data, quality)
+            low = quality + 1
+        else:
+            if quality < smallest[1]:
+                smallest = (data, quality)
+            high = quality - 1
+    if best is not None:
+        return best
+    print(f"[WARN] {fmt} が品質 {smallest[1]} でも {budget_bytes // 1024}KB に収まりません "
+          f"({len(smallest[0]) // 1024}KB)")
+    return smallest
+
+
+def render_artwork_with_pillow(
+    source: Union[str, bytes],
+    jobs: list[tuple[int, str, int, int]]
+) -> dict[tuple[int, str], tuple[bytes, int]]:
+    """
+    Pillow で元画像を1回だけデコードし、複数の幅・形式を書き出す（メモリ上）
+
+    Args:
+        source: 入力画像のパス、または画像データ
+        jobs: [(幅, 'jpg' / 'webp', 品質（上限）, 容量予算バイト（0 なら品質固定）), ...]
+
+    Returns:
+        {(幅, 形式): (画像データ, 選ばれた品質)}（Pillow が無い・読めない場合は例外）
+    """
+    img, icc_profile, has_alpha = _decode_for_resize(source, max(job[0] for job in jobs))
+    results: dict[tuple[int, str], tuple[bytes, int]] = {}
+    resized_by_width = {}
+    for width, fmt, quality, budget_bytes in jobs:
+        if width not in resized_by_width:
+            resized_by_width[width] = _resize_decoded(img, width, has_alpha)
+        resized, opaque = resized_by_width[width]
+        target = resized if fmt == 'webp' else opaque
+        results[(width, fmt)] = _encode_within_budget(target, fmt, quality, budget_bytes, icc_profile)
+    return results
+
+
+def resize_artwork_with_pillow(
+    source: Union[str, bytes],
+    outputs: list[tuple[str, str, int]],
+    width: int = 600
+) -> tuple[bool, str]:
+    """
+    Pillow で元画像を1回だけデコード・リサイズし、複数の形式で書き出す
+
+    Args:
+        source: 入力画像のパス、または画像データ
+        outputs: [(出力パス, 'jpg' / 'webp', 品質), ...]
+        width: リサイズ後の幅（高さは自動調整。width x width の枠に収める）
+
+    Returns:
+        (成功フラグ, エラーメッセージ)
+    """
+    if not pillow_available():
+        return False, "Pillow がインストールされていません"
+    try:
+        rendered = render_artwork_with_pillow(source, [(width, fmt, quality, 0) for _, fmt, quality in outputs])
+        for output_path, fmt, _quality in outputs:
+            with open(output_path, 'wb') as f:
+                f.write(rendered[(width, fmt)][0])
+        return True, ""
+    except Exception as e:
+        return False, f"Pillow エラー: {e}"
+
+
 def resize_artwork_with_magick(
     magick_path: str,
     input_path: str,
@@ -194,7 +382,7 @@ def find_first_flac_with_artwork(album_folder: str, album_name: str = None) -> O
                 if not name.lower().endswith(".flac"):
                     continue
                 path = os.path.join(search_dir, name)
-                if check_flac_has_artwork(path):
+                if check_flac_has_artwork(path, album_folder):
                     return path
         except Exception as e:
             print(f"[WARN] find_first_flac_with_artwork: {search_dir} の探索失敗: {e}")
@@ -206,81 +394,412 @@ def find_first_flac_with_artwork(album_folder: str, album_name: str = None) -> O
 # FLAC への再埋め込み機能は事故防止のため削除（抽出のみ許可）。
 
 
-def embed_artwork_to_mp4(mp4_path: str, image_path: str) -> Tuple[bool, str]:
+class PreparedCover:
     """
-    MP4(M4A) へアートワークを埋め込む（covr 置換）
+    埋め込み用に一度だけ用意した表紙（アルバム内の全ファイルで使い回す）
+
+    画像データ・MP4Cover・Opus 用の METADATA_BLOCK_PICTURE（base64）を保持する。
+    ファイルごとに画像を読み直したり Picture を組み直したりしないためのもの。
     """
-    try:
-        if not os.path.exists(mp4_path):
-            return False, f"MP4/M4A が見つかりません: {mp4_path}"
-        if not os.path.exists(image_path):
-            return False, f"画像が見つかりません: {image_path}"
+
+    __slots__ = ("data", "mime", "mp4_cover", "opus_picture")
+
+    def __init__(self, data: bytes, mime: str):
+        self.data = data
+        self.mime = mime
+        # webp は iTunes 互換ではないため MP4 では JPEG 扱い（従来どおり）
+        mp4_format = MP4Cover.FORMAT_PNG if mime == 'image/png' else MP4Cover.FORMAT_JPEG
+        self.mp4_cover = MP4Cover(data, imageformat=mp4_format)
+        # FLAC Picture 構造体を使って base64 化
+        pic = Picture()
+        pic.data = data
+        pic.type = 3
+        pic.mime = mime
+        self.opus_picture = base64.b64encode(pic.write()).decode('ascii')
+
+    @classmethod
+    def from_file(cls, image_path: str) -> "PreparedCover":
         with open(image_path, 'rb') as f:
             data = f.read()
-        if image_path.lower().endswith('.jpg') or image_path.lower().endswith('.jpeg'):
-            cover = MP4Cover(data, imageformat=MP4Cover.FORMAT_JPEG)
-        elif image_path.lower().endswith('.png'):
-            cover = MP4Cover(data, imageformat=MP4Cover.FORMAT_PNG)
-        else:
-            # webp は iTunes 互換ではないため JPEG 推奨
-            cover = MP4Cover(data, imageformat=MP4Cover.FORMAT_JPEG)
+        return cls(data, _guess_mime(image_path))
+
+
+def _guess_mime(image_path: str) -> str:
+    lower = image_path.lower()
+    if lower.endswith('.jpg') or lower.endswith('.jpeg'):
+        return 'image/jpeg'
+    if lower.endswith('.webp'):
+        return 'image/webp'
+    return 'image/png'
+
+
+def prepare_cover(image_path: str) -> Optional[PreparedCover]:
+    """画像を読み込んで埋め込み用に準備する（読めなければ None）"""
+    try:
+        return PreparedCover.from_file(image_path)
+    except Exception as e:
+        print(f"[ERROR] 画像の読み込みに失敗: {image_path}: {e}")
+        return None
+
+
+def _resolve_cover(image: Union[str, PreparedCover]) -> PreparedCover:
+    if isinstance(image, PreparedCover):
+        return image
+    if not os.path.exists(image):
+        raise FileNotFoundError(f"画像が見つかりません: {image}")
+    return PreparedCover.from_file(image)
+
+
+def _write_mp4_cover(mp4_path: str, cover: PreparedCover) -> WriteReport:
+    """MP4(M4A) の covr を置き換える（例外は投げず WriteReport の error に格納）"""
+    if not os.path.exists(mp4_path):
+        report = WriteReport(mp4_path)
+        report.error = f"MP4/M4A が見つかりません: {mp4_path}"
+        return report
+    try:
         mp4 = MP4(mp4_path)
-        mp4["covr"] = [cover]
-        mp4.save()
-        return True, ""
+        mp4["covr"] = [cover.mp4_cover]
+    except Exception as e:
+        report = WriteReport(mp4_path)
+        report.error = str(e)
+        return report
+    return save_with_padding(mp4)
+
+
+def _write_opus_cover(opus_path: str, cover: PreparedCover) -> WriteReport:
+    """Opus の METADATA_BLOCK_PICTURE を置き換える（例外は投げず WriteReport の error に格納）"""
+    if not os.path.exists(opus_path):
+        report = WriteReport(opus_path)
+        report.error = f"Opus が見つかりません: {opus_path}"
+        return report
+    try:
+        opus = OggOpus(opus_path)
+        opus['metadata_block_picture'] = [cover.opus_picture]
+    except Exception as e:
+        report = WriteReport(opus_path)
+        report.error = str(e)
+        return report
+    return save_with_padding(opus)
+
+
+def embed_artwork_to_mp4(mp4_path: str, image: Union[str, PreparedCover], stats: Optional[WriteStats] = None) -> Tuple[bool, str]:
+    """
+    MP4(M4A) へアートワークを埋め込む（covr 置換）
+    free アトムに収まればその場で書き換える（stats を渡すと書き直しの有無を集計）
+    複数ファイルに埋め込む場合は prepare_cover で用意したものを渡す（embed_artwork_batch 参照）
+    """
+    try:
+        cover = _resolve_cover(image)
     except Exception as e:
         return False, str(e)
+    report = _write_mp4_cover(mp4_path, cover)
+    if stats is not None:
+        stats.add(report)
+    return report.ok, report.error
 
 
-def embed_artwork_to_opus(opus_path: str, image_path: str) -> Tuple[bool, str]:
+def embed_artwork_to_opus(opus_path: str, image: Union[str, PreparedCover], stats: Optional[WriteStats] = None) -> Tuple[bool, str]:
     """
     Opus へアートワークを埋め込む（METADATA_BLOCK_PICTURE）。
     注意: 一部プレイヤの互換性に差があるため任意機能。
+    コメントページの空きに収まればその場で書き換える（stats を渡すと書き直しの有無を集計）
     """
     try:
-        if not os.path.exists(opus_path):
-            return False, f"Opus が見つかりません: {opus_path}"
-        if not os.path.exists(image_path):
-            return False, f"画像が見つかりません: {image_path}"
-        # FLAC Picture 構造体を使って base64 化
-        pic = Picture()
-        with open(image_path, 'rb') as f:
-            pic.data = f.read()
-        pic.type = 3
-        if image_path.lower().endswith('.jpg') or image_path.lower().endswith('.jpeg'):
-            pic.mime = 'image/jpeg'
-        elif image_path.lower().endswith('.webp'):
-            pic.mime = 'image/webp'
-        else:
-            pic.mime = 'image/png'
-        b = pic.write()
-        encoded = base64.b64encode(b).decode('ascii')
-        opus = OggOpus(opus_path)
-        opus['metadata_block_picture'] = [encoded]
-        opus.save()
-        return True, ""
+        cover = _resolve_cover(image)
     except Exception as e:
         return False, str(e)
+    report = _write_opus_cover(opus_path, cover)
+    if stats is not None:
+        stats.add(report)
+    return report.ok, report.error
+
 
+# 同時に埋め込むファイル数の既定値（ほぼ I/O 待ちなのでコア数より多くてよい。SMB 越しで効く）
+DEFAULT_EMBED_WORKERS = 8
 
-def ensure_artwork_resized_outputs(album_folder: str, magick_path: str, source_image: str, width: int = 600, jpg_q: int = 85, webp_q: int = 85) -> Tuple[bool, str, str]:
+_EMBED_WRITERS = {
+    '.m4a': _write_mp4_cover,
+    '.mp4': _write_mp4_cover,
+    '.opus': _write_opus_cover,
+}
+
+
+def embed_artwork_batch(paths: list[str], cover: PreparedCover, stats: Optional[WriteStats] = None,
+                        max_workers: int = DEFAULT_EMBED_WORKERS) -> list[WriteReport]:
     """
-    _artwork_resized/cover.jpg, cover.webp を生成（既存なら上書き）
-    Returns: (ok, jpg_path, webp_path or err)
+    複数の M4A / Opus へ同じ表紙をスレッドプールで並列に埋め込む
+
+    表紙は呼び出し側で一度だけ用意する（prepare_cover）。集計（stats）は
+    呼び出し元のスレッドでまとめて行うので WriteStats をロックする必要はない。
+
+    Returns:
+        paths と同じ順の WriteReport（失敗したファイルは ok=False, error にメッセージ）
+    """
+    def embed_one(path: str) -> WriteReport:
+        writer = _EMBED_WRITERS.get(os.path.splitext(path)[1].lower())
+        if writer is None:
+            report = WriteReport(path)
+            report.error = f"未対応の形式です: {os.path.basename(path)}"
+            return report
+        return writer(path, cover)
+
+    if not paths:
+        return []
+    workers = max(1, min(int(max_workers or 1), len(paths)))
+    if workers == 1:
+        reports = [embed_one(p) for p in paths]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="artwork") as pool:
+            reports = list(pool.map(embed_one, paths))
+    if stats is not None:
+        for report in reports:
+            stats.add(report)
+    return reports
+
+
+class ArtworkOptions:
+    """
+    アートワーク最適化の設定
+
+    Args:
+        width: 埋め込み用（cover.jpg / cover.webp）の幅
+        jpg_quality / webp_quality: 品質（容量予算がある場合は上限）
+        jpg_budget_kb / webp_budget_kb: 埋め込み用 1 ファイルあたりの容量予算（0 なら品質固定）。
+            全トラックに埋め込まれるのは埋め込み用だけなので、追加サイズは予算の対象外
+        extra_widths: 追加で書き出す幅（機器用サムネイル・保存用など。cover_<幅>.jpg / .webp）
+    """
+
+    def __init__(self, width: int = 600, jpg_quality: int = 85, webp_quality: int = 85,
+                 jpg_budget_kb: int = 0, webp_budget_kb: int = 0, extra_widths: Iterable[int] = ()):
+        self.width = width
+        self.jpg_quality = jpg_quality
+        self.webp_quality = webp_quality
+        self.jpg_budget_kb = max(0, jpg_budget_kb)
+        self.webp_budget_kb = max(0, webp_budget_kb)
+        self.extra_widths = sorted({w for w in extra_widths if w > 0 and w != width})
+
+    @classmethod
+    def from_config(cls, config) -> "ArtworkOptions":
+        """config.ini の [Settings] から作る"""
+        def number(key: str, default: int) -> int:
+            try:
+                return int(config.get_setting(key, str(default)) or default)
+            except (ValueError, TypeError):
+                print(f"[WARN] {key} が数値ではありません。{default} を使います")
+                return default
+
+        extra_widths = []
+        for item in (config.get_setting("ArtworkExtraSizes", "") or "").replace(';', ',').split(','):
+            item = item.strip()
+            if not item:
+                continue
+            try:
+                extra_widths.append(int(item))
+            except ValueError:
+                print(f"[WARN] ArtworkExtraSizes の値を無視します: {item}")
+        return cls(
+            width=number("ResizeWidth", 600),
+            jpg_quality=number("JpegQuality", 85),
+            webp_quality=number("WebpQuality", 85),
+            jpg_budget_kb=number("ArtworkJpegBudgetKB", 0),
+            webp_budget_kb=number("ArtworkWebpBudgetKB", 0),
+            extra_widths=extra_widths,
+        )
+
+    @property
+    def widths(self) -> list[int]:
+        """書き出す幅（先頭が埋め込み用）"""
+        return [self.width] + self.extra_widths
+
+    def quality(self, fmt: str) -> int:
+        return self.webp_quality if fmt == 'webp' else self.jpg_quality
+
+    def budget_bytes(self, width: int, fmt: str) -> int:
+        if width != self.width:
+            return 0
+        return (self.webp_budget_kb if fmt == 'webp' else self.jpg_budget_kb) * 1024
+
+    def cache_variant(self, width: int) -> str:
+        """キャッシュのキーに足す予算の部分（予算なしなら空）"""
+        jpg_budget, webp_budget = self.budget_bytes(width, 'jpg'), self.budget_bytes(width, 'webp')
+        if not jpg_budget and not webp_budget:
+            return ""
+        return f"jb{jpg_budget // 1024}-wb{webp_budget // 1024}"
+
+    def file_name(self, width: int, fmt: str) -> str:
+        return f"cover.{fmt}" if width == self.width else f"cover_{width}.{fmt}"
+
+
+class ArtworkResult:
+    """
+    optimize_album_artwork の結果
+
+    params は state.json に残す内容（幅・予算と、出力ごとに選ばれた品質・サイズ）。
+    """
+
+    __slots__ = ("ok", "error", "jpg_path", "webp_path", "params")
+
+    def __init__(self, ok: bool, error: str = "", jpg_path: str = "", webp_path: str = "",
+                 params: Optional[dict] = None):
+        self.ok = ok
+        self.error = error
+        self.jpg_path = jpg_path
+        self.webp_path = webp_path
+        self.params = params or {}
+
+    def summary(self) -> str:
+        """埋め込み用の品質・サイズの一行表示"""
+        parts = []
+        for output in self.params.get("outputs", []):
+            if output.get("width") == self.params.get("width"):
+                quality = output.get("quality")
+                quality_text = f"q{quality}" if quality is not None else "q?"
+                parts.append(f"{output['format'].upper()} {quality_text} {output['bytes'] // 1024}KB")
+        return " / ".join(parts)
+
+
+_EXTRA_COVER_RE = re.compile(r"^cover_(\d+)\.(jpg|webp)$", re.IGNORECASE)
+
+
+def optimize_album_artwork(album_folder: str, magick_path: Optional[str], source_image: Union[str, bytes],
+                           options: ArtworkOptions, cache: Optional[ArtworkCache] = None) -> ArtworkResult:
+    """
+    _artwork_resized に埋め込み用の cover.jpg / cover.webp と追加サイズ（cover_<幅>.*）を生成する
+
+    Pillow で元画像を1回だけデコードし、全ての幅・形式をそこから書き出す。
+    容量予算がある場合は、埋め込み用の品質を予算に収まる範囲で二分探索する。
+    Pillow が使えない場合のみ magick を使う（品質固定）。
+    cache を渡すと、同じ画像・同じ設定の幅はキャッシュからコピーするだけで済ませる。
     """
     try:
         out_dir = os.path.join(album_folder, "_artwork_resized")
         os.makedirs(out_dir, exist_ok=True)
-        jpg_path = os.path.join(out_dir, "cover.jpg")
-        webp_path = os.path.join(out_dir, "cover.webp")
-
-        ok1, err1 = resize_artwork_with_magick(magick_path, source_image, jpg_path, width=width, quality=jpg_q, format='jpg')
-        if not ok1:
-            return False, err1, ""
-        # webp
-        ok2, err2 = resize_artwork_with_magick(magick_path, source_image, webp_path, width=width, quality=webp_q, format='webp')
-        if not ok2:
-            return False, err2, ""
-        return True, jpg_path, webp_path
+        _remove_stale_extra_covers(out_dir, options)
+
+        def out_path(width: int, fmt: str) -> str:
+            return os.path.join(out_dir, options.file_name(width, fmt))
+
+        digest = source_digest(source_image) if cache is not None and cache.enabled else None
+        chosen: dict[tuple[int, str], Optional[int]] = {}
+        pending: list[int] = []
+        for width in options.widths:
+            key = (width, options.jpg_quality, options.webp_quality, options.cache_variant(width))
+            cached = cache.get(digest, *key) if digest else None
+            if not cached:
+                pending.append(width)
+                continue
+            meta = cache.get_meta(digest, *key)
+            for fmt in ('jpg', 'webp'):
+                shutil.copyfile(cached[fmt], out_path(width, fmt))
+                # 予算なしなら品質は設定どおり（付随情報の無い古いエントリもある）
+                quality = meta.get(fmt)
+                if quality is None and not options.cache_variant(width):
+                    quality = options.quality(fmt)
+                chosen[(width, fmt)] = quality
+            print(f"[INFO] アートワークキャッシュを使用: {digest[:12]} ({width}px)")
+
+        if pending:
+            ok, err, rendered = _render_artwork_outputs(magick_path, source_image, out_dir, options, pending)
+            if not ok:
+                return ArtworkResult(False, err)
+            chosen.update(rendered)
+            if digest:
+                for width in pending:
+                    cache.put(digest, width, options.jpg_quality, options.webp_quality,
+                              {fmt: out_path(width, fmt) for fmt in ('jpg', 'webp')},
+                              variant=options.cache_variant(width),
+                              meta={fmt: chosen[(width, fmt)] for fmt in ('jpg', 'webp')})
+
+        params = {
+            "width": options.width,
+            "jpgBudgetKB": options.jpg_budget_kb,
+            "webpBudgetKB": options.webp_budget_kb,
+            "outputs": [
+                {
+                    "width": width,
+                    "format": fmt,
+                    "file": options.file_name(width, fmt),
+                    "quality": chosen.get((width, fmt)),
+                    "bytes": os.path.getsize(out_path(width, fmt)),
+                }
+                for width in options.widths for fmt in ('jpg', 'webp')
+            ],
+        }
+        return ArtworkResult(True, "", out_path(options.width, 'jpg'), out_path(options.width, 'webp'), params)
     except Exception as e:
-        return False, str(e), ""
+        return ArtworkResult(False, str(e))
+
+
+def ensure_artwork_resized_outputs(album_folder: str, magick_path: Optional[str], source_image: Union[str, bytes], width: int = 600, jpg_q: int = 85, webp_q: int = 85, cache: Optional[ArtworkCache] = None) -> Tuple[bool, str, str]:
+    """
+    _artwork_resized/cover.jpg, cover.webp を生成（既存なら上書き）
+
+    品質固定・追加サイズなしの optimize_album_artwork。
+    source_image は画像のパスか画像データ（FLAC から読んだものなど）。
+    Returns: (ok, jpg_path, webp_path or err)
+    """
+    result = optimize_album_artwork(album_folder, magick_path, source_image,
+                                    ArtworkOptions(width, jpg_q, webp_q), cache)
+    if not result.ok:
+        return False, result.error, ""
+    return True, result.jpg_path, result.webp_path
+
+
+def _remove_stale_extra_covers(out_dir: str, options: ArtworkOptions):
+    """設定から外れた追加サイズ（cover_<幅>.*）を消す"""
+    wanted = set(options.extra_widths)
+    for name in os.listdir(out_dir):
+        match = _EXTRA_COVER_RE.match(name)
+        if match and int(match.group(1)) not in wanted:
+            try:
+                os.remove(os.path.join(out_dir, name))
+            except OSError as e:
+                print(f"[WARN] 古いアートワークを削除できません: {name}: {e}")
+
+
+def _render_artwork_outputs(magick_path: Optional[str], source_image: Union[str, bytes], out_dir: str,
+                            options: ArtworkOptions, widths: list[int]
+                            ) -> Tuple[bool, str, dict[tuple[int, str], Optional[int]]]:
+    """
+    指定した幅の cover を実際に作る（Pillow → magick の順に試す）
+
+    Returns:
+        (成功フラグ, エラーメッセージ, {(幅, 形式): 選ばれた品質})
+    """
+    jobs = [(width, fmt, options.quality(fmt), options.budget_bytes(width, fmt))
+            for width in widths for fmt in ('jpg', 'webp')]
+    if pillow_available():
+        try:
+            rendered = render_artwork_with_pillow(source_image, jobs)
+            for (width, fmt), (data, _quality) in rendered.items():
+                with open(os.path.join(out_dir, options.file_name(width, fmt)), 'wb') as f:
+                    f.write(data)
+            return True, "", {key: quality for key, (_data, quality) in rendered.items()}
+        except Exception as e:
+            err = f"Pillow エラー: {e}"
+    else:
+        err = "Pillow がインストールされていません"
+    if not magick_path:
+        return False, err, {}
+    print(f"[WARN] {err} → magick で処理します")
+    if any(budget for *_rest, budget in jobs):
+        print("[WARN] magick では容量予算を使わず、設定の品質で書き出します")
+
+    # magick はファイルしか読めないので、データの場合は一時ファイルに書き出す
+    temp_path = None
+    if isinstance(source_image, bytes):
+        fd, temp_path = tempfile.mkstemp(prefix="cover_src_", dir=out_dir)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(source_image)
+        source_image = temp_path
+    try:
+        for width, fmt, quality, _budget in jobs:
+            output_path = os.path.join(out_dir, options.file_name(width, fmt))
+            ok, err = resize_artwork_with_magick(magick_path, source_image, output_path,
+                                                 width=width, quality=quality, format=fmt)
+            if not ok:
+                return False, err, {}
+    finally:
+        if temp_path:
+            os.remove(temp_path)
+    return True, "", {(width, fmt): quality for width, fmt, quality, _budget in jobs}
@@ -0,0 +1,18 @@
+"""
+外部ツールの既定の引数テンプレート
+
+config.ini の既定値（ConfigManager）と各ツールの実行側（encoders / demucs_queue）の両方から参照する。
+設定の読み書きが機能モジュールに依存しないよう、ここには定数だけを置く。
+"""
+
+# Demucs（demucs 4.x。ボーカル / それ以外の2分割）
+DEFAULT_DEMUCS_ARGS = "-n htdemucs --two-stems=vocals -o {output} {input}"
+
+# AAC は ffmpeg、Opus は opusenc を想定
+DEFAULT_AAC_ARGS = "-hide_banner -loglevel error -y -i {input} -map 0:a -map_metadata 0 -c:a aac -b:a 256k {output}"
+DEFAULT_OPUS_ARGS = "--quiet --bitrate 128 {input} {output}"
+
+# 標準入力（WAV）から読む場合。タグは ffmpeg なら {source} から取る。opusenc は取り込み後にコピーする
+DEFAULT_AAC_PIPE_ARGS = ("-hide_banner -loglevel error -y -f wav -i - -i {source} "
+                         "-map 0:a -map_metadata 1 -c:a aac -b:a 256k {output}")
+DEFAULT_OPUS_PIPE_ARGS = "--quiet --bitrate 128 - {output}"
@@ -6,6 +6,10 @@ import os
 from pathlib import Path
 from typing import Optional
 
+from .command_templates import (
+    DEFAULT_AAC_ARGS, DEFAULT_AAC_PIPE_ARGS, DEFAULT_DEMUCS_ARGS, DEFAULT_OPUS_ARGS, DEFAULT_OPUS_PIPE_ARGS,
+)
+
 
 class ConfigManager:
     """設定ファイル管理クラス"""
@@ -79,6 +83,9 @@ class ConfigManager:
             'MusicCenterDir': '%USERPROFILE%\\Music\\Music Center',
             'WorkDir': './work',
             'Demucs': detected_paths.get('Demucs', ''),
+            'DemucsCli': '',
+            'AacEncoder': '',
+            'OpusEncoder': '',
         }
         self.config['DefaultDirectories'] = {
             'demucs_output': '%USERPROFILE%\\Downloads',
@@ -94,6 +101,28 @@ class ConfigManager:
             'ExternalOutputDir': '%USERPROFILE%\\Videos\\エンコード済み',
             'FoobarUseAddSwitch': '1',
             'AcceptedDisclaimer': 'false',
+            'MetadataReadWorkers': '8',
+            'DemucsConvertWorkers': '0',
+            'DemucsCliArgs': DEFAULT_DEMUCS_ARGS,
+            'DemucsMaxJobs': '1',
+            'DemucsThreadsPerJob': '0',
+            'AacEncoderArgs': DEFAULT_AAC_ARGS,
+            'OpusEncoderArgs': DEFAULT_OPUS_ARGS,
+            'AacEncoderPipeArgs': DEFAULT_AAC_PIPE_ARGS,
+            'OpusEncoderPipeArgs': DEFAULT_OPUS_PIPE_ARGS,
+            'EncoderWorkers': '0',
+            'TranscodeFanout': '1',
+            'ReplayGainWorkers': '0',
+            'ArtworkCacheMB': '64',
+            'ArtworkEmbedWorkers': '8',
+            'ArtworkJpegBudgetKB': '0',
+            'ArtworkWebpBudgetKB': '0',
+            'ArtworkExtraSizes': '',
+            'NormalizePictures': '0',
+            'PictureMaxKB': '1024',
+            'PictureMaxWidth': '1000',
+            'PictureJpegQuality': '90',
+            'PictureNormalizeWorkers': '4',
         }
         self.config['Demucs'] = {
             'SkipKeywords': 'instrumental, inst., (inst), -inst-, off vocal, off-vocal, offvocal, backing track, karaoke, voiceless, minus one, game version, オリジナル・カラオケ, ソロ・リミックス, ドラマ, ボーナス・トラック, インスト, オフボーカル, オフボ, カラオケ, 歌無し',
@@ -1,8 +1,30 @@
 """
 Demucs処理対象の自動検出ロジック
 """
+import os
 import re
-from typing import Dict
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, Optional
+
+from .keyword_engine import get_keyword_set
+
+
+_RE_EXT = re.compile(r'\.[^.]+$')
+_RE_TRACK_NUM = re.compile(r'^\d+[\s\-\.]*')
+
+# Demucs が出力するインスト音源のファイル名（小文字）
+INSTRUMENTAL_FILENAMES = ('no_vocals.wav', 'minus_vocals.flac')
+
+# 出力フォルダの走査で潜る深さの上限（<選択フォルダ>/separated/<モデル>/<曲>/ まで届く）
+MAX_SCAN_DEPTH = 5
+
+# 走査で潜らないフォルダ（小文字。"." / "$" で始まるものも除外）
+PRUNE_DIRS = frozenset({
+    'demucs_ignore', 'node_modules', '__pycache__', 'system volume information',
+    '_aac_output', '_opus_output', '_demucs_queue',
+})
 
 
 def detect_demucs_targets(track_filenames: list[str], keywords: list[str]) -> Dict[str, bool]:
@@ -18,40 +40,36 @@ def detect_demucs_targets(track_filenames: list[str], keywords: list[str]) -> Di
     """
     targets = {f: True for f in track_filenames}
     
-    if not keywords:
+    # キーワード群はコンパイル済みの1本の正規表現で判定する（(Off Vocal) 等の括弧ごと除去も可能）
+    keyword_set = get_keyword_set(keywords)
+    if not keyword_set:
         return targets
     
-    # キーワードを正規表現パターンに変換
-    pattern_str = "|".join(map(re.escape, keywords))
-    # (Off Vocal) 等の表記を捕捉する正規表現
-    # 前後に括弧やハイフンがある場合も考慮
-    keyword_regex = re.compile(
-        rf"(?i)\s*[\[\(\-]?\s*({pattern_str})\s*[\]\)\-]?",
-        re.UNICODE
-    )
+    # 拡張子を除いたベース名
+    base_names = {f: _RE_EXT.sub('', f) for f in track_filenames}
     
     # 1. 明示的なインスト曲を検出
     inst_files = []
     for f in track_filenames:
-        # 拡張子を除いたベース名で判定
-        base_name = re.sub(r'\.[^.]+$', '', f)
-        if keyword_regex.search(base_name):
+        if keyword_set.contains(base_names[f]):
             targets[f] = False  # インスト曲そのものは除外
             inst_files.append(f)
     
+    # 比較用: トラック番号を除いたベース名
+    compare_bases = {f: _RE_TRACK_NUM.sub('', base_names[f]).strip() for f in track_filenames}
+    
     # 2. インスト曲のペアとなる原曲を検出（簡易実装）
     # 例: "03 Song (Off Vocal).flac" から "Song" を取り出し、"01 Song.flac" を探す
     for inst_f in inst_files:
-        base_name = re.sub(r'\.[^.]+$', '', inst_f)
-        
         # キーワード部分を除去して原曲名(推定)を作成
-        original_name_guess = keyword_regex.sub('', base_name).strip()
+        original_name_guess = keyword_set.strip(base_names[inst_f]).strip()
         
         # トラック番号パターンを除去 ("01 - Song" -> "Song", "01. Song" -> "Song" など)
-        original_name_guess = re.sub(r'^\d+[\s\-\.]*', '', original_name_guess).strip()
+        original_name_guess = _RE_TRACK_NUM.sub('', original_name_guess).strip()
         
         if not original_name_guess:
             continue
+        guess_lower = original_name_guess.lower()
         
         # 他のトラックで推定原曲名を含むものを探す
         for f in track_filenames:
@@ -59,16 +77,15 @@ def detect_demucs_targets(track_filenames: list[str], keywords: list[str]) -> Di
                 continue
             
             # 対象ファイルのベース名（トラック番号除去後）
-            f_base = re.sub(r'\.[^.]+$', '', f)
-            f_base = re.sub(r'^\d+[\s\-\.]*', '', f_base).strip()
+            f_base = compare_bases[f]
             
             # 部分一致チェック（より厳密な判定が必要な場合は調整）
             # 例: "Song" と "Song (Remix)" は別曲なので、完全一致に近い形で判定
-            if original_name_guess.lower() == f_base.lower():
+            if guess_lower == f_base.lower():
                 targets[f] = False
                 print(f"[INFO] インストペア検出: '{f}' は '{inst_f}' の原曲と判定されました")
             # より緩い判定: 原曲名がファイル名の先頭にある場合
-            elif f_base.lower().startswith(original_name_guess.lower()):
+            elif f_base.lower().startswith(guess_lower):
                 # ただし、原曲名の直後に特殊文字（括弧など）がない場合のみ
                 remaining = f_base[len(original_name_guess):].strip()
                 if not remaining or remaining[0] in ['(', '[', '-', '~']:
@@ -78,30 +95,121 @@ def detect_demucs_targets(track_filenames: list[str], keywords: list[str]) -> Di
     return targets
 
 
+class _DirListing:
+    """1フォルダ分の走査結果（フォルダの mtime が変わらない限り再利用する）"""
+
+    __slots__ = ("mtime_ns", "subdirs", "stems")
+
+    def __init__(self, mtime_ns: int, subdirs: list[str], stems: list[str]):
+        self.mtime_ns = mtime_ns
+        self.subdirs = subdirs
+        self.stems = stems
+
+
+class InstrumentalScanCache:
+    """
+    フォルダごとの走査結果キャッシュ
+
+    フォルダの mtime はその直下の追加・削除・名前変更でしか変わらないため、
+    mtime が同じフォルダは一覧を取り直さず、前回の結果（サブフォルダとインスト音源）を使う。
+    変更直後のフォルダ（mtime の粒度以内）は取りこぼしを避けるためキャッシュしない。
+    """
+
+    # mtime の粒度（FAT / SMB は 2 秒）より新しいフォルダはキャッシュしない
+    RACY_SECONDS = 2.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listings: dict[str, _DirListing] = {}
+
+    def clear(self):
+        with self._lock:
+            self._listings.clear()
+
+    def listing(self, folder: str) -> Optional[_DirListing]:
+        """フォルダの (サブフォルダ, インスト音源) 一覧。読めない場合は None"""
+        try:
+            st = os.stat(folder)
+        except OSError:
+            with self._lock:
+                self._listings.pop(folder, None)
+            return None
+        with self._lock:
+            cached = self._listings.get(folder)
+        if cached is not None and cached.mtime_ns == st.st_mtime_ns:
+            return cached
+
+        subdirs: list[str] = []
+        stems: list[str] = []
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.name)
+                        elif entry.name.lower() in INSTRUMENTAL_FILENAMES:
+                            stems.append(entry.name)
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        listing = _DirListing(st.st_mtime_ns, subdirs, stems)
+        if time.time() - st.st_mtime >= self.RACY_SECONDS:
+            with self._lock:
+                self._listings[folder] = listing
+        return listing
+
+
+# アプリ全体で共有する走査キャッシュ（同じフォルダを何度選んでも2回目以降は速い）
+_scan_cache = InstrumentalScanCache()
+
+
+def _is_pruned(name: str) -> bool:
+    lower = name.lower()
+    return lower in PRUNE_DIRS or lower.startswith('.') or lower.startswith('$')
+
+
+def iter_instrumental_files(demucs_folder: str, max_depth: int = MAX_SCAN_DEPTH,
+                            cache: Optional[InstrumentalScanCache] = None) -> Iterator[tuple[str, str]]:
+    """
+    Demucs出力フォルダから instrumental 音源ファイルを見つけた順に返す
+
+    浅いフォルダから順に走査し、max_depth より深いフォルダと PRUNE_DIRS には潜らない。
+
+    Args:
+        demucs_folder: Demucsの出力フォルダパス (例: htdemucs_ft/ または親フォルダ)
+        max_depth: 潜るフォルダの深さ（demucs_folder 直下が 1）
+        cache: 走査キャッシュ（省略時は共有キャッシュ）
+
+    Yields:
+        (曲フォルダパス, インストファイルパス)
+    """
+    cache = cache or _scan_cache
+    queue = deque([(demucs_folder, 0)])
+    while queue:
+        folder, depth = queue.popleft()
+        listing = cache.listing(folder)
+        if listing is None:
+            continue
+        for name in listing.stems:
+            yield folder, os.path.join(folder, name)
+        if depth >= max_depth:
+            continue
+        for name in listing.subdirs:
+            if not _is_pruned(name):
+                queue.append((os.path.join(folder, name), depth + 1))
+
+
 def extract_instrumental_files(demucs_folder: str) -> list[tuple[str, str]]:
     """
     Demucs出力フォルダから instrumental 音源ファイルを再帰的に抽出
-    
+
     Args:
         demucs_folder: Demucsの出力フォルダパス (例: htdemucs_ft/ または親フォルダ)
-    
+
     Returns:
         [(曲フォルダパス, インストファイルパス), ...] のリスト
     """
-    import os
-    
-    results = []
-    
     if not os.path.exists(demucs_folder):
-        return results
-    
-    # 再帰的にすべてのサブフォルダを走査
-    for root, dirs, files in os.walk(demucs_folder):
-        for file in files:
-            file_lower = file.lower()
-            # no_vocals.wav または minus_vocals.flac を検出
-            if file_lower in ['no_vocals.wav', 'minus_vocals.flac']:
-                inst_file_path = os.path.join(root, file)
-                results.append((root, inst_file_path))
-                
-    return results
+        return []
+    return list(iter_instrumental_files(demucs_folder))
@@ -0,0 +1,592 @@
+"""
+Demucs ジョブキュー（複数アルバムの音源分離をバックグラウンドで順番に処理する）
+
+外部の Demucs GUI を1アルバムずつ操作する代わりに、コマンドライン版 Demucs を
+トラック単位で実行する（Qt 非依存）。キューは WorkDir の _demucs_queue.json に保存し、
+アプリを再起動しても分離済みのトラックはやり直さない。
+アルバムの全トラックが分離し終わったら、そのまま InstrumentalImporter で
+<曲名> (Inst).flac に取り込む（state.json への反映は呼び出し側が行う）。
+
+config.ini の設定:
+    [Paths]    DemucsCli             コマンドライン版 Demucs（demucs.exe など。空ならキューは使えない）
+    [Settings] DemucsCliArgs         引数テンプレート（{input} / {output} / {threads} を置換）
+               DemucsMaxJobs         同時に実行する Demucs の数（既定 1）
+               DemucsThreadsPerJob   1ジョブあたりの CPU スレッド数（0 ならコア数を同時数で割った値）
+
+スレッド数は OMP_NUM_THREADS などの環境変数で Demucs（PyTorch）に渡すため、
+同時に2つ動かしてもコア数以上のスレッドが取り合うことはない。
+分離結果はまず <アルバム>/_demucs_queue/<曲名>.part に書き、成功したものだけ本来の名前に置き換える。
+"""
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from typing import Callable, Optional
+
+from .command_templates import DEFAULT_DEMUCS_ARGS
+from .demucs_detector import InstrumentalScanCache, iter_instrumental_files
+from .instrumental_import import ImportJob, ImportResult, InstrumentalImporter, instrumental_output_path
+
+
+QUEUE_FILENAME = "_demucs_queue.json"
+QUEUE_VERSION = 1
+
+# 分離結果の置き場（アルバムフォルダ直下）
+OUTPUT_DIRNAME = "_demucs_queue"
+
+# 1トラックあたりの分離タイムアウト（CPU 実行を想定して長め）
+SEPARATE_TIMEOUT = 3600
+
+# Demucs（PyTorch / NumPy）が参照するスレッド数の環境変数
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+# トラックの状態
+PENDING = "pending"        # 未分離
+SEPARATED = "separated"    # 分離済み・取り込み待ち
+IMPORTED = "imported"      # 取り込み済み
+FAILED = "failed"          # 失敗（再度キューに追加するとやり直す）
+
+
+def thread_budget(max_jobs: int, threads_per_job: int = 0) -> int:
+    """1ジョブあたりのスレッド数（0 ならコア数を同時数で等分）"""
+    if threads_per_job > 0:
+        return threads_per_job
+    return max(1, (os.cpu_count() or 1) // max(1, max_jobs))
+
+
+def find_instrumental(folder: str) -> Optional[str]:
+    """分離結果フォルダ内のインスト音源（no_vocals.wav / minus_vocals.flac）"""
+    if not os.path.isdir(folder):
+        return None
+    # 1曲分の小さなフォルダで、直後に消したり名前を変えたりするので共有キャッシュは使わない
+    found = next(iter_instrumental_files(folder, cache=InstrumentalScanCache()), None)
+    return found[1] if found else None
+
+
+class DemucsCommand:
+    """
+    実行ファイル + 引数テンプレートで動く Demucs
+
+    Args:
+        executable: 実行ファイルのパス
+        args_template: 引数テンプレート（{input} / {output} / {threads} を含む。空白区切り、引用符可）
+    """
+
+    def __init__(self, executable: str, args_template: str = DEFAULT_DEMUCS_ARGS):
+        self.executable = executable
+        self.args = shlex.split(args_template)
+        for placeholder in ("{input}", "{output}"):
+            if not any(placeholder in a for a in self.args):
+                raise ValueError(f"Demucs: 引数テンプレートに {placeholder} がありません: {args_template}")
+
+    def is_available(self) -> bool:
+        return bool(self.executable) and os.path.exists(self.executable)
+
+    def build_command(self, input_path: str, output_dir: str, threads: int) -> list[str]:
+        return [self.executable] + [
+            a.replace("{input}", input_path).replace("{output}", output_dir).replace("{threads}", str(threads))
+            for a in self.args
+        ]
+
+    @staticmethod
+    def environment(threads: int) -> dict[str, str]:
+        """スレッド数を制限した環境変数"""
+        env = os.environ.copy()
+        for key in THREAD_ENV_VARS:
+            env[key] = str(threads)
+        return env
+
+    def __repr__(self) -> str:
+        return f"DemucsCommand({self.executable!r})"
+
+
+def get_demucs_command(config) -> Optional[DemucsCommand]:
+    """config.ini から Demucs コマンドを作る（未設定・見つからない場合は None）"""
+    executable = config.get_tool_path("DemucsCli")
+    if not executable:
+        return None
+    args_template = config.get_setting("DemucsCliArgs", DEFAULT_DEMUCS_ARGS) or DEFAULT_DEMUCS_ARGS
+    try:
+        return DemucsCommand(executable, args_template)
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        return None
+
+
+def get_concurrency(config) -> tuple[int, int]:
+    """[Settings] DemucsMaxJobs / DemucsThreadsPerJob から (同時数, 1ジョブあたりのスレッド数)"""
+    def read_int(key: str, fallback: int) -> int:
+        try:
+            return int(config.get_setting(key, str(fallback)) or fallback)
+        except (ValueError, TypeError):
+            return fallback
+
+    max_jobs = max(1, read_int("DemucsMaxJobs", 1))
+    return max_jobs, thread_budget(max_jobs, read_int("DemucsThreadsPerJob", 0))
+
+
+class QueueTrack:
+    """キュー内の1トラック（source は元 FLAC の絶対パス）"""
+
+    __slots__ = ("source", "status", "error")
+
+    def __init__(self, source: str, status: str = PENDING, error: str = ""):
+        self.source = source
+        self.status = status
+        self.error = error
+
+    @property
+    def name(self) -> str:
+        """曲名（拡張子なしのファイル名。分離結果のフォルダ名・インストのファイル名に使う）"""
+        return os.path.splitext(os.path.basename(self.source))[0]
+
+    def to_dict(self) -> dict:
+        data = {"source": self.source, "status": self.status}
+        if self.error:
+            data["error"] = self.error
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QueueTrack":
+        return cls(data["source"], data.get("status", PENDING), data.get("error", ""))
+
+
+class QueueJob:
+    """キュー内の1アルバム"""
+
+    def __init__(self, job_id: str, album_folder: str, album_name: str,
+                 tracks: Optional[list[QueueTrack]] = None, created: float = 0.0):
+        self.id = job_id
+        self.album_folder = album_folder
+        self.album_name = album_name
+        self.tracks = tracks or []
+        self.created = created or time.time()
+
+    @property
+    def output_dir(self) -> str:
+        return os.path.join(self.album_folder, OUTPUT_DIRNAME)
+
+    def track_output_dir(self, track: QueueTrack) -> str:
+        return os.path.join(self.output_dir, track.name)
+
+    def count(self, status: str) -> int:
+        return sum(1 for t in self.tracks if t.status == status)
+
+    def is_finished(self) -> bool:
+        """分離・取り込みの残りが無い（取り込み済みか失敗のみ）"""
+        return all(t.status in (IMPORTED, FAILED) for t in self.tracks)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "albumFolder": self.album_folder,
+            "albumName": self.album_name,
+            "created": self.created,
+            "tracks": [t.to_dict() for t in self.tracks],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QueueJob":
+        tracks = [QueueTrack.from_dict(t) for t in data.get("tracks", [])]
+        return cls(data["id"], data["albumFolder"], data.get("albumName", ""), tracks, data.get("created", 0.0))
+
+
+class DemucsQueue:
+    """
+    WorkDir に保存される Demucs ジョブキュー（スレッドセーフ）
+
+    実行中の印はメモリ上だけに持つため、途中で終了した場合は未分離として再開する。
+    """
+
+    def __init__(self, work_dir: str):
+        self.work_dir = os.path.abspath(work_dir)
+        self.queue_path = os.path.join(self.work_dir, QUEUE_FILENAME)
+        self._lock = threading.RLock()
+        self._jobs: list[QueueJob] = []
+        # 実行中のトラック（(job.id, source)）と取り込み中のジョブ
+        self._running: set[tuple[str, str]] = set()
+        self._importing: set[str] = set()
+        self.load()
+
+    # ------------------------
+    # 永続化
+    # ------------------------
+    def load(self):
+        with self._lock:
+            self._jobs = []
+            if not os.path.exists(self.queue_path):
+                return
+            try:
+                with open(self.queue_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get("version") != QUEUE_VERSION:
+                    return
+                for item in data.get("jobs", []):
+                    job = QueueJob.from_dict(item)
+                    if not os.path.isdir(job.album_folder):
+                        print(f"[WARN] Demucs キュー: アルバムフォルダが無いため除外します: {job.album_folder}")
+                        continue
+                    self._jobs.append(job)
+            except Exception as e:
+                print(f"[WARN] Demucs キューを読み込めませんでした（空のキューで開始します）: {e}")
+                self._jobs = []
+
+    def save(self) -> bool:
+        with self._lock:
+            tmp_path = None
+            try:
+                os.makedirs(self.work_dir, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(prefix=".demucs_queue.", suffix=".tmp", dir=self.work_dir)
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump({"version": QUEUE_VERSION, "jobs": [j.to_dict() for j in self._jobs]},
+                              f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self.queue_path)
+                return True
+            except Exception as e:
+                print(f"[WARN] Demucs キューの保存に失敗: {e}")
+                if tmp_path and os.path.exists(tmp_path):
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
+                return False
+
+    # ------------------------
+    # 参照・追加
+    # ------------------------
+    def jobs(self) -> list[QueueJob]:
+        with self._lock:
+            return list(self._jobs)
+
+    def find_job(self, album_folder: str) -> Optional[QueueJob]:
+        key = os.path.normcase(os.path.abspath(album_folder))
+        with self._lock:
+            for job in self._jobs:
+                if os.path.normcase(job.album_folder) == key:
+                    return job
+        return None
+
+    def add(self, album_folder: str, album_name: str, sources: list[str]) -> int:
+        """
+        アルバムのトラックをキューに追加して保存する
+
+        同じアルバムのジョブがあればそこに足す。未処理・分離済みのトラックは重複させず、
+        失敗したトラックは未分離に戻してやり直す。
+
+        Returns:
+            追加（再試行を含む）したトラック数
+        """
+        album_folder = os.path.abspath(album_folder)
+        added = 0
+        with self._lock:
+            job = self.find_job(album_folder)
+            if job is None:
+                job = QueueJob(uuid.uuid4().hex[:12], album_folder, album_name)
+                self._jobs.append(job)
+            job.album_name = album_name or job.album_name
+            by_source = {os.path.normcase(t.source): t for t in job.tracks}
+            for source in sources:
+                source = os.path.abspath(source)
+                track = by_source.get(os.path.normcase(source))
+                if track is None:
+                    track = QueueTrack(source)
+                    job.tracks.append(track)
+                    by_source[os.path.normcase(source)] = track
+                    added += 1
+                elif track.status in (FAILED, IMPORTED):
+                    track.status = PENDING
+                    track.error = ""
+                    added += 1
+            self.save()
+        return added
+
+    def recover(self) -> int:
+        """
+        分離結果が既にある未分離トラックを分離済みにする（前回の終了直前に分離が終わっていた場合）
+
+        Returns:
+            分離済みにしたトラック数
+        """
+        recovered = 0
+        with self._lock:
+            for job in self._jobs:
+                for track in job.tracks:
+                    if track.status == PENDING and (job.id, track.source) not in self._running \
+                            and find_instrumental(job.track_output_dir(track)):
+                        track.status = SEPARATED
+                        recovered += 1
+            if recovered:
+                self.save()
+        return recovered
+
+    def pending_count(self) -> int:
+        """分離・取り込みの残りトラック数"""
+        with self._lock:
+            return sum(1 for j in self._jobs for t in j.tracks if t.status in (PENDING, SEPARATED))
+
+    def running_count(self) -> int:
+        with self._lock:
+            return len(self._running)
+
+    def has_work(self) -> bool:
+        return self.pending_count() > 0
+
+    # ------------------------
+    # 実行側の受け渡し
+    # ------------------------
+    def claim_next(self) -> Optional[tuple[QueueJob, QueueTrack]]:
+        """次に分離するトラック（古いジョブから順に）を実行中にする"""
+        with self._lock:
+            for job in self._jobs:
+                for track in job.tracks:
+                    key = (job.id, track.source)
+                    if track.status == PENDING and key not in self._running:
+                        self._running.add(key)
+                        return job, track
+        return None
+
+    def release(self, job: QueueJob, track: QueueTrack, status: str, error: str = ""):
+        """分離の結果を記録して保存する"""
+        with self._lock:
+            self._running.discard((job.id, track.source))
+            track.status = status
+            track.error = error if status == FAILED else ""
+            self.save()
+
+    def claim_import(self) -> Optional[QueueJob]:
+        """分離が全部終わって取り込み待ちのトラックがあるジョブを取り込み中にする"""
+        with self._lock:
+            for job in self._jobs:
+                if job.id in self._importing or any(j == job.id for j, _ in self._running):
+                    continue
+                if job.count(PENDING) == 0 and job.count(SEPARATED) > 0:
+                    self._importing.add(job.id)
+                    return job
+        return None
+
+    def release_import(self, job: QueueJob):
+        """取り込みの結果を保存し、終わったジョブをキューから外す"""
+        with self._lock:
+            self._importing.discard(job.id)
+            if job.is_finished() and job in self._jobs:
+                self._jobs.remove(job)
+                print(f"[INFO] Demucs キュー: 完了 {job.album_name}")
+            self.save()
+
+
+class DemucsQueueRunner:
+    """
+    キューが空になるまで分離と取り込みを実行する
+
+    Args:
+        queue: DemucsQueue
+        command: DemucsCommand
+        flac_path: flac.exe のパス（取り込み用）
+        max_jobs: 同時に実行する Demucs の数
+        threads_per_job: 1ジョブあたりのスレッド数（0 ならコア数 / max_jobs）
+        convert_workers: 取り込み時の同時変換数（0 / None ならコア数）
+    """
+
+    def __init__(self, queue: DemucsQueue, command: DemucsCommand, flac_path: str,
+                 max_jobs: int = 1, threads_per_job: int = 0, convert_workers: Optional[int] = None):
+        self.queue = queue
+        self.command = command
+        self.flac_path = flac_path
+        self.max_jobs = max(1, max_jobs)
+        self.threads = thread_budget(self.max_jobs, threads_per_job)
+        self.convert_workers = convert_workers
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._procs: set[subprocess.Popen] = set()
+        self._importers: set[InstrumentalImporter] = set()
+
+    def cancel(self):
+        """実行中の Demucs・取り込みを止める（途中のトラックは次回やり直す）"""
+        self._cancel.set()
+        with self._lock:
+            procs = list(self._procs)
+            importers = list(self._importers)
+        for proc in procs:
+            try:
+                proc.terminate()
+            except Exception:
+                pass
+        for importer in importers:
+            importer.cancel()
+
+    def is_cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def run(self,
+            track_callback: Optional[Callable[[QueueJob, QueueTrack, bool, str], None]] = None,
+            album_callback: Optional[Callable[[QueueJob, list[ImportResult]], None]] = None):
+        """
+        キューが空になる（またはキャンセルされる）まで処理する
+
+        Args:
+            track_callback: 1トラック分離するごとに (ジョブ, トラック, 成功, メッセージ) で呼ばれる
+            album_callback: アルバムを取り込むごとに (ジョブ, 取り込み結果) で呼ばれる（state.json への反映用）
+            どちらもワーカースレッドから呼ばれる。
+        """
+        recovered = self.queue.recover()
+        if recovered:
+            print(f"[INFO] Demucs キュー: 分離済みの結果を {recovered} 件引き継ぎました")
+        print(f"[INFO] Demucs キュー開始: 残り {self.queue.pending_count()} 曲 "
+              f"(同時実行数={self.max_jobs}, スレッド数/ジョブ={self.threads})")
+        workers = [
+            threading.Thread(target=self._worker_loop, args=(track_callback, album_callback),
+                             name=f"demucs-{i}", daemon=True)
+            for i in range(self.max_jobs)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+    def _worker_loop(self, track_callback, album_callback):
+        while not self.is_cancelled():
+            # 分離が終わったアルバムは先に取り込んで WAV を片付ける
+            job = self.queue.claim_import()
+            if job is not None:
+                try:
+                    results = self._import(job)
+                finally:
+                    self.queue.release_import(job)
+                if album_callback and results:
+                    album_callback(job, results)
+                continue
+
+            claimed = self.queue.claim_next()
+            if claimed is None:
+                break
+            job, track = claimed
+            try:
+                ok, message = self._separate(job, track)
+            except Exception as e:
+                ok, message = False, f"予期しないエラー: {e}"
+            if ok:
+                status = SEPARATED
+            elif self.is_cancelled():
+                status = PENDING
+            else:
+                status = FAILED
+                print(f"[ERROR] Demucs 失敗: {track.name}: {message}")
+            self.queue.release(job, track, status, message)
+            if track_callback and status != PENDING:
+                track_callback(job, track, ok, message)
+
+    # ------------------------
+    # 分離（ワーカースレッド）
+    # ------------------------
+    def _separate(self, job: QueueJob, track: QueueTrack) -> tuple[bool, str]:
+        if not os.path.exists(track.source):
+            return False, f"元ファイルが見つかりません: {track.source}"
+        if not self.command.is_available():
+            return False, f"ツールが見つかりません: {self.command.executable}"
+
+        output_dir = job.track_output_dir(track)
+        partial = output_dir + ".part"
+        shutil.rmtree(partial, ignore_errors=True)
+        os.makedirs(partial, exist_ok=True)
+        print(f"[INFO] Demucs 分離開始: {job.album_name} / {track.name}")
+
+        ok, message = self._run_command(self.command.build_command(track.source, partial, self.threads), partial)
+        if ok and not find_instrumental(partial):
+            ok, message = False, "出力に no_vocals.wav / minus_vocals.flac がありません"
+        if not ok:
+            shutil.rmtree(partial, ignore_errors=True)
+            return False, message
+
+        shutil.rmtree(output_dir, ignore_errors=True)
+        os.replace(partial, output_dir)
+        print(f"[INFO] Demucs 分離完了: {job.album_name} / {track.name}")
+        return True, ""
+
+    def _run_command(self, args: list[str], working_dir: str) -> tuple[bool, str]:
+        try:
+            proc = subprocess.Popen(
+                args,
+                cwd=working_dir,
+                env=self.command.environment(self.threads),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding='utf-8',
+                errors='ignore',
+            )
+        except Exception as e:
+            return False, f"実行エラー: {e}"
+
+        with self._lock:
+            self._procs.add(proc)
+        try:
+            # キャンセル直前に起動した場合に備えて再確認
+            if self.is_cancelled():
+                proc.terminate()
+            try:
+                _, stderr = proc.communicate(timeout=SEPARATE_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                return False, "タイムアウト: 分離に1時間以上かかりました"
+        finally:
+            with self._lock:
+                self._procs.discard(proc)
+
+        if self.is_cancelled():
+            return False, "キャンセル"
+        if proc.returncode != 0:
+            # 進捗表示で長くなるので末尾だけ残す
+            return False, (stderr or "").strip()[-500:] or f"終了コード {proc.returncode}"
+        return True, ""
+
+    # ------------------------
+    # 取り込み（ワーカースレッド）
+    # ------------------------
+    def _import(self, job: QueueJob) -> list[ImportResult]:
+        tracks = [t for t in job.tracks if t.status == SEPARATED]
+        import_jobs = []
+        by_job: dict[int, QueueTrack] = {}
+        for track in tracks:
+            inst_file = find_instrumental(job.track_output_dir(track))
+            if not inst_file:
+                self.queue.release(job, track, FAILED, "分離結果が見つかりません")
+                continue
+            output_flac = instrumental_output_path(os.path.dirname(track.source), track.name)
+            import_job = ImportJob(track.name, inst_file, track.source, output_flac)
+            by_job[id(import_job)] = track
+            import_jobs.append(import_job)
+        if not import_jobs:
+            return []
+
+        importer = InstrumentalImporter(self.flac_path, import_jobs, self.convert_workers, job.album_folder)
+        with self._lock:
+            self._importers.add(importer)
+        try:
+            if self.is_cancelled():
+                return []
+            results = importer.run()
+        finally:
+            with self._lock:
+                self._importers.discard(importer)
+
+        for result in results:
+            track = by_job[id(result.job)]
+            if result.success:
+                self.queue.release(job, track, IMPORTED)
+                # 取り込んだ WAV は不要（大きいので消しておく）
+                shutil.rmtree(job.track_output_dir(track), ignore_errors=True)
+            elif not result.cancelled:
+                self.queue.release(job, track, FAILED, f"取り込み失敗: {result.message.strip()[:200]}")
+        succeeded = sum(1 for r in results if r.success)
+        print(f"[INFO] Demucs キュー: {job.album_name} を取り込みました (成功 {succeeded} / {len(results)})")
+        try:
+            os.rmdir(job.output_dir)  # 空になっていれば片付ける
+        except OSError:
+            pass
+        return results
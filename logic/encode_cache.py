@@ -0,0 +1,203 @@
+"""
+変換済み AAC / Opus の再利用キャッシュ
+
+FLAC の STREAMINFO MD5（音声データだけのハッシュ。タグやファイル名では変わらない）と
+エンコーダーの設定（Encoder.cache_key）をキーに、変換済みファイルの場所を覚えておく。
+ロールバックして Step3 でタイトルを直した場合などは音声が同じなので、
+既存の変換結果を新しい名前に移し、タグだけ FLAC から書き直す（再エンコードしない）。
+表紙は新しく変換した場合と同じく入れない（アートワークのステップで最適化したものを入れる）。
+
+アルバムフォルダの _encode_cache.json に保存する。記録先のファイルが消えていれば外れ扱い。
+MD5 が記録されていない FLAC（エンコーダーが計算しなかったもの）は対象外。
+"""
+import json
+import os
+import shutil
+import tempfile
+import threading
+from typing import Iterable, Optional
+
+from .encoders import Encoder, EncodeJob, EncodeResult, is_up_to_date, partial_path, remove_quietly
+from .metadata_cache import get_cache
+from .tag_writer import copy_flac_tags
+
+
+CACHE_FILENAME = "_encode_cache.json"
+CACHE_VERSION = 1
+
+# STREAMINFO の MD5 未設定
+EMPTY_MD5 = "0" * 32
+
+
+class EncodeCache:
+    """アルバム単位の変換済みファイルキャッシュ（スレッドセーフ）"""
+
+    def __init__(self, album_folder: str):
+        self.album_folder = os.path.abspath(album_folder)
+        self.cache_path = os.path.join(self.album_folder, CACHE_FILENAME)
+        self._lock = threading.RLock()
+        # {エンコーダーの cache_key: {音声MD5: 出力の相対パス}}
+        self._entries: dict[str, dict[str, str]] = {}
+        self._dirty = False
+        self._load()
+
+    # ------------------------
+    # 永続化
+    # ------------------------
+    def _load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION:
+                self._entries = data.get("entries", {}) or {}
+        except Exception as e:
+            print(f"[WARN] 変換キャッシュを読み込めませんでした（再作成します）: {e}")
+            self._entries = {}
+
+    def save(self) -> bool:
+        """変更があればキャッシュファイルに書き出す（存在しない出力の項目は削除）"""
+        with self._lock:
+            if not self._dirty:
+                return True
+            if not os.path.isdir(self.album_folder):
+                return False
+            entries = {}
+            for key, by_md5 in self._entries.items():
+                alive = {md5: rel for md5, rel in by_md5.items() if os.path.exists(self._abs(rel))}
+                if alive:
+                    entries[key] = alive
+            tmp_path = None
+            try:
+                fd, tmp_path = tempfile.mkstemp(
+                    prefix=".encode_cache.", suffix=".tmp", dir=self.album_folder
+                )
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump({"version": CACHE_VERSION, "entries": entries}, f, ensure_ascii=False)
+                os.replace(tmp_path, self.cache_path)
+            except Exception as e:
+                print(f"[WARN] 変換キャッシュの保存に失敗: {e}")
+                if tmp_path:
+                    remove_quietly(tmp_path)
+                return False
+            self._entries = entries
+            self._dirty = False
+            return True
+
+    def _rel(self, path: str) -> str:
+        abs_path = os.path.abspath(path)
+        try:
+            rel = os.path.relpath(abs_path, self.album_folder)
+        except ValueError:
+            # 別ドライブ（Windows）は絶対パスのまま
+            rel = abs_path
+        return rel.replace('\\', '/')
+
+    def _abs(self, rel: str) -> str:
+        return rel if os.path.isabs(rel) else os.path.join(self.album_folder, rel)
+
+    # ------------------------
+    # 参照・記録
+    # ------------------------
+    def audio_md5(self, flac_path: str) -> Optional[str]:
+        """FLAC の音声 MD5（未設定・読めない場合は None）"""
+        info = get_cache(self.album_folder).get_info(flac_path)
+        md5 = (info or {}).get("md5")
+        return md5 if md5 and md5 != EMPTY_MD5 else None
+
+    def lookup(self, encoder: Encoder, flac_path: str) -> Optional[str]:
+        """同じ音声・同じ設定の変換済みファイル（存在するもの）のパス"""
+        md5 = self.audio_md5(flac_path)
+        if not md5:
+            return None
+        with self._lock:
+            rel = self._entries.get(encoder.cache_key, {}).get(md5)
+        if not rel:
+            return None
+        path = self._abs(rel)
+        return path if os.path.isfile(path) else None
+
+    def record(self, encoder: Encoder, results: Iterable[EncodeResult]) -> int:
+        """成功した（スキップ・再利用を含む）出力を記録する。記録した件数を返す"""
+        count = 0
+        for result in results:
+            if not result.success or not os.path.isfile(result.job.output_path):
+                continue
+            md5 = self.audio_md5(result.job.input_path)
+            if not md5:
+                continue
+            rel = self._rel(result.job.output_path)
+            with self._lock:
+                by_md5 = self._entries.setdefault(encoder.cache_key, {})
+                if by_md5.get(md5) != rel:
+                    by_md5[md5] = rel
+                    self._dirty = True
+            count += 1
+        return count
+
+    def reuse(self, encoder: Encoder, jobs: list[EncodeJob]) -> tuple[list[EncodeJob], list[EncodeResult]]:
+        """
+        キャッシュに当たったジョブを変換済みファイルの移動＋タグ書き直しで済ませる
+
+        出力が入力より新しいジョブはそのまま残す（実行側が変換済みとしてスキップする）。
+
+        Returns:
+            (再エンコードが必要なジョブ, 再利用した結果)
+        """
+        remaining: list[EncodeJob] = []
+        reused: list[EncodeResult] = []
+        # 今回の出力先になっているファイルは移動すると別のジョブが困るのでコピーする
+        outputs = {os.path.normcase(os.path.abspath(j.output_path)) for j in jobs}
+        for job in jobs:
+            if is_up_to_date(job.input_path, job.output_path):
+                remaining.append(job)
+                continue
+            cached = self.lookup(encoder, job.input_path)
+            if not cached:
+                remaining.append(job)
+                continue
+            result = self._reuse_one(job, cached, outputs)
+            if result.success:
+                reused.append(result)
+            else:
+                print(f"[WARN] 変換キャッシュを使えませんでした（再変換します）: {job.label}: {result.message}")
+                remaining.append(job)
+        if reused:
+            print(f"[INFO] {encoder.name}: 変換キャッシュを再利用 {len(reused)} 件")
+            self.record(encoder, reused)
+        return remaining, reused
+
+    def _reuse_one(self, job: EncodeJob, cached: str, outputs: set[str]) -> EncodeResult:
+        output_path = os.path.abspath(job.output_path)
+        cached = os.path.abspath(cached)
+        if os.path.normcase(cached) == os.path.normcase(output_path):
+            # 同じ名前: その場でタグだけ書き直す（空きがあれば音声データは動かない）
+            report = copy_flac_tags(job.input_path, output_path, include_cover=False)
+            if not report.ok:
+                return EncodeResult(job, False, report.error)
+            return EncodeResult(job, True, "キャッシュ再利用", skipped=True)
+
+        partial = partial_path(output_path)
+        try:
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            remove_quietly(partial)
+            if os.path.normcase(cached) in outputs:
+                shutil.copyfile(cached, partial)
+                move_back = False
+            else:
+                # 古い名前のファイルは不要になるので移動（同じドライブならリネームだけ）
+                shutil.move(cached, partial)
+                move_back = True
+            report = copy_flac_tags(job.input_path, partial, include_cover=False)
+            if not report.ok:
+                if move_back:
+                    shutil.move(partial, cached)
+                else:
+                    remove_quietly(partial)
+                return EncodeResult(job, False, report.error)
+            os.replace(partial, output_path)
+        except Exception as e:
+            remove_quietly(partial)
+            return EncodeResult(job, False, str(e))
+        return EncodeResult(job, True, "キャッシュ再利用", skipped=True)
@@ -0,0 +1,421 @@
+"""
+ヘッドレスエンコーダー（Step4 AAC / Step5 Opus の一括変換）
+
+MediaHuman / foobar2000 を手で操作する代わりに、コマンドラインのエンコーダー
+（ffmpeg / opusenc / qaac など）をトラック単位のジョブとして複数同時に実行する（Qt 非依存）。
+出力は _aac_output/<アーティスト>/<アルバム> / _opus_output/<アーティスト>/<アルバム> に
+最終ファイル名（finalFile / instrumentalFile の拡張子違い）で直接書き出すため、取り込み操作は不要。
+
+config.ini の設定:
+    [Paths]    AacEncoder / OpusEncoder           エンコーダーの実行ファイル（空なら自動変換しない）
+    [Settings] AacEncoderArgs / OpusEncoderArgs   引数テンプレート（{input} / {output} を置換）
+               AacEncoderPipeArgs / OpusEncoderPipeArgs
+                                                  標準入力の WAV を受ける場合の引数テンプレート
+                                                  （logic/transcode_fanout.py。{source} は元の FLAC）
+               EncoderWorkers                     同時変換数（0 ならコア数）
+
+実行ファイルと引数だけで動くので、Linux でも入力を出力へコピーするだけのスクリプトを
+指定すれば一連の流れを確認できる。
+出力はまず一時ファイル（<名前>.part.<拡張子>）に書き、成功したものだけ本来の名前に置き換える。
+"""
+import hashlib
+import os
+import shlex
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Optional
+
+from .command_templates import (
+    DEFAULT_AAC_ARGS, DEFAULT_AAC_PIPE_ARGS, DEFAULT_OPUS_ARGS, DEFAULT_OPUS_PIPE_ARGS,
+)
+from .utils import sanitize_foldername
+
+
+# 1トラックあたりのエンコードタイムアウト
+ENCODE_TIMEOUT = 600
+
+
+class EncoderProfile:
+    """コーデックごとの設定キー・出力先・完了フラグ"""
+
+    __slots__ = ("codec", "label", "extension", "tool_key", "args_key", "default_args",
+                 "pipe_args_key", "default_pipe_args", "output_path_key", "default_output", "step_key")
+
+    def __init__(self, codec: str, label: str, extension: str, tool_key: str, args_key: str,
+                 default_args: str, pipe_args_key: str, default_pipe_args: str,
+                 output_path_key: str, default_output: str, step_key: str):
+        self.codec = codec
+        self.label = label
+        self.extension = extension
+        self.tool_key = tool_key
+        self.args_key = args_key
+        self.default_args = default_args
+        self.pipe_args_key = pipe_args_key
+        self.default_pipe_args = default_pipe_args
+        self.output_path_key = output_path_key
+        self.default_output = default_output
+        self.step_key = step_key
+
+
+PROFILES = {
+    "aac": EncoderProfile("aac", "AAC", ".m4a", "AacEncoder", "AacEncoderArgs", DEFAULT_AAC_ARGS,
+                          "AacEncoderPipeArgs", DEFAULT_AAC_PIPE_ARGS,
+                          "aacOutput", "_aac_output", "step4_aac"),
+    "opus": EncoderProfile("opus", "Opus", ".opus", "OpusEncoder", "OpusEncoderArgs", DEFAULT_OPUS_ARGS,
+                           "OpusEncoderPipeArgs", DEFAULT_OPUS_PIPE_ARGS,
+                           "opusOutput", "_opus_output", "step5_opus"),
+}
+
+
+def default_worker_count() -> int:
+    """既定の同時エンコード数（CPU コア数）"""
+    return max(1, os.cpu_count() or 1)
+
+
+class Encoder:
+    """エンコーダーの基底クラス（build_command を実装する）"""
+
+    name = ""
+    extension = ""
+
+    def is_available(self) -> bool:
+        return True
+
+    @property
+    def cache_key(self) -> str:
+        """変換結果を左右する設定の識別子（logic/encode_cache.py のキー）"""
+        return f"{self.name}{self.extension}"
+
+    def build_command(self, input_path: str, output_path: str, source_path: Optional[str] = None) -> list[str]:
+        """input_path が "-" のときは標準入力から読む。source_path はタグの取得元（既定は input_path）"""
+        raise NotImplementedError
+
+
+class CommandEncoder(Encoder):
+    """
+    実行ファイル + 引数テンプレートで動くエンコーダー
+
+    Args:
+        name: 表示名
+        extension: 出力の拡張子（".m4a" など）
+        executable: 実行ファイルのパス
+        args_template: 引数テンプレート（{input} / {output} / {source} を含む。空白区切り、引用符可）
+    """
+
+    def __init__(self, name: str, extension: str, executable: str, args_template: str):
+        self.name = name
+        self.extension = extension
+        self.executable = executable
+        # 置換前に分割するので、パスに空白や引用符が含まれても引数が崩れない
+        self.args = shlex.split(args_template)
+        if not any("{output}" in a for a in self.args):
+            raise ValueError(f"{name}: 引数テンプレートに {{output}} がありません: {args_template}")
+
+    def is_available(self) -> bool:
+        return bool(self.executable) and os.path.exists(self.executable)
+
+    @property
+    def cache_key(self) -> str:
+        # 実行ファイル名と引数（ビットレート等）が同じなら同じ音になるとみなす
+        ident = "\0".join([self.extension, os.path.basename(self.executable).lower(), *self.args])
+        return f"{self.name.lower()}-{hashlib.sha1(ident.encode('utf-8')).hexdigest()[:12]}"
+
+    @property
+    def reads_source_tags(self) -> bool:
+        """引数で元ファイル（{source}）を参照しているか"""
+        return any("{source}" in a for a in self.args)
+
+    def build_command(self, input_path: str, output_path: str, source_path: Optional[str] = None) -> list[str]:
+        source = source_path or input_path
+        return [self.executable] + [
+            a.replace("{input}", input_path).replace("{output}", output_path).replace("{source}", source)
+            for a in self.args
+        ]
+
+    def __repr__(self) -> str:
+        return f"CommandEncoder({self.name!r}, {self.executable!r})"
+
+
+def get_encoder(config, codec: str, pipe: bool = False) -> Optional[Encoder]:
+    """
+    config.ini からエンコーダーを作る
+
+    Args:
+        pipe: True なら標準入力（WAV）を受ける引数テンプレートを使う
+
+    Returns:
+        Encoder（実行ファイルが未設定・見つからない場合は None）
+    """
+    profile = PROFILES[codec]
+    executable = config.get_tool_path(profile.tool_key)
+    if not executable:
+        return None
+    if pipe:
+        args_template = config.get_setting(profile.pipe_args_key, profile.default_pipe_args) or profile.default_pipe_args
+    else:
+        args_template = config.get_setting(profile.args_key, profile.default_args) or profile.default_args
+    try:
+        return CommandEncoder(profile.label, profile.extension, executable, args_template)
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        return None
+
+
+def get_worker_count(config) -> int:
+    """[Settings] EncoderWorkers（0 / 不正値ならコア数）"""
+    try:
+        workers = int(config.get_setting("EncoderWorkers", "0") or 0)
+    except (ValueError, TypeError):
+        workers = 0
+    return workers if workers > 0 else default_worker_count()
+
+
+def partial_path(output_path: str) -> str:
+    """一時ファイル名（拡張子で出力形式を決めるエンコーダーがあるので拡張子は残す）"""
+    stem, ext = os.path.splitext(output_path)
+    return f"{stem}.part{ext}"
+
+
+def is_up_to_date(input_path: str, output_path: str) -> bool:
+    """出力が入力より新しいか（中断後の再実行で変換済みを飛ばす）"""
+    try:
+        return os.path.getmtime(output_path) >= os.path.getmtime(input_path)
+    except OSError:
+        return False
+
+
+def remove_quietly(path: str):
+    try:
+        if os.path.exists(path):
+            os.remove(path)
+    except Exception as e:
+        print(f"[WARN] 一時ファイルの削除に失敗: {path}: {e}")
+
+
+class EncodeJob:
+    """エンコード1件分"""
+
+    __slots__ = ("input_path", "output_path", "label")
+
+    def __init__(self, input_path: str, output_path: str, label: str = ""):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.label = label or os.path.basename(output_path)
+
+
+class EncodeResult:
+    """エンコード1件分の結果"""
+
+    __slots__ = ("job", "success", "skipped", "cancelled", "message")
+
+    def __init__(self, job: EncodeJob, success: bool, message: str = "",
+                 skipped: bool = False, cancelled: bool = False):
+        self.job = job
+        self.success = success
+        self.skipped = skipped
+        self.cancelled = cancelled
+        self.message = message
+
+
+def resolve_output_dir(state, album_folder: str, codec: str) -> str:
+    """出力先 <album>/_aac_output|_opus_output/<アーティスト>/<アルバム>"""
+    profile = PROFILES[codec]
+    base = state.get_path(profile.output_path_key) or profile.default_output
+    return os.path.join(album_folder, base,
+                        sanitize_foldername(state.get_artist_name()),
+                        sanitize_foldername(state.get_album_name()))
+
+
+def resolve_input_dir(state, album_folder: str) -> str:
+    """入力フォルダ _flac_src/<アルバム>（無ければアルバムルート。Step3/4 と同じ解決）"""
+    raw_dirname = state.get_path("rawFlacSrc") or "_flac_src"
+    candidate = os.path.join(album_folder, raw_dirname, sanitize_foldername(state.get_album_name()))
+    return candidate if os.path.isdir(candidate) else album_folder
+
+
+def _find_source(input_dir: str, names: list[str]) -> Optional[str]:
+    """候補名（相対パス → basename の順）で実在する入力ファイルを探す"""
+    for name in names:
+        if not name:
+            continue
+        for candidate in (name, os.path.basename(name)):
+            path = os.path.join(input_dir, candidate)
+            if os.path.isfile(path):
+                return path
+    return None
+
+
+def plan_album_jobs(state, album_folder: str, codec: str) -> tuple[list[EncodeJob], list[str]]:
+    """
+    state.json のトラックからエンコードジョブを作る
+
+    通常版は currentFile（無ければ finalFile / originalFile）、インストは
+    currentInstFile（無ければ instrumentalFile）を入力とし、出力名は finalFile /
+    instrumentalFile の拡張子を差し替えたもの。
+
+    Returns:
+        (ジョブ, 入力が見つからなかった出力ファイル名)
+    """
+    extension = PROFILES[codec].extension
+    input_dir = resolve_input_dir(state, album_folder)
+    output_dir = resolve_output_dir(state, album_folder, codec)
+
+    jobs: dict[str, EncodeJob] = {}
+    missing: list[str] = []
+
+    def add(final_name: str, source_names: list[str]):
+        output_name = os.path.splitext(os.path.basename(final_name))[0] + extension
+        if output_name in jobs or output_name in missing:
+            return
+        source = _find_source(input_dir, source_names)
+        if source is None:
+            missing.append(output_name)
+            return
+        jobs[output_name] = EncodeJob(source, os.path.join(output_dir, output_name), output_name)
+
+    for track in state.get_tracks():
+        final_file = track.get("finalFile", "")
+        if final_file:
+            add(final_file, [track.get("currentFile", ""), final_file, track.get("originalFile", "")])
+        inst_file = track.get("instrumentalFile", "")
+        if inst_file:
+            add(inst_file, [track.get("currentInstFile", ""), inst_file])
+    return list(jobs.values()), missing
+
+
+class EncodeRunner:
+    """
+    エンコードジョブの並列実行
+
+    Args:
+        encoder: 使用するエンコーダー
+        jobs: EncodeJob のリスト
+        max_workers: 同時実行数（0 / None ならコア数）
+        working_dir: エンコーダーの作業ディレクトリ
+        skip_existing: 入力より新しい出力が既にあればスキップする（中断後の再実行用）
+    """
+
+    def __init__(self, encoder: Encoder, jobs: list[EncodeJob], max_workers: Optional[int] = None,
+                 working_dir: Optional[str] = None, skip_existing: bool = True):
+        self.encoder = encoder
+        self.jobs = list(jobs)
+        self.max_workers = max_workers or default_worker_count()
+        self.working_dir = working_dir
+        self.skip_existing = skip_existing
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._procs: set[subprocess.Popen] = set()
+
+    def cancel(self):
+        """未着手のジョブを取りやめ、実行中のエンコーダーを終了させる"""
+        self._cancel.set()
+        with self._lock:
+            procs = list(self._procs)
+        for proc in procs:
+            try:
+                proc.terminate()
+            except Exception:
+                pass
+
+    def is_cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def run(self, progress_callback: Optional[Callable[[int, int, EncodeResult], None]] = None) -> list[EncodeResult]:
+        """
+        全件を処理して結果を返す（jobs と同じ順）
+
+        Args:
+            progress_callback: 1件終わるごとに (完了数, 総数, 結果) で呼ばれる（ワーカースレッドから）
+        """
+        total = len(self.jobs)
+        results: list[Optional[EncodeResult]] = [None] * total
+        if not total:
+            return []
+
+        workers = max(1, min(self.max_workers, total))
+        print(f"[INFO] {self.encoder.name} エンコード開始: {total} 件 (同時実行数={workers})")
+        done = 0
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="encode") as pool:
+            futures = {pool.submit(self._process, job): i for i, job in enumerate(self.jobs)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = EncodeResult(self.jobs[i], False, f"予期しないエラー: {e}")
+                results[i] = result
+                done += 1
+                if progress_callback:
+                    progress_callback(done, total, result)
+        return [r for r in results if r is not None]
+
+    # ------------------------
+    # 1件分の処理（ワーカースレッド）
+    # ------------------------
+    def _process(self, job: EncodeJob) -> EncodeResult:
+        if self.is_cancelled():
+            return EncodeResult(job, False, "キャンセル", cancelled=True)
+
+        output_path = os.path.abspath(job.output_path)
+        if self.skip_existing and is_up_to_date(job.input_path, output_path):
+            return EncodeResult(job, True, "変換済み", skipped=True)
+
+        partial = partial_path(output_path)
+        try:
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            remove_quietly(partial)
+            ok, message = self._encode(os.path.abspath(job.input_path), partial)
+            if ok and not os.path.isfile(partial):
+                ok, message = False, "出力ファイルが作成されませんでした"
+            if not ok:
+                remove_quietly(partial)
+                if self.is_cancelled():
+                    return EncodeResult(job, False, "キャンセル", cancelled=True)
+                print(f"[ERROR] {self.encoder.name} エンコード失敗: {job.label}: {message}")
+                return EncodeResult(job, False, message)
+            os.replace(partial, output_path)
+            return EncodeResult(job, True)
+        except Exception as e:
+            remove_quietly(partial)
+            print(f"[ERROR] {self.encoder.name} エンコード失敗: {job.label}: {e}")
+            return EncodeResult(job, False, str(e))
+
+    def _encode(self, input_path: str, output_path: str) -> tuple[bool, str]:
+        """エンコーダーを実行（キャンセル時は終了させられる）"""
+        if not self.encoder.is_available():
+            return False, f"エンコーダーが見つかりません: {self.encoder!r}"
+        args = self.encoder.build_command(input_path, output_path)
+        try:
+            proc = subprocess.Popen(
+                args,
+                cwd=self.working_dir,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding='utf-8',
+                errors='ignore',
+            )
+        except Exception as e:
+            return False, f"実行エラー: {e}"
+
+        with self._lock:
+            self._procs.add(proc)
+        try:
+            # キャンセル直前に起動した場合に備えて再確認
+            if self.is_cancelled():
+                proc.terminate()
+            try:
+                _, stderr = proc.communicate(timeout=ENCODE_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                return False, f"タイムアウト: エンコードに{ENCODE_TIMEOUT // 60}分以上かかりました"
+        finally:
+            with self._lock:
+                self._procs.discard(proc)
+
+        if proc.returncode != 0:
+            return False, (stderr or "").strip() or f"終了コード {proc.returncode}"
+        return True, ""
@@ -0,0 +1,230 @@
+"""
+FLAC メタデータブロックの軽量リーダー
+
+mutagen.flac.FLAC は PICTURE ブロックの画像データまで全て読み込むため、
+数MBのカバー画像を持つトラックではアートワーク有無の確認だけでも重い。
+ここではブロックヘッダを辿り、STREAMINFO と VORBIS_COMMENT だけを読み、
+PICTURE は画像データ手前のヘッダ（種別・MIME・サイズ等）だけを読んで読み飛ばす。
+音声フレームには一切触れない。
+"""
+import struct
+
+
+BLOCK_STREAMINFO = 0
+BLOCK_PADDING = 1
+BLOCK_APPLICATION = 2
+BLOCK_SEEKTABLE = 3
+BLOCK_VORBIS_COMMENT = 4
+BLOCK_CUESHEET = 5
+BLOCK_PICTURE = 6
+
+
+class FlacHeaderError(ValueError):
+    """FLAC として解釈できない／途中で切れている"""
+
+
+class FlacPictureInfo:
+    """PICTURE ブロックのヘッダ情報（画像データ本体は持たない）"""
+
+    __slots__ = ("type", "mime", "description", "width", "height", "depth",
+                 "colors", "data_length", "data_offset")
+
+    def __init__(self, type: int, mime: str, description: str, width: int, height: int,
+                 depth: int, colors: int, data_length: int, data_offset: int):
+        self.type = type
+        self.mime = mime
+        self.description = description
+        self.width = width
+        self.height = height
+        self.depth = depth
+        self.colors = colors
+        self.data_length = data_length
+        self.data_offset = data_offset
+
+    def __repr__(self) -> str:
+        return (f"FlacPictureInfo(type={self.type}, mime={self.mime!r}, "
+                f"{self.width}x{self.height}, {self.data_length} bytes)")
+
+    def to_dict(self) -> dict:
+        return {
+            "type": self.type,
+            "mime": self.mime,
+            "description": self.description,
+            "width": self.width,
+            "height": self.height,
+            "depth": self.depth,
+            "size": self.data_length,
+        }
+
+
+class FlacHeader:
+    """メタデータブロックの解析結果"""
+
+    __slots__ = ("streaminfo", "vendor", "tags", "pictures", "padding", "blocks", "audio_offset")
+
+    def __init__(self):
+        self.streaminfo: dict = {}
+        self.vendor: str = ""
+        # キーは小文字、値は出現順のリスト
+        self.tags: dict[str, list[str]] = {}
+        self.pictures: list[FlacPictureInfo] = []
+        self.padding: int = 0
+        # (ブロック種別, ブロック本体のファイル位置, 長さ)
+        self.blocks: list[tuple[int, int, int]] = []
+        # 最初の音声フレームの位置（= メタデータ領域の終端）
+        self.audio_offset: int = 0
+
+    def get(self, key: str, default: str = "") -> str:
+        values = self.tags.get(key.lower())
+        return values[0] if values else default
+
+
+def _read_exact(f, size: int) -> bytes:
+    data = f.read(size)
+    if len(data) != size:
+        raise FlacHeaderError("unexpected end of file in metadata")
+    return data
+
+
+def _skip_id3v2(f) -> int:
+    """先頭の ID3v2 タグを読み飛ばし、fLaC マーカーの位置を返す"""
+    head = f.read(10)
+    if len(head) == 10 and head[:3] == b"ID3":
+        size = 0
+        for b in head[6:10]:
+            size = (size << 7) | (b & 0x7F)
+        footer = 10 if head[5] & 0x10 else 0
+        return 10 + size + footer
+    return 0
+
+
+def _parse_streaminfo(data: bytes) -> dict:
+    if len(data) < 34:
+        raise FlacHeaderError("STREAMINFO too short")
+    min_block, max_block = struct.unpack(">HH", data[0:4])
+    min_frame = int.from_bytes(data[4:7], "big")
+    max_frame = int.from_bytes(data[7:10], "big")
+    packed = int.from_bytes(data[10:18], "big")
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x07) + 1
+    bits_per_sample = ((packed >> 36) & 0x1F) + 1
+    total_samples = packed & 0xFFFFFFFFF
+    return {
+        "min_blocksize": min_block,
+        "max_blocksize": max_block,
+        "min_framesize": min_frame,
+        "max_framesize": max_frame,
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "bits_per_sample": bits_per_sample,
+        "total_samples": total_samples,
+        "length": (total_samples / sample_rate) if sample_rate else 0.0,
+        "md5": data[18:34].hex(),
+    }
+
+
+def _parse_vorbis_comment(data: bytes) -> tuple[str, dict[str, list[str]]]:
+    pos = 0
+
+    def take(n: int) -> bytes:
+        nonlocal pos
+        if pos + n > len(data):
+            raise FlacHeaderError("VORBIS_COMMENT truncated")
+        chunk = data[pos:pos + n]
+        pos += n
+        return chunk
+
+    vendor_len = struct.unpack("<I", take(4))[0]
+    vendor = take(vendor_len).decode("utf-8", "replace")
+    count = struct.unpack("<I", take(4))[0]
+    tags: dict[str, list[str]] = {}
+    for _ in range(count):
+        length = struct.unpack("<I", take(4))[0]
+        entry = take(length).decode("utf-8", "replace")
+        if "=" not in entry:
+            continue
+        key, value = entry.split("=", 1)
+        tags.setdefault(key.lower(), []).append(value)
+    return vendor, tags
+
+
+def _parse_picture_header(f, block_offset: int, block_length: int) -> FlacPictureInfo:
+    """PICTURE ブロックのヘッダ部分だけを読む（ファイル位置は画像データ先頭）"""
+    pic_type, mime_len = struct.unpack(">II", _read_exact(f, 8))
+    if 8 + mime_len > block_length:
+        raise FlacHeaderError("PICTURE mime length out of range")
+    mime = _read_exact(f, mime_len).decode("ascii", "replace")
+    desc_len = struct.unpack(">I", _read_exact(f, 4))[0]
+    if 12 + mime_len + desc_len + 20 > block_length:
+        raise FlacHeaderError("PICTURE description length out of range")
+    desc = _read_exact(f, desc_len).decode("utf-8", "replace")
+    width, height, depth, colors, data_length = struct.unpack(">IIIII", _read_exact(f, 20))
+    header_len = 32 + mime_len + desc_len
+    if header_len + data_length > block_length:
+        raise FlacHeaderError("PICTURE data length out of range")
+    return FlacPictureInfo(
+        pic_type, mime, desc, width, height, depth, colors,
+        data_length, block_offset + header_len
+    )
+
+
+def read_flac_header(path: str, read_tags: bool = True, read_pictures: bool = True) -> FlacHeader:
+    """
+    FLAC のメタデータブロックだけを読む
+
+    Args:
+        path: FLAC ファイルのパス
+        read_tags: False なら VORBIS_COMMENT も読み飛ばす
+        read_pictures: False なら PICTURE のヘッダも読まない（個数のみ blocks で分かる）
+
+    Raises:
+        FlacHeaderError: FLAC として不正・途中で切れている場合
+        OSError: ファイルを開けない場合
+    """
+    header = FlacHeader()
+    with open(path, "rb") as f:
+        start = _skip_id3v2(f)
+        f.seek(start)
+        if f.read(4) != b"fLaC":
+            raise FlacHeaderError("not a FLAC file")
+
+        last = False
+        while not last:
+            block_header = _read_exact(f, 4)
+            last = bool(block_header[0] & 0x80)
+            block_type = block_header[0] & 0x7F
+            length = int.from_bytes(block_header[1:4], "big")
+            offset = f.tell()
+            header.blocks.append((block_type, offset, length))
+
+            if block_type == BLOCK_STREAMINFO:
+                header.streaminfo = _parse_streaminfo(_read_exact(f, length))
+            elif block_type == BLOCK_VORBIS_COMMENT and read_tags:
+                header.vendor, header.tags = _parse_vorbis_comment(_read_exact(f, length))
+            elif block_type == BLOCK_PICTURE and read_pictures:
+                header.pictures.append(_parse_picture_header(f, offset, length))
+            elif block_type == BLOCK_PADDING:
+                header.padding += length
+            elif block_type == 127:
+                raise FlacHeaderError("invalid metadata block type")
+
+            f.seek(offset + length)
+
+        header.audio_offset = f.tell()
+        if not header.streaminfo:
+            raise FlacHeaderError("missing STREAMINFO")
+    return header
+
+
+def count_pictures(path: str) -> int:
+    """PICTURE ブロックの数（ヘッダすら読まずに数える）"""
+    header = read_flac_header(path, read_tags=False, read_pictures=False)
+    return sum(1 for block_type, _, _ in header.blocks if block_type == BLOCK_PICTURE)
+
+
+def read_picture_data(path: str, picture: FlacPictureInfo) -> bytes:
+    """指定した PICTURE の画像データだけを読む"""
+    with open(path, "rb") as f:
+        f.seek(picture.data_offset)
+        return _read_exact(f, picture.data_length)
+
@@ -0,0 +1,381 @@
+"""
+Demucs 出力（no_vocals.wav / minus_vocals.flac）の取り込み
+
+WAV → FLAC 変換を複数同時に実行する（Qt 非依存）。
+元トラックのタグ・画像はエンコード時に flac の -T / --picture で書き込み、
+後段のタグ同期がその場で書き換えられるよう PADDING も確保しておく（再オープン・再保存なし）。
+出力はまず一時ファイル（*.part）に書き、成功したものだけ本来の名前に置き換えるため、
+失敗・キャンセル時に中途半端なファイルは残らない。
+state.json の更新は呼び出し側が結果をまとめて1回で反映する。
+Demucs 出力を監視して1曲ずつ取り込む場合は run() の代わりに submit() / wait() を使う。
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Callable, Optional
+
+from .flac_metadata import read_flac_header, read_picture_data
+from .tag_writer import save_with_padding
+
+
+# 1ファイルあたりの変換タイムアウト（ExternalToolRunner.run_cli_tool と同じ）
+CONVERT_TIMEOUT = 300
+
+# インストFLACに確保する PADDING（Step3 のタグ同期・ReplayGain 付与を再書き込みなしで収める）
+INSTRUMENTAL_PADDING = 65536
+
+# コマンドライン長の上限（Windows は 32767 文字）。超える場合はエンコード後にタグを書く
+MAX_COMMAND_LENGTH = 30000
+
+
+def default_worker_count() -> int:
+    """既定の同時変換数（CPU コア数）"""
+    return max(1, os.cpu_count() or 1)
+
+
+def instrumental_output_path(flac_album_dir: str, song_name: str) -> str:
+    """インストFLACの出力先（<曲名> (Inst).flac。長すぎる場合は曲名を短縮）"""
+    output_flac = os.path.join(flac_album_dir, f"{song_name} (Inst).flac")
+    # パスの長さチェック（Windows の MAX_PATH 制限対策）
+    if len(output_flac) > 260:
+        print(f"[WARNING] 出力パスが長すぎます ({len(output_flac)} 文字): {output_flac}")
+        # 短縮版のファイル名を使用
+        short_name = song_name[:50] if len(song_name) > 50 else song_name
+        output_flac = os.path.join(flac_album_dir, f"{short_name} (Inst).flac")
+        print(f"[INFO] 短縮パスを使用: {output_flac}")
+    return output_flac
+
+
+class ImportJob:
+    """取り込み1件分"""
+
+    __slots__ = ("song_name", "inst_file", "orig_file_path", "output_flac")
+
+    def __init__(self, song_name: str, inst_file: str, orig_file_path: str, output_flac: str):
+        self.song_name = song_name
+        self.inst_file = inst_file
+        self.orig_file_path = orig_file_path
+        self.output_flac = output_flac
+
+
+class ImportResult:
+    """取り込み1件分の結果"""
+
+    __slots__ = ("job", "success", "cancelled", "message")
+
+    def __init__(self, job: ImportJob, success: bool, message: str = "", cancelled: bool = False):
+        self.job = job
+        self.success = success
+        self.cancelled = cancelled
+        self.message = message
+
+
+def build_encode_metadata_args(orig_file_path: str, picture_dir: str) -> list[str]:
+    """
+    元トラックのタグ・画像を flac のエンコード引数（-T / --picture）にする
+
+    タグはジャンルのみ "Instrumental" に置き換える。画像は picture_dir に書き出して参照する。
+    元トラックが無い場合はジャンルのみ。
+    """
+    args: list[str] = []
+    tags: dict[str, list[str]] = {}
+    pictures = []
+    if orig_file_path and os.path.exists(orig_file_path):
+        header = read_flac_header(orig_file_path)
+        tags = header.tags
+        pictures = header.pictures
+
+    for key, values in tags.items():
+        if key == "genre":
+            continue
+        for value in values:
+            args += ["-T", f"{key}={value}"]
+    args += ["-T", "genre=Instrumental"]
+
+    for i, pic in enumerate(pictures):
+        if pic.mime == "-->":
+            continue  # URL 参照の画像は扱わない
+        pic_path = os.path.join(picture_dir, f"picture_{i}")
+        with open(pic_path, 'wb') as f:
+            f.write(read_picture_data(orig_file_path, pic))
+        # TYPE|MIME|DESCRIPTION|WIDTHxHEIGHTxDEPTH/COLORS|FILE（説明中の | は使えない）
+        desc = pic.description.replace("|", "/")
+        dims = f"{pic.width}x{pic.height}x{pic.depth}" + (f"/{pic.colors}" if pic.colors else "")
+        if not (pic.width and pic.height and pic.depth):
+            dims = ""  # flac に画像から求めさせる
+        args.append(f"--picture={pic.type}|{pic.mime}|{desc}|{dims}|{pic_path}")
+    return args
+
+
+def copy_tags_as_instrumental(orig_file_path: str, dest_flac: str, padding: int = INSTRUMENTAL_PADDING):
+    """元トラックのタグと画像をコピーし、ジャンルのみ "Instrumental" にする（失敗時は例外）"""
+    from mutagen.flac import FLAC
+    dest = FLAC(dest_flac)
+    if orig_file_path and os.path.exists(orig_file_path):
+        src = FLAC(orig_file_path)
+        # 既存タグをクリアしてコピー
+        dest.delete()
+        for k, v in (src.tags or {}).items():
+            dest[k] = v
+        # 画像もコピー
+        dest.clear_pictures()
+        for pic in src.pictures:
+            dest.add_picture(pic)
+    # ジャンルだけ上書き
+    dest["genre"] = ["Instrumental"]
+    # 以降のタグ編集がその場で収まるよう PADDING を確保
+    report = save_with_padding(dest, reserve=padding)
+    if not report.ok:
+        raise OSError(report.error)
+
+
+def apply_import_results(state, results: list["ImportResult"]) -> int:
+    """
+    成功した取り込みを state.json に反映する（元トラックに instrumentalFile を追加、1回で保存）
+
+    Returns:
+        反映した件数
+    """
+    succeeded = [r for r in results if r.success]
+    if not succeeded or not state:
+        return 0
+    album = state.get_album()
+    applied = 0
+    with state.transaction():
+        for result in succeeded:
+            orig_basename = os.path.basename(result.job.orig_file_path or "")
+            orig_track = album.find_by_file(orig_basename) if orig_basename else None
+            if not orig_track:
+                print(f"[WARNING] 元トラックのIDが見つかりません: {orig_basename}")
+                continue
+            # インストファイルの相対パス（ファイル名のみ）
+            inst_filename = os.path.basename(result.job.output_flac)
+            print(f"[INFO] state.json を更新: {orig_track.id} に instrumentalFile = {inst_filename}")
+            state.update_track(orig_track.id, {
+                "instrumentalFile": inst_filename,
+                "hasInstrumental": True
+            })
+            applied += 1
+    return applied
+
+
+class InstrumentalImporter:
+    """
+    インスト音源の並列取り込み
+
+    Args:
+        flac_path: flac.exe のパス
+        jobs: 取り込む ImportJob のリスト
+        max_workers: 同時変換数（0 / None ならコア数）
+        working_dir: flac の作業ディレクトリ
+    """
+
+    def __init__(self, flac_path: str, jobs: list[ImportJob], max_workers: Optional[int] = None,
+                 working_dir: Optional[str] = None):
+        self.flac_path = flac_path
+        self.jobs = list(jobs)
+        self.max_workers = max_workers or default_worker_count()
+        self.working_dir = working_dir
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._procs: set[subprocess.Popen] = set()
+        # submit() 用（最初の submit で作る）
+        self._pool: Optional[ThreadPoolExecutor] = None
+        # submit() した (ジョブ, Future)（submit した順）
+        self._submitted: list[tuple[ImportJob, Future]] = []
+
+    def cancel(self):
+        """未着手の変換を取りやめ、実行中の flac を終了させる"""
+        self._cancel.set()
+        with self._lock:
+            procs = list(self._procs)
+            pool = self._pool
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        for proc in procs:
+            try:
+                proc.terminate()
+            except Exception:
+                pass
+
+    def is_cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def run(self, progress_callback: Optional[Callable[[int, int, ImportResult], None]] = None) -> list[ImportResult]:
+        """
+        全件を処理して結果を返す（jobs と同じ順）
+
+        Args:
+            progress_callback: 1件終わるごとに (完了数, 総数, 結果) で呼ばれる（ワーカースレッドから）
+        """
+        total = len(self.jobs)
+        results: list[Optional[ImportResult]] = [None] * total
+        if not total:
+            return []
+
+        workers = max(1, min(self.max_workers, total))
+        print(f"[INFO] インスト取り込み開始: {total} 件 (同時変換数={workers})")
+        done = 0
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="flac") as pool:
+            futures = {pool.submit(self._process, job): i for i, job in enumerate(self.jobs)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = ImportResult(self.jobs[i], False, f"予期しないエラー: {e}")
+                results[i] = result
+                done += 1
+                if progress_callback:
+                    progress_callback(done, total, result)
+        return [r for r in results if r is not None]
+
+    def submit(self, job: ImportJob, callback: Optional[Callable[[ImportResult], None]] = None) -> Future:
+        """
+        1件を追加してすぐに変換を始める（run() とは併用しない）
+
+        Args:
+            callback: 終わったときに結果を渡して呼ばれる（ワーカースレッドから）
+        """
+        with self._lock:
+            if self._pool is None:
+                print(f"[INFO] インスト取り込み開始（逐次） (同時変換数={self.max_workers})")
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="flac")
+            self.jobs.append(job)
+            future = self._pool.submit(self._process_safe, job)
+            self._submitted.append((job, future))
+        if callback:
+            future.add_done_callback(lambda f: callback(f.result()) if not f.cancelled() else None)
+        return future
+
+    def wait(self) -> list[ImportResult]:
+        """submit() した全件の終了を待ち、結果を submit した順に返す"""
+        with self._lock:
+            submitted = list(self._submitted)
+            pool = self._pool
+        results = []
+        for job, future in submitted:
+            if future.cancelled():
+                results.append(ImportResult(job, False, "キャンセル", cancelled=True))
+            else:
+                results.append(future.result())
+        if pool is not None:
+            pool.shutdown(wait=True)
+        return results
+
+    # ------------------------
+    # 1件分の処理（ワーカースレッド）
+    # ------------------------
+    def _process_safe(self, job: ImportJob) -> ImportResult:
+        try:
+            return self._process(job)
+        except Exception as e:
+            return ImportResult(job, False, f"予期しないエラー: {e}")
+
+    def _process(self, job: ImportJob) -> ImportResult:
+        if self.is_cancelled():
+            return ImportResult(job, False, "キャンセル", cancelled=True)
+
+        output_flac = os.path.abspath(job.output_flac)
+        partial = output_flac + ".part"
+        try:
+            self._remove_quietly(partial)
+            tags_written = False
+            if job.inst_file.lower().endswith('.wav'):
+                with tempfile.TemporaryDirectory(prefix="inst_pictures_") as picture_dir:
+                    try:
+                        metadata_args = build_encode_metadata_args(job.orig_file_path, picture_dir)
+                    except Exception as e:
+                        print(f"[WARN] 元トラックのタグ読み取り失敗（エンコード後にコピーします）: {job.song_name}: {e}")
+                        metadata_args = None
+                    if metadata_args is not None and sum(len(a) + 3 for a in metadata_args) > MAX_COMMAND_LENGTH:
+                        print(f"[INFO] タグが大きいためエンコード後にコピーします: {job.song_name}")
+                        metadata_args = None
+                    ok, message = self._convert(os.path.abspath(job.inst_file), partial, metadata_args or [])
+                    tags_written = ok and metadata_args is not None
+                if not ok:
+                    self._remove_quietly(partial)
+                    if self.is_cancelled():
+                        return ImportResult(job, False, "キャンセル", cancelled=True)
+                    print(f"[ERROR] FLAC変換失敗: {job.song_name}: {message}")
+                    print(f"[INFO] 入力ファイル: {job.inst_file}")
+                    print(f"[INFO] 出力ファイル: {output_flac}")
+                    return ImportResult(job, False, message)
+            else:
+                # 既にFLACの場合はコピー（元ファイルの移動は成功が確定してから）
+                shutil.copyfile(job.inst_file, partial)
+
+            if self.is_cancelled():
+                self._remove_quietly(partial)
+                return ImportResult(job, False, "キャンセル", cancelled=True)
+
+            # エンコード時に書けなかった場合のみ、元のトラックのタグをコピーしジャンルを "Instrumental" に変更
+            if not tags_written:
+                try:
+                    copy_tags_as_instrumental(job.orig_file_path, partial)
+                except Exception as e:
+                    self._remove_quietly(partial)
+                    print(f"[ERROR] タグコピー失敗: {job.song_name}: {e}")
+                    return ImportResult(job, False, f"タグコピー失敗: {e}")
+
+            # 完成したものだけ本来の名前に置き換える（重複時は上書き）
+            os.replace(partial, output_flac)
+            if not job.inst_file.lower().endswith('.wav'):
+                self._remove_quietly(job.inst_file)
+            return ImportResult(job, True)
+        except Exception as e:
+            self._remove_quietly(partial)
+            print(f"[ERROR] インスト取り込み失敗: {job.song_name}: {e}")
+            return ImportResult(job, False, str(e))
+
+    def _convert(self, wav_path: str, output_path: str, metadata_args: list[str]) -> tuple[bool, str]:
+        """flac -8 で WAV を変換（タグ・画像・PADDING も同時に書く。キャンセル時は終了させられる）"""
+        if not os.path.exists(self.flac_path):
+            return False, f"ツールが見つかりません: {self.flac_path}"
+        # --keep-foreign-metadata オプションを追加してWARNINGを回避
+        args = [self.flac_path, "-8", "--keep-foreign-metadata", "-f",
+                f"--padding={INSTRUMENTAL_PADDING}", *metadata_args,
+                wav_path, "-o", output_path]
+        try:
+            proc = subprocess.Popen(
+                args,
+                cwd=self.working_dir,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding='utf-8',
+                errors='ignore',
+            )
+        except Exception as e:
+            return False, f"実行エラー: {e}"
+
+        with self._lock:
+            self._procs.add(proc)
+        try:
+            # キャンセル直前に起動した場合に備えて再確認
+            if self.is_cancelled():
+                proc.terminate()
+            try:
+                _, stderr = proc.communicate(timeout=CONVERT_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                return False, "タイムアウト: コマンドの実行に5分以上かかりました"
+        finally:
+            with self._lock:
+                self._procs.discard(proc)
+
+        if proc.returncode != 0:
+            return False, stderr or f"終了コード {proc.returncode}"
+        return True, ""
+
+    @staticmethod
+    def _remove_quietly(path: str):
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except Exception as e:
+            print(f"[WARN] 一時ファイルの削除に失敗: {path}: {e}")
@@ -0,0 +1,151 @@
+"""
+インスト／Demucs除外キーワードの判定エンジン
+
+キーワード群を1本の正規表現（共通接頭辞をまとめたトライ形式）にコンパイルし、
+ファイル名1つにつき1回の走査で判定・除去できるようにする。
+キーワード数が増えても呼び出し側のループ回数は変わらない。
+
+キーワードの種類:
+    skip:                config.ini [Demucs] SkipKeywords（Demucs対象外の判定・原曲名の推定）
+    instrumental:        Step3 のファイル名によるインスト判定
+    output_instrumental: Step4/5 の変換済みファイル取り込み時のインスト判定
+
+get_keyword_engine(config) は設定の SkipKeywords が変わっていれば作り直す。
+"""
+import re
+import threading
+from typing import Iterable, Optional
+
+
+# Step3 のファイル名によるインスト判定（小文字で比較）
+INSTRUMENTAL_NAME_KEYWORDS = [
+    "inst", "instrumental", "off vocal", "off-vocal", "offvocal", "backing track", "karaoke",
+    "voiceless", "minus one", "オリジナル・カラオケ", "インスト", "オフボーカル", "オフボ", "カラオケ", "歌無し",
+]
+
+# Step4/5 の出力取り込み時のインスト判定
+OUTPUT_INSTRUMENTAL_KEYWORDS = [
+    "(inst)", "instrumental", "off vocal", "off-vocal", "offvocal", "backing track", "karaoke",
+]
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """キーワードを共通接頭辞でまとめた正規表現（長い一致を優先）を作る"""
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: dict) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            # ここで終わるキーワードもある: 続きは任意（貪欲なので長い方を先に試す）
+            return "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+class KeywordSet:
+    """コンパイル済みのキーワード群（大文字小文字は区別しない）"""
+
+    def __init__(self, keywords: Iterable[str]):
+        # 重複・空文字を除き、大文字小文字違いも1つにまとめる
+        seen = set()
+        self.keywords: list[str] = []
+        for kw in keywords:
+            kw = (kw or "").strip()
+            if kw and kw.lower() not in seen:
+                seen.add(kw.lower())
+                self.keywords.append(kw)
+
+        if self.keywords:
+            pattern = _trie_pattern(kw.lower() for kw in self.keywords)
+            self._search = re.compile(pattern, re.IGNORECASE)
+            # (Off Vocal) 等の表記を括弧・ハイフンごと除去する
+            self._strip = re.compile(rf"\s*[\[\(\-]?\s*(?:{pattern})\s*[\]\)\-]?", re.IGNORECASE)
+        else:
+            self._search = None
+            self._strip = None
+
+    def __bool__(self) -> bool:
+        return bool(self.keywords)
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def contains(self, text: str) -> bool:
+        """いずれかのキーワードを含むか"""
+        return bool(self._search and text and self._search.search(text))
+
+    def find(self, text: str) -> Optional[str]:
+        """最初に見つかったキーワード（本文中の表記のまま）"""
+        if not self._search or not text:
+            return None
+        m = self._search.search(text)
+        return m.group(0) if m else None
+
+    def strip(self, text: str) -> str:
+        """キーワードを前後の括弧・ハイフンごと除去する"""
+        if not self._strip or not text:
+            return text
+        return self._strip.sub("", text)
+
+
+class KeywordEngine:
+    """用途別のキーワード群をまとめたもの"""
+
+    def __init__(self, skip_keywords: Iterable[str] = ()):
+        self.skip = KeywordSet(skip_keywords)
+        self.instrumental = KeywordSet(INSTRUMENTAL_NAME_KEYWORDS)
+        self.output_instrumental = KeywordSet(OUTPUT_INSTRUMENTAL_KEYWORDS)
+
+    def is_instrumental_name(self, name: str) -> bool:
+        """ファイル名だけでインストか簡易判定"""
+        return self.instrumental.contains(name)
+
+
+_engine: Optional[KeywordEngine] = None
+_engine_key: Optional[tuple[str, ...]] = None
+_engine_lock = threading.Lock()
+
+
+def get_keyword_engine(config=None) -> KeywordEngine:
+    """
+    共有のキーワードエンジンを取得
+
+    Args:
+        config: ConfigManager（渡すと SkipKeywords の変更を検知して作り直す）
+    """
+    global _engine, _engine_key
+    keywords = tuple(config.get_demucs_keywords() or []) if config is not None else None
+    with _engine_lock:
+        if _engine is None or (keywords is not None and keywords != _engine_key):
+            if keywords is None:
+                keywords = ()
+            _engine = KeywordEngine(keywords)
+            _engine_key = keywords
+        return _engine
+
+
+_skip_sets: dict[tuple[str, ...], KeywordSet] = {}
+
+
+def get_keyword_set(keywords: Iterable[str]) -> KeywordSet:
+    """任意のキーワードリストのコンパイル結果（リストの内容ごとにキャッシュ）"""
+    key = tuple(keywords or ())
+    with _engine_lock:
+        if _engine is not None and key == _engine_key:
+            return _engine.skip
+        kwset = _skip_sets.get(key)
+        if kwset is None:
+            if len(_skip_sets) >= 8:
+                _skip_sets.clear()
+            kwset = KeywordSet(key)
+            _skip_sets[key] = kwset
+        return kwset
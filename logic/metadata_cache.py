@@ -0,0 +1,234 @@
+"""
+FLAC のタグ・ストリーム情報・アートワーク有無のキャッシュ
+
+同じ FLAC を何度も開かないよう、アルバムごとに
+(相対パス, サイズ, 更新時刻) をキーにした解析結果を保持し、
+アルバムフォルダの _metadata_cache.json に保存する。
+ファイルのサイズか更新時刻が変われば自動的に読み直す。
+解析はメタデータブロックのヘッダのみを読む flac_metadata で行い、画像データは読まない。
+"""
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+from .flac_metadata import read_flac_header
+
+
+CACHE_FILENAME = "_metadata_cache.json"
+CACHE_VERSION = 2
+# prefetch の既定同時読み取り数（ネットワーク共有でも詰まらない程度）
+DEFAULT_PREFETCH_WORKERS = 8
+# get_cache() で保持するアルバム数（古いものから保存して手放す）
+MAX_CACHED_ALBUMS = 4
+
+
+def read_flac_metadata(flac_path: str) -> dict:
+    """FLAC を解析してキャッシュ用の dict を返す（失敗時は例外）"""
+    header = read_flac_header(flac_path)
+    info = header.streaminfo
+    return {
+        "tags": header.tags,
+        "info": {
+            "sample_rate": info["sample_rate"],
+            "channels": info["channels"],
+            "bits_per_sample": info["bits_per_sample"],
+            "total_samples": info["total_samples"],
+            "length": info["length"],
+            "md5": info["md5"],
+        },
+        "pictures": [pic.to_dict() for pic in header.pictures],
+        "padding": header.padding,
+    }
+
+
+class MetadataCache:
+    """アルバム単位のメタデータキャッシュ（スレッドセーフ）"""
+
+    def __init__(self, album_folder: str):
+        self.album_folder = os.path.abspath(album_folder)
+        self.cache_path = os.path.join(self.album_folder, CACHE_FILENAME)
+        self._lock = threading.RLock()
+        self._entries: dict[str, dict] = {}
+        self._dirty = False
+        self._load()
+
+    # ------------------------
+    # 永続化
+    # ------------------------
+    def _load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION:
+                self._entries = data.get("entries", {}) or {}
+        except Exception as e:
+            # 壊れていても作り直せばよいだけなので捨てる
+            print(f"[WARN] メタデータキャッシュを読み込めませんでした（再作成します）: {e}")
+            self._entries = {}
+
+    def save(self) -> bool:
+        """変更があればキャッシュファイルに書き出す（存在しないファイルの項目は削除）"""
+        with self._lock:
+            if not self._dirty:
+                return True
+            if not os.path.isdir(self.album_folder):
+                return False
+            entries = {
+                rel: entry for rel, entry in self._entries.items()
+                if os.path.exists(self._abs(rel))
+            }
+            tmp_path = None
+            try:
+                fd, tmp_path = tempfile.mkstemp(
+                    prefix=".metadata_cache.", suffix=".tmp", dir=self.album_folder
+                )
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump({"version": CACHE_VERSION, "entries": entries}, f, ensure_ascii=False)
+                os.replace(tmp_path, self.cache_path)
+            except Exception as e:
+                print(f"[WARN] メタデータキャッシュの保存に失敗: {e}")
+                if tmp_path:
+                    try:
+                        os.remove(tmp_path)
+                    except Exception:
+                        pass
+                return False
+            self._entries = entries
+            self._dirty = False
+            return True
+
+    # ------------------------
+    # 参照
+    # ------------------------
+    def _rel(self, path: str) -> str:
+        abs_path = os.path.abspath(path)
+        try:
+            rel = os.path.relpath(abs_path, self.album_folder)
+        except ValueError:
+            # 別ドライブ（Windows）は絶対パスのまま
+            rel = abs_path
+        return rel.replace('\\', '/')
+
+    def _abs(self, rel: str) -> str:
+        return rel if os.path.isabs(rel) else os.path.join(self.album_folder, rel)
+
+    def get(self, path: str) -> Optional[dict]:
+        """
+        解析結果を取得（キャッシュが古ければ読み直す）
+
+        Returns:
+            {"tags": {...}, "info": {...}, "pictures": [...], "padding": int} / 読めない場合 None
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+
+        rel = self._rel(path)
+        with self._lock:
+            entry = self._entries.get(rel)
+            if entry and entry.get("size") == st.st_size and entry.get("mtime_ns") == st.st_mtime_ns:
+                return entry
+
+        try:
+            parsed = read_flac_metadata(path)
+        except Exception as e:
+            print(f"[WARN] メタデータ読み取り失敗: {path}: {e}")
+            return None
+
+        parsed["size"] = st.st_size
+        parsed["mtime_ns"] = st.st_mtime_ns
+        with self._lock:
+            self._entries[rel] = parsed
+            self._dirty = True
+        return parsed
+
+    def prefetch(self, paths: Iterable[str], max_workers: int = DEFAULT_PREFETCH_WORKERS) -> int:
+        """
+        複数ファイルの解析をスレッドプールでまとめて行う
+
+        キャッシュが有効なファイルは stat のみで済む。以降の get 系は
+        キャッシュから即座に返るため、呼び出し側は従来どおり逐次に参照してよい。
+
+        Returns:
+            解析できたファイル数
+        """
+        paths = list(dict.fromkeys(paths))
+        if not paths:
+            return 0
+        workers = max(1, min(int(max_workers or 1), len(paths)))
+        if workers == 1:
+            return sum(1 for p in paths if self.get(p) is not None)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="metadata") as pool:
+            return sum(1 for entry in pool.map(self.get, paths) if entry is not None)
+
+    def get_tags(self, path: str) -> Optional[dict[str, list[str]]]:
+        """Vorbis コメント（キーは小文字）"""
+        entry = self.get(path)
+        return entry["tags"] if entry else None
+
+    def get_tag(self, path: str, key: str, default: str = "") -> str:
+        """タグの先頭値"""
+        tags = self.get_tags(path) or {}
+        values = tags.get(key.lower())
+        return values[0] if values else default
+
+    def get_info(self, path: str) -> Optional[dict]:
+        """ストリーム情報"""
+        entry = self.get(path)
+        return entry["info"] if entry else None
+
+    def get_pictures(self, path: str) -> list[dict]:
+        """埋め込み画像のヘッダ情報（type, mime, description, width, height, depth, size）"""
+        entry = self.get(path)
+        return list(entry.get("pictures") or []) if entry else []
+
+    def has_picture(self, path: str) -> bool:
+        """アートワークが埋め込まれているか"""
+        return bool(self.get_pictures(path))
+
+    def invalidate(self, path: str):
+        """書き換えたファイルの項目を破棄"""
+        with self._lock:
+            if self._entries.pop(self._rel(path), None) is not None:
+                self._dirty = True
+
+
+# 最近使った順（末尾が最新）
+_registry: dict[str, MetadataCache] = {}
+_registry_lock = threading.Lock()
+
+
+def get_cache(album_folder: str) -> MetadataCache:
+    """
+    アルバムフォルダ単位で共有されるキャッシュを取得
+
+    保持するのは最近使った MAX_CACHED_ALBUMS 件まで。あふれたキャッシュは保存して手放す
+    （バッチ処理などで多数のアルバムを扱ってもメモリが増え続けない）。
+    """
+    key = os.path.normcase(os.path.abspath(album_folder))
+    evicted: list[MetadataCache] = []
+    with _registry_lock:
+        cache = _registry.pop(key, None)
+        if cache is None:
+            cache = MetadataCache(album_folder)
+        _registry[key] = cache
+        while len(_registry) > MAX_CACHED_ALBUMS:
+            evicted.append(_registry.pop(next(iter(_registry))))
+    for old in evicted:
+        print(f"[DEBUG] メタデータキャッシュを手放します: {old.album_folder}")
+        old.save()
+    return cache
+
+
+def release_cache(album_folder: str) -> bool:
+    """アルバムのキャッシュを保存して手放す（保持していなければ何もしない）"""
+    key = os.path.normcase(os.path.abspath(album_folder))
+    with _registry_lock:
+        cache = _registry.pop(key, None)
+    return cache.save() if cache is not None else True
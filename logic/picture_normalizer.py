@@ -0,0 +1,282 @@
+"""
+FLAC に埋め込まれた巨大な PICTURE の正規化
+
+リッピングによっては 5〜20MB の PNG カバーが全トラックに入っており、_final_flac の容量・
+NAS への転送時間・各ステップでの mutagen の読み込み時間が膨らむ（インスト同期でもそのまま複製される）。
+
+閾値を超える PICTURE を持つトラックだけ、全ての PICTURE を最適化した表紙1枚（JPEG, 種別 3）に置き換える。
+書き換えはメタデータブロックを組み直し、音声フレームは読み込まずにそのままストリームコピーする
+（mutagen の save() のように画像データをメモリに展開しない）。一時ファイルに書き出し、
+STREAMINFO の MD5 と音声データのサイズが変わっていないことを確認してから置き換える。
+表紙の最適化は同じ画像（MIME・寸法・データ長が同じもの）につき1回だけ行う。
+置き換え済みの表紙（幅が指定以下の JPEG 1枚）は再エンコードせず、削減量が小さいトラックは書き直さない
+（何度実行しても画質が落ちたり、音声ごと書き直したりしない）。
+"""
+import io
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Optional
+
+from mutagen.flac import Picture
+
+from .artwork_handler import pillow_available, render_artwork_with_pillow
+from .flac_metadata import (
+    BLOCK_PADDING, BLOCK_PICTURE, FlacHeader, FlacHeaderError, FlacPictureInfo,
+    read_flac_header, read_picture_data,
+)
+from .tag_writer import DEFAULT_RESERVE
+
+
+# これより大きい PICTURE を持つトラックを対象にする（KB）
+DEFAULT_MAX_KB = 1024
+# 置き換える表紙の最大幅（元画像より大きくはしない）
+DEFAULT_WIDTH = 1000
+DEFAULT_QUALITY = 90
+# 同時に処理するトラック数（ほぼ I/O 待ち）
+DEFAULT_WORKERS = 4
+# これより減らない場合は書き直さない（KB）
+MIN_SAVING_KB = 64
+
+# メタデータブロックの長さは 24bit
+MAX_BLOCK_LENGTH = (1 << 24) - 1
+COPY_CHUNK = 1024 * 1024
+
+
+class NormalizeResult:
+    """1トラック分の結果（changed=False は対象外で触らなかったもの）"""
+
+    __slots__ = ("path", "ok", "changed", "bytes_before", "bytes_after", "error")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.ok = False
+        self.changed = False
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.error = ""
+
+    @property
+    def saved(self) -> int:
+        return self.bytes_before - self.bytes_after if self.ok else 0
+
+    def __repr__(self) -> str:
+        return (f"NormalizeResult({os.path.basename(self.path)!r}, ok={self.ok}, "
+                f"changed={self.changed}, saved={self.saved})")
+
+
+def summarize(results: list[NormalizeResult]) -> str:
+    """結果の一行表示（置き換えた数・削減量・失敗数）"""
+    changed = [r for r in results if r.ok and r.changed]
+    failed = [r for r in results if not r.ok]
+    saved = sum(r.saved for r in changed)
+    return (f"埋め込み画像の正規化: {len(changed)}/{len(results)} トラックを置き換え、"
+            f"{saved / (1024 * 1024):.1f}MB 削減（失敗 {len(failed)}）")
+
+
+def _pick_source(pictures: list[FlacPictureInfo]) -> FlacPictureInfo:
+    """元にする画像（表紙 = 種別 3 があればそれ、無ければ一番大きいもの）"""
+    fronts = [p for p in pictures if p.type == 3]
+    return max(fronts or pictures, key=lambda p: p.data_length)
+
+
+def _write_block(f, block_type: int, body: bytes, last: bool):
+    if len(body) > MAX_BLOCK_LENGTH:
+        raise ValueError(f"メタデータブロックが大きすぎます: {len(body)} bytes")
+    f.write(bytes([block_type | (0x80 if last else 0)]) + len(body).to_bytes(3, "big"))
+    f.write(body)
+
+
+class PictureNormalizer:
+    """
+    アルバム内 FLAC の巨大な PICTURE を並列で置き換える
+
+    Args:
+        files: 対象の FLAC
+        max_kb: これより大きい PICTURE を持つトラックを置き換える
+        width: 置き換える表紙の最大幅
+        quality: 置き換える表紙の JPEG 品質
+        max_workers: 同時に処理するトラック数
+    """
+
+    def __init__(self, files: list[str], max_kb: int = DEFAULT_MAX_KB, width: int = DEFAULT_WIDTH,
+                 quality: int = DEFAULT_QUALITY, max_workers: Optional[int] = None):
+        self.files = list(files)
+        self.max_bytes = max(0, max_kb) * 1024
+        self.width = width
+        self.quality = quality
+        self.max_workers = max_workers or DEFAULT_WORKERS
+        self._cancel = threading.Event()
+        # (MIME, 幅, 高さ, データ長) -> 置き換え後の PICTURE ブロック本体
+        self._covers: dict[tuple, bytes] = {}
+        self._cover_lock = threading.Lock()
+
+    def cancel(self):
+        """未着手のトラックを取りやめる（処理中のトラックは終わるまで待つ）"""
+        self._cancel.set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def run(self, progress_callback: Optional[Callable[[int, int, NormalizeResult], None]] = None
+            ) -> Optional[list[NormalizeResult]]:
+        """
+        全トラックを処理して結果を返す（キャンセル時は None。置き換え済みのトラックはそのまま）
+
+        Args:
+            progress_callback: 1トラック終わるごとに (完了数, 総数, 結果) で呼ばれる
+        """
+        total = len(self.files)
+        if not total:
+            return []
+        if not pillow_available():
+            print("[WARN] Pillow がインストールされていないため、埋め込み画像の正規化をスキップします")
+            return []
+        results: list[Optional[NormalizeResult]] = [None] * total
+        workers = max(1, min(self.max_workers, total))
+        print(f"[INFO] 埋め込み画像の正規化開始: {total} トラック "
+              f"(閾値 {self.max_bytes // 1024}KB, 同時処理数={workers})")
+
+        done = 0
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="picture") as pool:
+            futures = {pool.submit(self._normalize_one, path): i for i, path in enumerate(self.files)}
+            for future in as_completed(futures):
+                i = futures[future]
+                result = future.result()
+                results[i] = result
+                done += 1
+                if not result.ok:
+                    print(f"[ERROR] 埋め込み画像の正規化に失敗: {os.path.basename(result.path)}: {result.error}")
+                elif result.changed:
+                    print(f"[INFO] 埋め込み画像を置き換え: {os.path.basename(result.path)} "
+                          f"({result.bytes_before // 1024}KB → {result.bytes_after // 1024}KB)")
+                if progress_callback:
+                    progress_callback(done, total, result)
+                if self.is_cancelled():
+                    for f in futures:
+                        f.cancel()
+                    break
+        if self.is_cancelled():
+            return None
+        finished = [r for r in results if r is not None]
+        print(f"[INFO] {summarize(finished)}")
+        return finished
+
+    # ------------------------
+    # internal
+    # ------------------------
+    def _normalize_one(self, path: str) -> NormalizeResult:
+        result = NormalizeResult(path)
+        if self.is_cancelled():
+            result.error = "キャンセルされました"
+            return result
+        try:
+            result.bytes_before = result.bytes_after = os.path.getsize(path)
+            header = read_flac_header(path, read_tags=False)
+            if not any(p.data_length > self.max_bytes for p in header.pictures):
+                result.ok = True
+                return result
+            if self._already_normalized(header):
+                # 前回置き換えた表紙（再エンコードすると画質が落ちるだけ）
+                print(f"[DEBUG] 埋め込み画像は正規化済みのためスキップ: {os.path.basename(path)}")
+                result.ok = True
+                return result
+            picture_body = self._cover_block(path, _pick_source(header.pictures))
+            current = sum(length for block_type, _, length in header.blocks if block_type == BLOCK_PICTURE)
+            if current - len(picture_body) < MIN_SAVING_KB * 1024:
+                print(f"[DEBUG] 埋め込み画像を置き換えてもほとんど減らないためスキップ: "
+                      f"{os.path.basename(path)} ({current // 1024}KB → {len(picture_body) // 1024}KB)")
+                result.ok = True
+                return result
+            result.bytes_after = self._rewrite(path, header, picture_body, result.bytes_before)
+            result.ok = True
+            result.changed = True
+        except (OSError, FlacHeaderError, ValueError) as e:
+            result.error = str(e)
+        except Exception as e:
+            result.error = f"予期しないエラー: {e}"
+        return result
+
+    def _already_normalized(self, header: FlacHeader) -> bool:
+        """画像が幅 width 以下の JPEG の表紙（種別 3）1枚だけか"""
+        if len(header.pictures) != 1:
+            return False
+        picture = header.pictures[0]
+        return (picture.type == 3 and picture.mime.lower() in ("image/jpeg", "image/jpg")
+                and 0 < picture.width <= self.width)
+
+    def _cover_block(self, path: str, source: FlacPictureInfo) -> bytes:
+        """置き換え後の PICTURE ブロック本体（同じ画像は1回だけ最適化する）"""
+        key = (source.mime, source.width, source.height, source.data_length)
+        with self._cover_lock:
+            cached = self._covers.get(key)
+            if cached is None:
+                cached = self._build_cover_block(read_picture_data(path, source), source)
+                self._covers[key] = cached
+            return cached
+
+    def _build_cover_block(self, data: bytes, source: FlacPictureInfo) -> bytes:
+        from PIL import Image
+        with Image.open(io.BytesIO(data)) as img:
+            size = img.size
+        # 元画像より大きくはしない
+        width = min(self.width, max(size))
+        rendered = render_artwork_with_pillow(data, [(width, 'jpg', self.quality, 0)])
+        jpeg, _quality = rendered[(width, 'jpg')]
+        if len(jpeg) >= len(data):
+            # 最適化しても小さくならない場合は元の画像を表紙として残す
+            print(f"[INFO] 最適化しても小さくならないため元の画像を使います ({source.mime}, {len(data) // 1024}KB)")
+            jpeg, mime = data, source.mime
+            out_size = size
+        else:
+            mime = 'image/jpeg'
+            with Image.open(io.BytesIO(jpeg)) as img:
+                out_size = img.size
+            print(f"[INFO] 表紙を最適化: {source.mime} {size[0]}x{size[1]} {len(data) // 1024}KB "
+                  f"→ JPEG {out_size[0]}x{out_size[1]} {len(jpeg) // 1024}KB")
+        pic = Picture()
+        pic.type = 3
+        pic.mime = mime
+        pic.width, pic.height = out_size
+        pic.depth = 24
+        pic.data = jpeg
+        return pic.write()
+
+    def _rewrite(self, path: str, header: FlacHeader, picture_body: bytes, size_before: int) -> int:
+        """
+        PICTURE を picture_body の1枚にして書き直す（音声フレームはストリームコピー）
+
+        Returns:
+            書き直し後のファイルサイズ
+        """
+        folder = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(prefix=".picture.", suffix=".tmp", dir=folder)
+        try:
+            with os.fdopen(fd, 'wb') as dst, open(path, 'rb') as src:
+                # 先頭（ID3v2 があればそれも）〜 fLaC マーカーまではそのまま
+                marker_end = header.blocks[0][1] - 4
+                dst.write(src.read(marker_end))
+                kept = [(t, o, l) for t, o, l in header.blocks if t not in (BLOCK_PICTURE, BLOCK_PADDING)]
+                for block_type, offset, length in kept:
+                    src.seek(offset)
+                    _write_block(dst, block_type, src.read(length), last=False)
+                _write_block(dst, BLOCK_PICTURE, picture_body, last=False)
+                # 次回のタグ書き込み（ReplayGain など）をその場で済ませるための空き
+                _write_block(dst, BLOCK_PADDING, b"\0" * DEFAULT_RESERVE, last=True)
+                src.seek(header.audio_offset)
+                shutil.copyfileobj(src, dst, COPY_CHUNK)
+
+            new_header = read_flac_header(tmp_path, read_tags=False)
+            size_after = os.path.getsize(tmp_path)
+            if (new_header.streaminfo.get("md5") != header.streaminfo.get("md5")
+                    or size_after - new_header.audio_offset != size_before - header.audio_offset
+                    or len(new_header.pictures) != 1):
+                raise ValueError("書き直し後の検証に失敗しました（元のファイルは変更していません）")
+            shutil.copymode(path, tmp_path)
+            os.replace(tmp_path, path)
+            return size_after
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
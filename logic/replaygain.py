@@ -0,0 +1,576 @@
+"""
+ReplayGain 2.0 / EBU R128（ITU-R BS.1770）のラウドネス測定
+
+foobar2000 での手動スキャンの代わりに、各トラックを flac -d で PCM にデコードして
+K 特性フィルタ → 400ms ブロック（75% 重なり）→ 絶対 / 相対ゲートで積分ラウドネスを求める。
+トラックはプロセスプールで並列に測定する（Qt 非依存）。
+
+アルバムゲインは各トラックのブロックを 0.01 LU 刻みのヒストグラム（件数・エネルギー和）に
+まとめて返しておき、それを合算してゲートをかけ直す（2回目のデコードは不要）。
+
+書き込むタグ（基準 -18 LUFS、ピークはサンプルピーク）:
+    REPLAYGAIN_TRACK_GAIN / REPLAYGAIN_TRACK_PEAK / REPLAYGAIN_ALBUM_GAIN / REPLAYGAIN_ALBUM_PEAK
+
+精度の確認（EBU Tech 3341 の基準信号を合成して測定）:
+    python -m logic.replaygain --selftest
+"""
+import math
+import os
+import subprocess
+import sys
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Iterable, Optional
+
+from .flac_metadata import read_flac_header
+from .tag_writer import WriteStats, save_with_padding
+
+
+# ReplayGain 2.0 の基準ラウドネス
+REFERENCE_LOUDNESS = -18.0
+
+# BS.1770: 400ms ブロックを 100ms ずつずらす。絶対ゲート -70 LUFS、相対ゲート -10 LU
+BLOCK_SUBBLOCKS = 4
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+
+# アルバム合算用ヒストグラムの刻み（LU）
+HISTOGRAM_STEP = 0.01
+
+# 1トラックあたりのデコードタイムアウト
+DECODE_TIMEOUT = 600
+
+
+def default_worker_count() -> int:
+    """既定の同時測定数（CPU コア数）"""
+    return max(1, os.cpu_count() or 1)
+
+
+# ------------------------
+# K 特性フィルタ・ブロック集計
+# ------------------------
+def k_weighting_coefficients(sample_rate: int) -> tuple[float, ...]:
+    """
+    K 特性（高域シェルフ + 高域通過）の双2次フィルタ係数をサンプリング周波数に合わせて求める
+
+    Returns:
+        (b0, b1, b2, a1, a2, c1, c2)  1段目は b/a、2段目は分子 [1, -2, 1]・分母 [1, c1, c2]
+    """
+    # 1段目: 高域シェルフ（BS.1770 の 48kHz 係数を与えるアナログ原型）
+    f0 = 1681.974450955533
+    gain_db = 3.999843853973347
+    q = 0.7071752369554196
+    k = math.tan(math.pi * f0 / sample_rate)
+    vh = 10.0 ** (gain_db / 20.0)
+    vb = vh ** 0.4996667741545416
+    a0 = 1.0 + k / q + k * k
+    b0 = (vh + vb * k / q + k * k) / a0
+    b1 = 2.0 * (k * k - vh) / a0
+    b2 = (vh - vb * k / q + k * k) / a0
+    a1 = 2.0 * (k * k - 1.0) / a0
+    a2 = (1.0 - k / q + k * k) / a0
+
+    # 2段目: 高域通過（RLB）
+    f0 = 38.13547087602444
+    q = 0.5003270373238773
+    k = math.tan(math.pi * f0 / sample_rate)
+    d0 = 1.0 + k / q + k * k
+    c1 = 2.0 * (k * k - 1.0) / d0
+    c2 = (1.0 - k / q + k * k) / d0
+    return b0, b1, b2, a1, a2, c1, c2
+
+
+def _filter_energy(samples, state: list, coeffs: tuple[float, ...]) -> float:
+    """1チャンネル分のサンプルに K 特性をかけ、二乗和を返す（state はフィルタの内部状態）"""
+    b0, b1, b2, a1, a2, c1, c2 = coeffs
+    z1, z2, u1, u2 = state
+    acc = 0.0
+    for s in samples:
+        y = b0 * s + z1
+        z1 = b1 * s - a1 * y + z2
+        z2 = b2 * s - a2 * y
+        w = y + u1
+        u1 = -2.0 * y - c1 * w + u2
+        u2 = y - c2 * w
+        acc += w * w
+    state[0], state[1], state[2], state[3] = z1, z2, u1, u2
+    return acc
+
+
+def channel_weights(channels: int) -> list[float]:
+    """BS.1770 のチャンネル重み（5.1ch は LFE を除きサラウンドを 1.41 倍）"""
+    if channels == 6:
+        return [1.0, 1.0, 1.0, 0.0, 1.41, 1.41]
+    if channels == 5:
+        return [1.0, 1.0, 1.0, 1.41, 1.41]
+    return [1.0] * channels
+
+
+def _energy_to_loudness(energy: float) -> float:
+    return -0.691 + 10.0 * math.log10(energy) if energy > 0 else float("-inf")
+
+
+class LoudnessMeter:
+    """
+    1トラック分の測定器
+
+    100ms 単位のサンプル（チャンネル別・フルスケール ±scale の整数または実数）を add で渡し、
+    最後に integrated / histogram を参照する。
+    """
+
+    def __init__(self, sample_rate: int, channels: int, scale: float = 1.0):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.hop = int(round(sample_rate / 10))
+        self.coeffs = k_weighting_coefficients(sample_rate)
+        self.weights = channel_weights(channels)
+        self._states = [[0.0, 0.0, 0.0, 0.0] for _ in range(channels)]
+        self._norm = 1.0 / (scale * scale * BLOCK_SUBBLOCKS * self.hop)
+        self._subblocks: list[float] = []
+        self._pending = [array('d') for _ in range(channels)]
+        self.blocks: list[float] = []
+        self.peak = 0.0
+        self._scale = scale
+
+    def add(self, channel_samples: list):
+        """チャンネル別のサンプル列を追加（長さは揃っていること。任意の長さでよい）"""
+        for ch, samples in enumerate(channel_samples):
+            if len(samples):
+                peak = max(max(samples), -min(samples)) / self._scale
+                if peak > self.peak:
+                    self.peak = peak
+        n = len(channel_samples[0]) if channel_samples else 0
+        pos = 0
+        # 前回の端数を 100ms に満たす
+        have = len(self._pending[0])
+        if have:
+            take = min(self.hop - have, n)
+            for ch in range(self.channels):
+                self._pending[ch].extend(channel_samples[ch][:take])
+            pos = take
+            if len(self._pending[0]) == self.hop:
+                self._add_subblock(self._pending)
+                self._pending = [array('d') for _ in range(self.channels)]
+        while n - pos >= self.hop:
+            self._add_subblock([s[pos:pos + self.hop] for s in channel_samples])
+            pos += self.hop
+        if pos < n:
+            for ch in range(self.channels):
+                self._pending[ch].extend(channel_samples[ch][pos:])
+
+    def _add_subblock(self, channel_samples):
+        energy = 0.0
+        for ch in range(self.channels):
+            weight = self.weights[ch]
+            e = _filter_energy(channel_samples[ch], self._states[ch], self.coeffs)
+            if weight:
+                energy += weight * e
+        self._subblocks.append(energy)
+        if len(self._subblocks) >= BLOCK_SUBBLOCKS:
+            self.blocks.append(sum(self._subblocks[-BLOCK_SUBBLOCKS:]) * self._norm)
+
+    @property
+    def integrated(self) -> Optional[float]:
+        """積分ラウドネス（LUFS。ゲートを通るブロックが無ければ None）"""
+        return gated_loudness(self.blocks)
+
+    def histogram(self) -> dict[int, tuple[int, float]]:
+        """アルバム合算用ヒストグラム {ビン番号: (ブロック数, エネルギー和)}（絶対ゲート以上のみ）"""
+        hist: dict[int, list] = {}
+        for z in self.blocks:
+            loudness = _energy_to_loudness(z)
+            if loudness < ABSOLUTE_GATE:
+                continue
+            index = int((loudness - ABSOLUTE_GATE) / HISTOGRAM_STEP)
+            entry = hist.get(index)
+            if entry is None:
+                hist[index] = [1, z]
+            else:
+                entry[0] += 1
+                entry[1] += z
+        return {i: (c, e) for i, (c, e) in hist.items()}
+
+
+def gated_loudness(blocks: Iterable[float]) -> Optional[float]:
+    """ブロックのエネルギー列から BS.1770 のゲート付き積分ラウドネスを求める"""
+    gated = [z for z in blocks if _energy_to_loudness(z) >= ABSOLUTE_GATE]
+    if not gated:
+        return None
+    threshold = _energy_to_loudness(sum(gated) / len(gated)) + RELATIVE_GATE
+    kept = [z for z in gated if _energy_to_loudness(z) >= threshold]
+    if not kept:
+        return None
+    return _energy_to_loudness(sum(kept) / len(kept))
+
+
+def merge_histograms(histograms: Iterable[dict[int, tuple[int, float]]]) -> dict[int, tuple[int, float]]:
+    """複数トラックのヒストグラムを合算"""
+    merged: dict[int, list] = {}
+    for hist in histograms:
+        for index, (count, energy) in hist.items():
+            entry = merged.setdefault(index, [0, 0.0])
+            entry[0] += count
+            entry[1] += energy
+    return {i: (c, e) for i, (c, e) in merged.items()}
+
+
+def histogram_loudness(hist: dict[int, tuple[int, float]]) -> Optional[float]:
+    """ヒストグラムから積分ラウドネスを求める（相対ゲートはビン単位。誤差は 0.01 LU 以内）"""
+    count = sum(c for c, _ in hist.values())
+    if not count:
+        return None
+    energy = sum(e for _, e in hist.values())
+    threshold = _energy_to_loudness(energy / count) + RELATIVE_GATE
+    first = int(math.floor((threshold - ABSOLUTE_GATE) / HISTOGRAM_STEP))
+    kept_count = 0
+    kept_energy = 0.0
+    for index, (c, e) in hist.items():
+        if index >= first:
+            kept_count += c
+            kept_energy += e
+    if not kept_count:
+        return None
+    return _energy_to_loudness(kept_energy / kept_count)
+
+
+# ------------------------
+# デコード・1トラック測定（プロセスプールのワーカー）
+# ------------------------
+def _pcm_to_array(data: bytes, bytes_per_sample: int) -> array:
+    """リトルエンディアン符号付き PCM を整数配列にする（24bit は 32bit に広げる）"""
+    if bytes_per_sample == 3:
+        count = len(data) // 3
+        wide = bytearray(count * 4)
+        wide[1::4] = data[0::3]
+        wide[2::4] = data[1::3]
+        wide[3::4] = data[2::3]
+        data = bytes(wide)
+        typecode = 'i'
+    else:
+        typecode = {1: 'b', 2: 'h', 4: 'i'}[bytes_per_sample]
+    samples = array(typecode)
+    samples.frombytes(data)
+    if sys.byteorder == "big" and bytes_per_sample > 1:
+        samples.byteswap()
+    return samples
+
+
+class TrackLoudness:
+    """1トラック分の測定結果（プロセス間で受け渡す）"""
+
+    __slots__ = ("path", "integrated", "peak", "histogram", "error")
+
+    def __init__(self, path: str, integrated: Optional[float] = None, peak: float = 0.0,
+                 histogram: Optional[dict] = None, error: str = ""):
+        self.path = path
+        self.integrated = integrated
+        self.peak = peak
+        self.histogram = histogram or {}
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return not self.error
+
+    @property
+    def gain(self) -> Optional[float]:
+        """ReplayGain 2.0 のトラックゲイン（dB）"""
+        return None if self.integrated is None else REFERENCE_LOUDNESS - self.integrated
+
+
+def measure_flac(flac_tool: str, path: str) -> TrackLoudness:
+    """flac -d で FLAC を PCM にデコードしながら測定する"""
+    try:
+        info = read_flac_header(path, read_tags=False, read_pictures=False).streaminfo
+        sample_rate = info["sample_rate"]
+        channels = info["channels"]
+        bits = info["bits_per_sample"]
+    except Exception as e:
+        return TrackLoudness(path, error=f"ヘッダ読み取り失敗: {e}")
+
+    bytes_per_sample = (bits + 7) // 8
+    # 24bit は上位詰めで 32bit に広げるのでフルスケールも 2^31
+    scale = float(1 << (31 if bytes_per_sample == 3 else bits - 1))
+    meter = LoudnessMeter(sample_rate, channels, scale)
+    frame_bytes = bytes_per_sample * channels
+    read_size = meter.hop * frame_bytes * 10  # 1秒分ずつ
+
+    args = [flac_tool, "-d", "-c", "-s", "--force-raw-format", "--endian=little", "--sign=signed", path]
+    try:
+        proc = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except Exception as e:
+        return TrackLoudness(path, error=f"実行エラー: {e}")
+
+    # エラー出力が詰まらないよう別スレッドで読み捨てる（末尾だけ残す）
+    stderr_tail = []
+    reader = threading.Thread(target=lambda: stderr_tail.append(proc.stderr.read()[-2000:]), daemon=True)
+    reader.start()
+    rest = b""
+    try:
+        while True:
+            data = proc.stdout.read(read_size)
+            if not data:
+                break
+            data = rest + data
+            usable = len(data) - len(data) % frame_bytes
+            rest = data[usable:]
+            samples = _pcm_to_array(data[:usable], bytes_per_sample)
+            meter.add([samples[ch::channels] for ch in range(channels)])
+    finally:
+        proc.stdout.close()
+    try:
+        proc.wait(timeout=DECODE_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+        return TrackLoudness(path, error="タイムアウト: デコードが終了しませんでした")
+    reader.join()
+    if proc.returncode != 0:
+        message = (stderr_tail[0] if stderr_tail else b"").decode('utf-8', errors='ignore').strip()
+        return TrackLoudness(path, error=message or f"デコード失敗: 終了コード {proc.returncode}")
+    return TrackLoudness(path, meter.integrated, meter.peak, meter.histogram())
+
+
+# ------------------------
+# アルバム単位の測定・タグ書き込み
+# ------------------------
+class AlbumLoudness:
+    """アルバム全体の測定結果"""
+
+    def __init__(self, tracks: list[TrackLoudness]):
+        self.tracks = tracks
+        measured = [t for t in tracks if t.ok]
+        self.integrated = histogram_loudness(merge_histograms(t.histogram for t in measured))
+        self.peak = max((t.peak for t in measured), default=0.0)
+
+    @property
+    def gain(self) -> Optional[float]:
+        return None if self.integrated is None else REFERENCE_LOUDNESS - self.integrated
+
+    @property
+    def failed(self) -> list[TrackLoudness]:
+        return [t for t in self.tracks if not t.ok]
+
+
+def format_gain(gain: float) -> str:
+    return f"{gain:+.2f} dB"
+
+
+def format_peak(peak: float) -> str:
+    return f"{peak:.6f}"
+
+
+def replaygain_tags(track: TrackLoudness, album: Optional[AlbumLoudness]) -> dict[str, str]:
+    """書き込むタグ（測定できなかった値は含めない）"""
+    tags: dict[str, str] = {}
+    if track.gain is not None:
+        tags["REPLAYGAIN_TRACK_GAIN"] = format_gain(track.gain)
+        tags["REPLAYGAIN_TRACK_PEAK"] = format_peak(track.peak)
+    if album is not None and album.gain is not None:
+        tags["REPLAYGAIN_ALBUM_GAIN"] = format_gain(album.gain)
+        tags["REPLAYGAIN_ALBUM_PEAK"] = format_peak(album.peak)
+    return tags
+
+
+def write_replaygain_tags(album: AlbumLoudness, stats: Optional[WriteStats] = None) -> WriteStats:
+    """測定できた各 FLAC に REPLAYGAIN_* を書き込む（PADDING の範囲ならその場で書き換え）"""
+    from mutagen.flac import FLAC
+    stats = stats or WriteStats("ReplayGain")
+    for track in album.tracks:
+        tags = replaygain_tags(track, album) if track.ok else {}
+        if not tags:
+            continue
+        try:
+            audio = FLAC(track.path)
+            for key in [k for k in (audio.tags or {}).keys() if k.lower().startswith("replaygain_")]:
+                del audio[key]
+            for key, value in tags.items():
+                audio[key] = value
+            stats.add(save_with_padding(audio))
+        except Exception as e:
+            print(f"[ERROR] ReplayGain タグ書き込み失敗: {track.path}: {e}")
+    stats.print_summary()
+    return stats
+
+
+class ReplayGainScanner:
+    """
+    アルバム内 FLAC の並列測定
+
+    Args:
+        flac_tool: flac.exe のパス（デコードに使う）
+        files: 測定する FLAC のリスト
+        max_workers: 同時測定数（0 / None ならコア数）
+    """
+
+    def __init__(self, flac_tool: str, files: list[str], max_workers: Optional[int] = None):
+        self.flac_tool = flac_tool
+        self.files = list(files)
+        self.max_workers = max_workers or default_worker_count()
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        """未着手のトラックを取りやめる（測定中のトラックは終わるまで待つ）"""
+        self._cancel.set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def run(self, progress_callback: Optional[Callable[[int, int, TrackLoudness], None]] = None) -> Optional[AlbumLoudness]:
+        """
+        全トラックを測定してアルバムの結果を返す（キャンセル時は None）
+
+        Args:
+            progress_callback: 1トラック終わるごとに (完了数, 総数, 結果) で呼ばれる
+        """
+        total = len(self.files)
+        if not total:
+            return AlbumLoudness([])
+        results: list[Optional[TrackLoudness]] = [None] * total
+        workers = max(1, min(self.max_workers, total))
+        print(f"[INFO] ReplayGain 測定開始: {total} トラック (同時測定数={workers})")
+
+        done = 0
+
+        def finish(i: int, result: TrackLoudness):
+            nonlocal done
+            results[i] = result
+            done += 1
+            if result.error:
+                print(f"[ERROR] ReplayGain 測定失敗: {os.path.basename(result.path)}: {result.error}")
+            if progress_callback:
+                progress_callback(done, total, result)
+
+        if workers > 1:
+            import multiprocessing
+            from concurrent.futures.process import BrokenProcessPool
+            # Windows と同じ spawn に揃える（Qt のスレッドを抱えたまま fork しない）
+            context = multiprocessing.get_context("spawn")
+            try:
+                with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                    futures = {pool.submit(measure_flac, self.flac_tool, path): i for i, path in enumerate(self.files)}
+                    for future in as_completed(futures):
+                        if self.is_cancelled():
+                            for f in futures:
+                                f.cancel()
+                            break
+                        i = futures[future]
+                        try:
+                            result = future.result()
+                        except BrokenProcessPool:
+                            raise
+                        except Exception as e:
+                            result = TrackLoudness(self.files[i], error=f"予期しないエラー: {e}")
+                        finish(i, result)
+            except (BrokenProcessPool, OSError, RuntimeError) as e:
+                print(f"[WARN] ReplayGain: プロセスプールを使えないため順に測定します: {e}")
+
+        # 1並列のとき・プールが使えなかったときはこのスレッドで順に測定
+        for i, path in enumerate(self.files):
+            if self.is_cancelled():
+                break
+            if results[i] is None:
+                finish(i, measure_flac(self.flac_tool, path))
+        if self.is_cancelled():
+            return None
+        return AlbumLoudness([r for r in results if r is not None])
+
+
+def scan_album(flac_tool: str, files: list[str], max_workers: Optional[int] = None,
+               write: bool = True) -> Optional[AlbumLoudness]:
+    """測定してタグを書き込む（Qt なしの一括処理用）"""
+    album = ReplayGainScanner(flac_tool, files, max_workers).run()
+    if album is not None and write:
+        write_replaygain_tags(album)
+    return album
+
+
+# ------------------------
+# 精度確認（EBU Tech 3341 の基準信号）
+# ------------------------
+def _sine_segments(sample_rate: int, segments: list[tuple[float, float]], freq: float = 1000.0):
+    """(秒数, dBFS) の区間をつないだステレオ正弦波を 1秒ずつ生成"""
+    phase = 0.0
+    step = 2.0 * math.pi * freq / sample_rate
+    for seconds, level_db in segments:
+        amplitude = 10.0 ** (level_db / 20.0)
+        remaining = int(round(seconds * sample_rate))
+        while remaining > 0:
+            n = min(sample_rate, remaining)
+            chunk = array('d', (amplitude * math.sin(phase + step * i) for i in range(n)))
+            phase = (phase + step * n) % (2.0 * math.pi)
+            remaining -= n
+            yield chunk
+
+
+def _measure_segments(sample_rate: int, segments: list[tuple[float, float]]) -> LoudnessMeter:
+    meter = LoudnessMeter(sample_rate, 2)
+    for chunk in _sine_segments(sample_rate, segments):
+        meter.add([chunk, chunk])
+    return meter
+
+
+# (名前, サンプリング周波数, 区間, 期待値 LUFS)。EBU Tech 3341 Table 1 の 1〜5
+SELFTEST_CASES = [
+    ("EBU 3341 #1 (-23 dBFS)", 48000, [(20.0, -23.0)], -23.0),
+    ("EBU 3341 #2 (-33 dBFS)", 48000, [(20.0, -33.0)], -33.0),
+    ("EBU 3341 #3 (相対ゲート)", 48000, [(10.0, -36.0), (60.0, -23.0), (10.0, -36.0)], -23.0),
+    ("EBU 3341 #4 (絶対ゲート)", 48000, [(10.0, -72.0), (10.0, -36.0), (60.0, -23.0), (10.0, -36.0), (10.0, -72.0)], -23.0),
+    ("EBU 3341 #5 (ゲート外の区間)", 48000, [(20.0, -26.0), (20.1, -20.0), (20.0, -26.0)], -23.0),
+    ("44.1kHz (-23 dBFS)", 44100, [(20.0, -23.0)], -23.0),
+]
+SELFTEST_TOLERANCE = 0.1
+
+
+def _format_lufs(value: Optional[float], digits: int) -> str:
+    """測定値の表示（ゲートで全ブロックが落ちた場合は None）"""
+    return "測定不可" if value is None else f"{value:.{digits}f}"
+
+
+def _selftest() -> bool:
+    ok = True
+    for name, sample_rate, segments, expected in SELFTEST_CASES:
+        meter = _measure_segments(sample_rate, segments)
+        value = meter.integrated
+        passed = value is not None and abs(value - expected) <= SELFTEST_TOLERANCE
+        ok &= passed
+        print(f"[{'OK' if passed else 'NG'}] {name}: {_format_lufs(value, 2)} LUFS (期待値 {expected:.1f} ±{SELFTEST_TOLERANCE})")
+
+    # アルバム: ヒストグラムの合算 ≒ 全トラックをつないで測った値
+    parts = [[(3.0, -20.0)], [(3.0, -30.0)], [(1.0, -45.0), (2.0, -26.0)]]
+    meters = [_measure_segments(48000, seg) for seg in parts]
+    merged = histogram_loudness(merge_histograms(m.histogram() for m in meters))
+    concatenated = gated_loudness([z for m in meters for z in m.blocks])
+    passed = merged is not None and concatenated is not None and abs(merged - concatenated) <= 0.01
+    ok &= passed
+    print(f"[{'OK' if passed else 'NG'}] アルバム合算: ヒストグラム {_format_lufs(merged, 3)} / 連結 {_format_lufs(concatenated, 3)} LUFS")
+    return ok
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description="ReplayGain 2.0 / EBU R128 測定")
+    parser.add_argument("files", nargs="*", help="測定する FLAC")
+    parser.add_argument("--flac", default="flac", help="flac の実行ファイル")
+    parser.add_argument("--workers", type=int, default=0, help="同時測定数（0 ならコア数）")
+    parser.add_argument("--write", action="store_true", help="REPLAYGAIN_* タグを書き込む")
+    parser.add_argument("--selftest", action="store_true", help="基準信号で精度を確認する")
+    args = parser.parse_args(argv)
+
+    if args.selftest:
+        return 0 if _selftest() else 1
+    if not args.files:
+        parser.print_help()
+        return 2
+    album = scan_album(args.flac, args.files, args.workers or None, write=args.write)
+    for track in album.tracks:
+        tags = replaygain_tags(track, None)
+        print(f"{os.path.basename(track.path)}: {track.error or tags}")
+    if album.gain is not None:
+        print(f"Album: {format_gain(album.gain)} / peak {format_peak(album.peak)}")
+    return 0 if not album.failed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
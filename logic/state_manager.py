@@ -3,17 +3,45 @@ state.json の読み書きを管理するモジュール
 """
 import json
 import os
-from typing import Optional, Any
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional, Any
 from datetime import datetime
 
+from .album_model import AlbumState, Track
+
 
 class StateManager:
     """状態管理ファイル (state.json) の読み書きを管理するクラス"""
     
+    # ジャーナルのエントリ数がこれを超えたらスナップショットへ畳み込む
+    JOURNAL_COMPACT_THRESHOLD = 50
+    
     def __init__(self, album_folder: str):
         self.album_folder = album_folder
         self.state_path = os.path.join(album_folder, "state.json")
+        self.journal_path = os.path.join(album_folder, "state.journal")
         self.state = {}
+        
+        # トラック単位の差分ジャーナル（有効時のみ追記）
+        self._journal_enabled = False
+        self._journal_count = 0
+        self._journal_threshold = self.JOURNAL_COMPACT_THRESHOLD
+        self._journal_torn = False
+        
+        # トラック索引付きモデル（get_album() で遅延生成）
+        self._album: Optional[AlbumState] = None
+        
+        # 書き込みの集約用
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._batch_depth = 0
+        self._autoflush_delay_ms: Optional[int] = None
+        self._flush_scheduler: Optional[Callable[[int, Callable[[], None]], Any]] = None
+        # 予約済みの遅延保存を無効にするための世代番号（予約・取り消しのたびに進める）
+        self._flush_generation = 0
     
     def load(self) -> bool:
         """state.json を読み込む"""
@@ -22,22 +50,273 @@ class StateManager:
         
         try:
             with open(self.state_path, 'r', encoding='utf-8') as f:
-                self.state = json.load(f)
-            return True
+                state = json.load(f)
         except Exception as e:
             print(f"[ERROR] state.json 読み込みエラー: {e}")
             return False
+        
+        with self._lock:
+            self._cancel_flush_timer()
+            self.state = state
+            self._album = None
+            self._journal_count = self._replay_journal()
+            self._dirty = False
+        return True
     
     def save(self) -> bool:
-        """state.json を保存する"""
+        """
+        state.json を保存する
+        
+        同じフォルダの一時ファイルに書き出して fsync した後に置き換えるため、
+        書き込み途中で落ちても state.json が壊れることはない。
+        保存に成功したらジャーナルはスナップショットに畳み込まれたものとして削除する。
+        """
+        with self._lock:
+            self._cancel_flush_timer()
+            # 保存しても state 辞書は変わらないので索引はそのまま使う
+            # （差し替えは load()/initialize()、直接の書き換えは mark_dirty() と update_track で作り直す）
+            try:
+                self._write_snapshot()
+                self._dirty = False
+            except Exception as e:
+                print(f"[ERROR] state.json 保存エラー: {e}")
+                return False
+            self._truncate_journal()
+            return True
+    
+    def _write_snapshot(self):
+        """一時ファイル経由で state.json をアトミックに置き換える"""
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=".state.", suffix=".tmp", dir=self.album_folder
+        )
         try:
-            with open(self.state_path, 'w', encoding='utf-8') as f:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
                 json.dump(self.state, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            # Windows では他プロセスが開いている間 replace が失敗するため少しだけ再試行
+            for attempt in range(5):
+                try:
+                    os.replace(tmp_path, self.state_path)
+                    break
+                except PermissionError:
+                    if attempt == 4:
+                        raise
+                    time.sleep(0.05)
+        except Exception:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        
+        # リネーム自体を永続化（POSIX のみ。Windows ではディレクトリを開けない）
+        if os.name != "nt":
+            try:
+                dir_fd = os.open(self.album_folder, os.O_RDONLY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
+            except OSError:
+                pass
+    
+    # ------------------------
+    # ジャーナル
+    # ------------------------
+    def enable_journal(self, compact_threshold: Optional[int] = None):
+        """
+        トランザクション外の update_track をジャーナル追記で永続化する
+        
+        state.json 全体を書き直す代わりに state.journal へ1行追記するだけになり、
+        エントリ数が compact_threshold に達したらスナップショットへ畳み込む。
+        """
+        with self._lock:
+            self._journal_enabled = True
+            if compact_threshold is not None:
+                self._journal_threshold = max(1, compact_threshold)
+    
+    def disable_journal(self) -> bool:
+        """ジャーナルを無効化し、溜まっている分をスナップショットへ畳み込む"""
+        with self._lock:
+            self._journal_enabled = False
+            return self.compact()
+    
+    def compact(self) -> bool:
+        """ジャーナルをスナップショットへ畳み込む"""
+        with self._lock:
+            if self._journal_count == 0 and not self._dirty:
+                return True
+            return self.save()
+    
+    def _append_journal(self, entry: dict) -> bool:
+        """ジャーナルに1行追記（fsync まで行う）"""
+        try:
+            line = json.dumps(entry, ensure_ascii=False) + "\n"
+            if self._journal_torn:
+                # 不完全な末尾行と連結しないよう改行を補う
+                line = "\n" + line
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_count += 1
+            self._journal_torn = False
             return True
         except Exception as e:
-            print(f"[ERROR] state.json 保存エラー: {e}")
+            print(f"[WARN] state.journal 追記エラー（全体保存に切り替え）: {e}")
             return False
     
+    def _replay_journal(self) -> int:
+        """state.journal の差分をメモリ上の state に適用し、適用件数を返す"""
+        self._journal_torn = False
+        if not os.path.exists(self.journal_path):
+            return 0
+        count = 0
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # 追記途中で落ちた行は捨てる
+                        print(f"[WARN] state.journal の不完全な行を無視しました")
+                        self._journal_torn = True
+                        continue
+                    if entry.get("op") == "track":
+                        self._apply_track_updates(entry.get("id"), entry.get("updates") or {})
+                    count += 1
+        except Exception as e:
+            print(f"[WARN] state.journal 読み込みエラー: {e}")
+        return count
+    
+    def _truncate_journal(self):
+        self._journal_count = 0
+        self._journal_torn = False
+        if os.path.exists(self.journal_path):
+            try:
+                os.remove(self.journal_path)
+            except Exception as e:
+                print(f"[WARN] state.journal の削除に失敗: {e}")
+    
+    def flush(self) -> bool:
+        """未保存の変更があれば保存する"""
+        with self._lock:
+            if not self._dirty:
+                return True
+            return self.save()
+    
+    def is_dirty(self) -> bool:
+        """未保存の変更があるか"""
+        return self._dirty
+    
+    def mark_dirty(self) -> bool:
+        """
+        state を直接書き換えた後に呼ぶ
+        
+        トランザクション中・自動保存中は保存を遅延し、それ以外は即保存する。
+        """
+        with self._lock:
+            self._album = None
+        return self._commit()
+    
+    def get_album(self) -> AlbumState:
+        """トラック索引付きのアルバムモデルを取得（state を共有）"""
+        with self._lock:
+            if self._album is None or self._album.is_stale(self.state):
+                self._album = AlbumState.from_dict(self.state)
+            return self._album
+    
+    def get_track(self, track_id: str) -> Optional[Track]:
+        """id でトラックを取得"""
+        return self.get_album().get(track_id)
+    
+    @contextmanager
+    def transaction(self):
+        """
+        複数の変更を1回の書き込みにまとめる
+        
+        with state.transaction():
+            state.update_track(...)
+            state.set_flag(...)
+        
+        ネスト可能で、最も外側のブロックを抜けたときに変更があれば1回だけ保存する。
+        例外で抜けた場合も、それまでの変更は保存する（従来の即時保存と同じ結果）。
+        保存に失敗した場合は is_dirty() が True のまま残る。
+        """
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self.flush()
+    
+    def enable_autoflush(self, scheduler: Callable[[int, Callable[[], None]], Any], delay_ms: int = 500):
+        """
+        トランザクション外の変更を即保存せず、最後の変更から delay_ms 後にまとめて保存する
+        
+        チェックボックス操作など、連続する対話的な編集向け。
+        保存は scheduler(delay_ms, callback) で予約する。state を書き換えるスレッドと
+        同じスレッドで callback を呼ぶもの（GUI なら QTimer.singleShot）を渡すこと。
+        別スレッドで保存すると、GUI スレッドが track dict を直接書き換えている最中に
+        json.dump が走ってしまう。
+        """
+        with self._lock:
+            self._autoflush_delay_ms = max(0, delay_ms)
+            self._flush_scheduler = scheduler
+    
+    def disable_autoflush(self) -> bool:
+        """自動保存を解除し、保留中の変更を保存する"""
+        with self._lock:
+            self._autoflush_delay_ms = None
+            self._flush_scheduler = None
+            self._cancel_flush_timer()
+            return self.flush()
+    
+    def is_autoflush_enabled(self) -> bool:
+        return self._autoflush_delay_ms is not None
+    
+    def _commit(self, journal_entry: Optional[dict] = None) -> bool:
+        """変更を記録し、必要なら保存する（各 setter から呼ぶ）"""
+        with self._lock:
+            if self._batch_depth > 0:
+                self._dirty = True
+                return True
+            if journal_entry is not None and self._journal_enabled:
+                if self._append_journal(journal_entry):
+                    if self._journal_count >= self._journal_threshold:
+                        return self.save()
+                    return True
+            self._dirty = True
+            if self._autoflush_delay_ms is not None:
+                self._schedule_flush()
+                return True
+            return self.save()
+    
+    def _schedule_flush(self):
+        # 予約済みのものは取り消せないことがあるので、世代番号で古い予約を無視させる
+        self._flush_generation += 1
+        generation = self._flush_generation
+        self._flush_scheduler(self._autoflush_delay_ms, lambda: self._on_flush_timer(generation))
+    
+    def _cancel_flush_timer(self):
+        self._flush_generation += 1
+    
+    def _on_flush_timer(self, generation: int):
+        with self._lock:
+            if generation != self._flush_generation:
+                return
+            # トランザクション中なら終了時に保存されるので何もしない
+            if self._batch_depth > 0:
+                return
+            self.flush()
+    
     def initialize(self, album_name: str, artist_name: str, flac_files: list[str]) -> bool:
         """新規アルバムの state.json を初期化"""
         self.state = {
@@ -70,7 +349,8 @@ class StateManager:
             },
             "lastError": None
         }
-        return self.save()
+        self._album = None
+        return self._commit()
     
     def get_current_step(self) -> int:
         """現在のステップ番号を取得"""
@@ -78,8 +358,9 @@ class StateManager:
     
     def set_current_step(self, step: int) -> bool:
         """現在のステップ番号を設定"""
-        self.state["currentStep"] = step
-        return self.save()
+        with self._lock:
+            self.state["currentStep"] = step
+        return self._commit()
     
     def get_status(self) -> str:
         """現在のステータスを取得"""
@@ -87,8 +368,9 @@ class StateManager:
     
     def set_status(self, status: str) -> bool:
         """ステータスを設定"""
-        self.state["status"] = status
-        return self.save()
+        with self._lock:
+            self.state["status"] = status
+        return self._commit()
     
     def get_tracks(self) -> list[dict]:
         """トラック情報を取得"""
@@ -96,12 +378,13 @@ class StateManager:
     
     def update_track(self, track_id: str, updates: dict) -> bool:
         """特定のトラック情報を更新"""
-        tracks = self.state.get("tracks", [])
-        for track in tracks:
-            if track.get("id") == track_id:
-                track.update(updates)
-                return self.save()
-        return False
+        with self._lock:
+            if not self._apply_track_updates(track_id, updates):
+                return False
+            return self._commit({"op": "track", "id": track_id, "updates": updates})
+    
+    def _apply_track_updates(self, track_id: str, updates: dict) -> bool:
+        return self.get_album().update_track(track_id, updates) is not None
     
     def get_album_name(self) -> str:
         """アルバム名を取得"""
@@ -113,20 +396,22 @@ class StateManager:
     
     def set_error(self, step: int, message: str) -> bool:
         """エラー情報を記録"""
-        self.state["lastError"] = {
-            "step": step,
-            "message": message,
-            "timestamp": datetime.now().isoformat()
-        }
-        self.state["status"] = "ERROR"
-        return self.save()
+        with self._lock:
+            self.state["lastError"] = {
+                "step": step,
+                "message": message,
+                "timestamp": datetime.now().isoformat()
+            }
+            self.state["status"] = "ERROR"
+        return self._commit()
     
     def clear_error(self) -> bool:
         """エラー情報をクリア"""
-        self.state["lastError"] = None
-        if self.state.get("status") == "ERROR":
-            self.state["status"] = "WAITING_USER"
-        return self.save()
+        with self._lock:
+            self.state["lastError"] = None
+            if self.state.get("status") == "ERROR":
+                self.state["status"] = "WAITING_USER"
+        return self._commit()
     
     def get_path(self, key: str) -> str:
         """パス情報を取得"""
@@ -134,10 +419,9 @@ class StateManager:
     
     def set_path(self, key: str, value: str) -> bool:
         """パス情報を設定"""
-        if "paths" not in self.state:
-            self.state["paths"] = {}
-        self.state["paths"][key] = value
-        return self.save()
+        with self._lock:
+            self.state.setdefault("paths", {})[key] = value
+        return self._commit()
     
     def get_flag(self, key: str) -> Any:
         """フラグを取得"""
@@ -145,10 +429,9 @@ class StateManager:
     
     def set_flag(self, key: str, value: Any) -> bool:
         """フラグを設定"""
-        if "flags" not in self.state:
-            self.state["flags"] = {}
-        self.state["flags"][key] = value
-        return self.save()
+        with self._lock:
+            self.state.setdefault("flags", {})[key] = value
+        return self._commit()
     
     def has_artwork(self) -> Optional[bool]:
         """アートワークの有無を取得"""
@@ -156,12 +439,26 @@ class StateManager:
     
     def set_artwork(self, has_artwork: bool) -> bool:
         """アートワークの有無を設定"""
-        self.state["hasArtwork"] = has_artwork
-        return self.save()
+        with self._lock:
+            self.state["hasArtwork"] = has_artwork
+        return self._commit()
+    
+    def get_artwork_params(self) -> dict:
+        """アートワーク最適化で選ばれたパラメータを取得"""
+        return self.state.get("artworkParams") or {}
+    
+    def set_artwork_params(self, params: dict) -> bool:
+        """アートワーク最適化で選ばれたパラメータ（幅・容量予算・出力ごとの品質とサイズ）を記録"""
+        with self._lock:
+            self.state["artworkParams"] = params
+        return self._commit()
+    
+    def is_step_completed(self, step_key: str) -> bool:
+        """ステップ完了フラグを取得"""
+        return bool(self.state.get("completedSteps", {}).get(step_key))
     
     def mark_step_completed(self, step_key: str) -> bool:
         """ステップ完了フラグを設定"""
-        if "completedSteps" not in self.state:
-            self.state["completedSteps"] = {}
-        self.state["completedSteps"][step_key] = True
-        return self.save()
+        with self._lock:
+            self.state.setdefault("completedSteps", {})[step_key] = True
+        return self._commit()
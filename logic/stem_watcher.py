@@ -0,0 +1,167 @@
+"""
+Demucs 出力フォルダの監視（分離し終わった曲から順に取り込むため）
+
+QFileSystemWatcher で出力フォルダ（サブフォルダを含む）を監視し、
+no_vocals.wav / minus_vocals.flac が現れたら書き込みが終わるのを待って stem_ready を出す。
+書き込み中のファイルを掴まないよう、サイズと更新時刻が STABLE_CHECKS 回続けて変わらず、
+WAV はヘッダーの RIFF サイズがファイルサイズと一致した（＝閉じられた）ものだけを完了とみなす。
+書き込み中はフォルダの変更通知が来ないため、候補がある間は短い間隔で stat を取り直す。
+NAS 等で通知が届かない環境向けに低頻度の定期走査も併用する（AlbumIndex と同じ）。
+"""
+import os
+import struct
+from typing import Iterable, Optional
+from PySide6.QtCore import QObject, QTimer, QFileSystemWatcher, Signal
+
+from .demucs_detector import InstrumentalScanCache
+
+
+def is_stem_complete(path: str) -> bool:
+    """書き込みが閉じられたように見えるか（WAV はヘッダーのサイズ、FLAC は先頭の fLaC を確認）"""
+    try:
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            head = f.read(12)
+    except OSError:
+        return False
+    if path.lower().endswith('.wav'):
+        if len(head) < 12 or head[:4] != b"RIFF" or head[8:12] != b"WAVE":
+            return False
+        riff_size = struct.unpack("<I", head[4:8])[0]
+        # 書き込み途中のヘッダーは 0 / 仮の値のまま。4GB を超える WAV はサイズを確認できない
+        return riff_size + 8 == size or (riff_size == 0xFFFFFFFF and size > 0xFFFFFFFF)
+    return head[:4] == b"fLaC"
+
+
+class StemWatcher(QObject):
+    """
+    Demucs 出力フォルダを監視し、書き込みが終わったインスト音源を1件ずつ通知する
+
+    Args:
+        root: 監視するフォルダ（存在しない場合は作成されるまで定期走査で待つ）
+        ignore_dirs: 監視しないフォルダ名（demucs_ignore など）
+    """
+
+    stem_ready = Signal(str, str)  # song_name（曲フォルダ名）, inst_file
+
+    # 監視イベントをまとめて処理するまでの待ち時間（ミリ秒）
+    DEBOUNCE_MS = 200
+    # 書き込み中の候補を確認し直す間隔（ミリ秒）
+    STABLE_INTERVAL_MS = 1000
+    # サイズ・更新時刻が何回続けて同じなら完了とみなすか
+    STABLE_CHECKS = 2
+    # 監視が効かない環境向けのフォールバック走査間隔（ミリ秒）
+    FALLBACK_INTERVAL_MS = 5000
+
+    def __init__(self, root: str, ignore_dirs: Iterable[str] = (), parent=None):
+        super().__init__(parent)
+        self.root = os.path.abspath(root)
+        self.ignore_dirs = {d.lower() for d in ignore_dirs}
+        # 候補: path -> ((size, mtime), 同じ値が続いた回数)
+        self._candidates: dict[str, tuple[tuple[int, float], int]] = {}
+        self._reported: set[str] = set()
+        # 定期走査でも変化の無いフォルダは一覧を取り直さない
+        self._scan_cache = InstrumentalScanCache()
+
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self._on_directory_changed)
+
+        self._debounce = QTimer(self)
+        self._debounce.setSingleShot(True)
+        self._debounce.setInterval(self.DEBOUNCE_MS)
+        self._debounce.timeout.connect(self.scan)
+
+        self._stable_timer = QTimer(self)
+        self._stable_timer.setInterval(self.STABLE_INTERVAL_MS)
+        self._stable_timer.timeout.connect(self._check_candidates)
+
+        self._fallback = QTimer(self)
+        self._fallback.setInterval(self.FALLBACK_INTERVAL_MS)
+        self._fallback.timeout.connect(self.scan)
+
+    # ------------------------
+    # public
+    # ------------------------
+    def start(self):
+        """監視を開始する（既に完成しているファイルも通知する）"""
+        print(f"[INFO] Demucs 出力の監視を開始: {self.root}")
+        self.scan()
+        self._fallback.start()
+
+    def stop(self):
+        """監視を停止"""
+        self._fallback.stop()
+        self._debounce.stop()
+        self._stable_timer.stop()
+        paths = self._watcher.directories() + self._watcher.files()
+        if paths:
+            self._watcher.removePaths(paths)
+        self._candidates.clear()
+
+    def is_pending(self) -> bool:
+        """書き込み中の候補があるか"""
+        return bool(self._candidates)
+
+    def scan(self):
+        """フォルダを走査し、新しいサブフォルダを監視対象に加え、インスト音源を候補にする"""
+        if not os.path.isdir(self.root):
+            return
+        watched = set(self._watcher.directories())
+        new_dirs = []
+        for folder, stems in self._walk(self.root):
+            if folder not in watched:
+                new_dirs.append(folder)
+            for path in stems:
+                if path not in self._reported and path not in self._candidates:
+                    self._candidates[path] = ((-1, 0.0), 0)
+        if new_dirs:
+            self._watcher.addPaths(new_dirs)
+        self._check_candidates()
+
+    # ------------------------
+    # internal
+    # ------------------------
+    def _walk(self, root: str):
+        """(フォルダ, [インスト音源のパス]) を返す（ignore_dirs は潜らない）"""
+        stack = [root]
+        while stack:
+            folder = stack.pop()
+            listing = self._scan_cache.listing(folder)
+            if listing is None:
+                continue
+            stack.extend(os.path.join(folder, name) for name in listing.subdirs
+                         if name.lower() not in self.ignore_dirs)
+            yield folder, [os.path.join(folder, name) for name in listing.stems]
+
+    def _on_directory_changed(self, _path: str):
+        self._debounce.start()
+
+    def _check_candidates(self):
+        for path, (last, count) in list(self._candidates.items()):
+            current = self._stat(path)
+            if current is None:
+                # 一時ファイルからのリネーム等で消えた
+                del self._candidates[path]
+                continue
+            count = count + 1 if current == last else 0
+            if count >= self.STABLE_CHECKS and is_stem_complete(path):
+                del self._candidates[path]
+                self._reported.add(path)
+                song_name = os.path.basename(os.path.dirname(path))
+                print(f"[INFO] Demucs 出力を検出: {song_name}")
+                self.stem_ready.emit(song_name, path)
+            else:
+                self._candidates[path] = (current, count)
+
+        if self._candidates and not self._stable_timer.isActive():
+            self._stable_timer.start()
+        elif not self._candidates:
+            self._stable_timer.stop()
+
+    @staticmethod
+    def _stat(path: str) -> Optional[tuple[int, float]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime
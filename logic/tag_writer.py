@@ -0,0 +1,234 @@
+"""
+PADDING を意識したタグ書き込み（FLAC / MP4 / Ogg Opus）
+
+mutagen の save() は既定ではパディングを詰め直すことがあり、カバー追加などで
+ファイル全体（音声データ）の書き直しが起きる。NAS 上ではこれが全データの再転送になる。
+
+ここでは mutagen の padding コールバックで必要量を測り、
+    - 既存の空き（FLAC PADDING / MP4 free アトム / Ogg のコメントページ）に収まる → そのまま使う（その場で書き換え）
+    - 収まらない → 次回以降のために reserve バイトの空きを確保して書き直す
+とし、実際に書き直しが起きたかを WriteReport で返す。
+"""
+import os
+from typing import Optional
+
+
+# 書き直しが必要になったときに確保する空き（タグ編集・カバー差し替えを次回その場で収める）
+DEFAULT_RESERVE = 128 * 1024
+
+
+class WriteReport:
+    """1ファイル分の書き込み結果"""
+
+    __slots__ = ("path", "ok", "rewritten", "available", "padding", "error")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.ok = False
+        # 音声データの移動（ファイル全体の書き直し）が起きたか
+        self.rewritten = False
+        # 書き込み前に計算された「その場で書いた場合の残り空き」（負なら不足）
+        self.available: Optional[int] = None
+        # 実際に確保した空き
+        self.padding: Optional[int] = None
+        self.error = ""
+
+    def __repr__(self) -> str:
+        state = "rewrite" if self.rewritten else "in-place"
+        return f"WriteReport({os.path.basename(self.path)!r}, ok={self.ok}, {state}, padding={self.padding})"
+
+
+def padding_policy(reserve: int = DEFAULT_RESERVE):
+    """
+    mutagen の padding コールバックを作る
+
+    空きが足りていればその量を維持（＝その場で書き換え）、足りなければ reserve を確保する。
+    """
+    def policy(info) -> int:
+        if info.padding >= 0:
+            return info.padding
+        return max(reserve, 0)
+    return policy
+
+
+def save_with_padding(audio, reserve: int = DEFAULT_RESERVE, **kwargs) -> WriteReport:
+    """
+    mutagen のファイルオブジェクト（FLAC / MP4 / OggOpus など）を空きを再利用して保存する
+
+    Args:
+        audio: 読み込み済みの mutagen ファイルオブジェクト
+        reserve: 書き直しが必要な場合に確保する空き（バイト）
+        kwargs: save() にそのまま渡す追加引数
+
+    Returns:
+        WriteReport（例外は投げず error に格納）
+    """
+    path = getattr(audio, "filename", "") or ""
+    report = WriteReport(path)
+    base_policy = padding_policy(reserve)
+
+    def policy(info) -> int:
+        chosen = base_policy(info)
+        report.available = info.padding
+        report.padding = chosen
+        return chosen
+
+    try:
+        size_before = os.path.getsize(path) if path else None
+        audio.save(padding=policy, **kwargs)
+        size_after = os.path.getsize(path) if path else None
+        report.rewritten = (
+            (report.available is not None and report.padding != report.available)
+            or (size_before is not None and size_before != size_after)
+        )
+        report.ok = True
+    except Exception as e:
+        report.error = str(e)
+    return report
+
+
+class WriteStats:
+    """一括書き込みの集計（その場 / 書き直し / 失敗）"""
+
+    def __init__(self, label: str = "タグ書き込み"):
+        self.label = label
+        self.in_place = 0
+        self.rewritten: list[str] = []
+        self.failed: list[tuple[str, str]] = []
+
+    def add(self, report: WriteReport) -> WriteReport:
+        if not report.ok:
+            self.failed.append((report.path, report.error))
+        elif report.rewritten:
+            self.rewritten.append(report.path)
+            print(f"[INFO] {self.label}: 空きが足りないため書き直しました: {os.path.basename(report.path)}")
+        else:
+            self.in_place += 1
+        return report
+
+    @property
+    def total(self) -> int:
+        return self.in_place + len(self.rewritten) + len(self.failed)
+
+    def summary(self) -> str:
+        return (f"{self.label}: {self.total} 件（その場で書き換え {self.in_place} / "
+                f"全体書き直し {len(self.rewritten)} / 失敗 {len(self.failed)}）")
+
+    def print_summary(self):
+        if self.total:
+            print(f"[INFO] {self.summary()}")
+
+
+# FLAC（Vorbis コメント）→ MP4 アトムの対応（それ以外は iTunes の freeform に入れる）
+MP4_TEXT_ATOMS = {
+    "title": "\xa9nam",
+    "artist": "\xa9ART",
+    "album": "\xa9alb",
+    "albumartist": "aART",
+    "date": "\xa9day",
+    "genre": "\xa9gen",
+    "composer": "\xa9wrt",
+    "comment": "\xa9cmt",
+    "lyrics": "\xa9lyr",
+    "grouping": "\xa9grp",
+}
+MP4_FREEFORM_PREFIX = "----:com.apple.iTunes:"
+
+
+def _number_pair(tags: dict, number_key: str, total_keys: tuple[str, ...]) -> Optional[tuple[int, int]]:
+    """"3" / "3/12" と別キーの総数から (番号, 総数) を作る"""
+    raw = (tags.get(number_key) or [""])[0]
+    number, _, total = raw.partition("/")
+    if not total:
+        total = next((tags[k][0] for k in total_keys if tags.get(k)), "")
+    try:
+        n = int(number.strip() or 0)
+    except ValueError:
+        return None
+    try:
+        t = int(str(total).strip() or 0)
+    except ValueError:
+        t = 0
+    return (n, t) if n or t else None
+
+
+def _front_cover(source_flac: str, header):
+    """表紙（無ければ先頭）の画像を mutagen の Picture にする"""
+    from mutagen.flac import Picture
+    from .flac_metadata import read_picture_data
+    pictures = [p for p in header.pictures if p.mime != "-->"]
+    if not pictures:
+        return None
+    info = next((p for p in pictures if p.type == 3), pictures[0])
+    pic = Picture()
+    pic.type = info.type
+    pic.mime = info.mime
+    pic.desc = info.description
+    pic.width = info.width
+    pic.height = info.height
+    pic.depth = info.depth
+    pic.colors = info.colors
+    pic.data = read_picture_data(source_flac, info)
+    return pic
+
+
+def copy_flac_tags(source_flac: str, dest_path: str, include_cover: bool = True,
+                   reserve: int = DEFAULT_RESERVE) -> WriteReport:
+    """
+    FLAC のタグ（と表紙）で MP4 / Ogg（Opus・Vorbis）のタグを置き換える
+
+    既存のタグは消してから書くので、結果は FLAC から新しく変換した場合と同じになる。
+    FLAC に画像が無ければ出力の画像も消す。
+
+    Returns:
+        WriteReport（例外は投げず error に格納）
+    """
+    import base64
+    import mutagen
+    from .flac_metadata import read_flac_header
+
+    report = WriteReport(dest_path)
+    try:
+        header = read_flac_header(source_flac, read_pictures=include_cover)
+        cover = _front_cover(source_flac, header) if include_cover else None
+        dest = mutagen.File(dest_path)
+        if dest is None:
+            raise ValueError(f"対応していない形式です: {dest_path}")
+        if dest.tags is None:
+            dest.add_tags()
+        tags = header.tags
+
+        from mutagen.mp4 import MP4, MP4Cover, MP4FreeForm
+        if isinstance(dest, MP4):
+            dest.tags.clear()
+            for key, values in tags.items():
+                if key in MP4_TEXT_ATOMS:
+                    dest.tags[MP4_TEXT_ATOMS[key]] = list(values)
+                elif key in ("tracknumber", "tracktotal", "totaltracks", "discnumber", "disctotal", "totaldiscs"):
+                    continue
+                elif key == "compilation":
+                    dest.tags["cpil"] = (values[0].strip() not in ("", "0"))
+                else:
+                    dest.tags[MP4_FREEFORM_PREFIX + key.upper()] = [
+                        MP4FreeForm(v.encode("utf-8")) for v in values
+                    ]
+            trkn = _number_pair(tags, "tracknumber", ("tracktotal", "totaltracks"))
+            if trkn:
+                dest.tags["trkn"] = [trkn]
+            disk = _number_pair(tags, "discnumber", ("disctotal", "totaldiscs"))
+            if disk:
+                dest.tags["disk"] = [disk]
+            if cover is not None:
+                fmt = MP4Cover.FORMAT_PNG if cover.mime == "image/png" else MP4Cover.FORMAT_JPEG
+                dest.tags["covr"] = [MP4Cover(cover.data, imageformat=fmt)]
+        else:
+            # Ogg は FLAC と同じ Vorbis コメント
+            dest.tags.clear()
+            for key, values in tags.items():
+                dest.tags[key] = list(values)
+            if cover is not None:
+                dest.tags["metadata_block_picture"] = [base64.b64encode(cover.write()).decode("ascii")]
+        return save_with_padding(dest, reserve=reserve)
+    except Exception as e:
+        report.error = str(e)
+        return report
@@ -0,0 +1,581 @@
+"""
+Step 3 のトラック紐づけエンジン（Qt 非依存）
+
+state.json のトラック（originalFile）と、タグ付け・リネーム後の実ファイルを紐づける。
+ファイル一覧からベース名・トラック番号・正規化タイトルの索引を一度だけ作り、
+類似タイトル検索は文字索引で候補を絞ってから difflib で採点する。
+
+紐づけ戦略（優先順）:
+    tracknum -> title-exact -> title-no-ver-unique -> fuzzy（番号なしのみ）
+    -> basename -> currentFile -> currentFile-direct -> not-found
+インストパートナー:
+    完全一致（new_file / originalFile のタイトル）-> fuzzy -> 既存の instrumentalFile / currentInstFile
+
+使い方:
+    matcher = TrackMatcher(files, final_name=..., base_dir=...)
+    result = matcher.apply(album)   # album: AlbumState
+    for row in result.rows: ...     # 表示用の行
+
+ベンチマーク:
+    python -m logic.track_matcher --bench 200
+"""
+import difflib
+import heapq
+import os
+import re
+import time
+from collections import Counter
+from typing import Callable, Iterable, Optional
+
+from .album_model import AlbumState
+from .keyword_engine import get_keyword_engine
+
+
+# 類似タイトルとして採用する最低類似度
+FUZZY_THRESHOLD = 0.4
+
+_RE_LEADING_NUM_SEP = re.compile(r"^(\d{1,3})\s*[-．\. ]?\s*")
+_RE_LEADING_NUM = re.compile(r"^(\d{1,3})")
+_RE_EXT = re.compile(r"\.[^.]+$")
+_RE_INST_PAREN = re.compile(r"\s*\((?i:inst|off\s*vocal|instrumental|stemroller)\)\s*")
+_RE_VERSION_PAREN = re.compile(r"\s*\((?i:m@ster\s*version|game\s*version|original\s*version|オリジナル[・・]カラオケ|カラオケ)\)\s*")
+_RE_TRAILING_PARENS = re.compile(r"\s*(\([^)]*\)\s*)+$")
+_RE_FINAL_NUM = re.compile(r"^(?:Disc \d+-)?(\d{2,3})\s+(.+)$")
+
+
+def is_instrumental_name(lower_name: str) -> bool:
+    """ファイル名だけで簡易判定（小文字を渡す）"""
+    return get_keyword_engine().is_instrumental_name(lower_name)
+
+
+def norm_title(name: str, remove_version_info: bool = False) -> str:
+    """
+    ファイル名を正規化してマッチングに使用
+    remove_version_info: Trueの場合はバージョン情報も削除（インスト検索用）
+    """
+    base = os.path.basename(name)
+    base = _RE_EXT.sub("", base)                 # 拡張子除去
+    base = _RE_LEADING_NUM_SEP.sub("", base)     # 先頭番号除去
+    # インスト関連の括弧を除去
+    base = _RE_INST_PAREN.sub("", base)
+
+    if remove_version_info:
+        # バージョン情報も削除（M@STER VERSION, GAME VERSION, オリジナル・カラオケなど）
+        base = _RE_VERSION_PAREN.sub("", base)
+        # その他の末尾括弧も削除
+        base = _RE_TRAILING_PARENS.sub("", base)
+
+    return base.strip().lower()
+
+
+def track_number_from_name(name: str) -> Optional[int]:
+    """ファイル名先頭のトラック番号"""
+    m = _RE_LEADING_NUM.match(os.path.basename(name))
+    return int(m.group(1)) if m else None
+
+
+class NgramIndex:
+    """
+    類似タイトル検索用の文字 n-gram 索引（n=1）
+
+    difflib の一致文字数は両文字列の文字多重集合の共通部分を超えないため、
+    共通部分から ratio の上限を求め、閾値や暫定最良値に届かない候補は採点しない。
+    結果は全件を SequenceMatcher で比較した場合と同じ（同率なら先に登録した方）。
+    """
+
+    def __init__(self, items: Iterable[tuple[str, str]]):
+        self.keys: list[str] = []
+        self.values: list[str] = []
+        self._postings: dict[str, list[tuple[int, int]]] = {}
+        self._empty: list[int] = []
+        # 実際に SequenceMatcher で採点した回数（ベンチマーク用）
+        self.scored = 0
+        for key, value in items:
+            pos = len(self.keys)
+            self.keys.append(key)
+            self.values.append(value)
+            if not key:
+                self._empty.append(pos)
+            for ch, count in Counter(key).items():
+                self._postings.setdefault(ch, []).append((pos, count))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def best(self, query: str, threshold: float = FUZZY_THRESHOLD,
+             accept: Optional[Callable[[str], bool]] = None) -> tuple[Optional[str], float]:
+        """
+        query との類似度が最大（かつ threshold 以上）の値を返す
+
+        Args:
+            accept: 値を候補にしてよいか（False の値は飛ばす）
+
+        Returns:
+            (値 / 無ければ None, 類似度)
+        """
+        overlap: dict[int, int] = {}
+        if query:
+            for ch, q_count in Counter(query).items():
+                for pos, count in self._postings.get(ch, ()):
+                    overlap[pos] = overlap.get(pos, 0) + min(q_count, count)
+        else:
+            # 空同士は ratio=1.0
+            overlap = {pos: 0 for pos in self._empty}
+
+        q_len = len(query)
+        heap = []
+        for pos, common in overlap.items():
+            total = q_len + len(self.keys[pos])
+            bound = (2.0 * common / total) if total else 1.0
+            if bound >= threshold:
+                heap.append((-bound, pos))
+        heapq.heapify(heap)
+
+        matcher = difflib.SequenceMatcher(None)
+        matcher.set_seq2(query)
+        best_pos = None
+        best_ratio = 0
+        while heap:
+            neg_bound, pos = heapq.heappop(heap)
+            if -neg_bound < best_ratio:
+                break
+            value = self.values[pos]
+            if accept is not None and not accept(value):
+                continue
+            matcher.set_seq1(self.keys[pos])
+            ratio = matcher.ratio()
+            self.scored += 1
+            if ratio < threshold:
+                continue
+            if ratio > best_ratio or (ratio == best_ratio and best_pos is not None and pos < best_pos):
+                best_ratio = ratio
+                best_pos = pos
+        if best_pos is None:
+            return None, 0
+        return self.values[best_pos], best_ratio
+
+
+class MatchRow:
+    """表示用の1行（kind: normal / inst_only / with_inst / not_found）"""
+
+    __slots__ = ("kind", "original", "final", "inst")
+
+    def __init__(self, kind: str, original: str, final: str = "", inst: str = ""):
+        self.kind = kind
+        self.original = original
+        self.final = final
+        self.inst = inst
+
+    def __repr__(self) -> str:
+        return f"MatchRow({self.kind!r}, {self.original!r}, {self.final!r}, {self.inst!r})"
+
+
+class MatchResult:
+    """紐づけ結果"""
+
+    def __init__(self):
+        self.rows: list[MatchRow] = []
+        self.processed_files: set[str] = set()
+        self.assigned_vocal_files: set[str] = set()
+        self.added_tracks: list[dict] = []
+
+
+class TrackMatcher:
+    """
+    トラックと実ファイルの紐づけ
+
+    Args:
+        files: base_dir からの相対パス（'/' 区切り）のリスト
+        is_instrumental_name: 小文字のファイル名を受け取りインストか判定する関数
+        final_name: 相対パスから最終ファイル名を生成する関数（タグ読み取り）
+        base_dir: currentFile-direct 戦略で存在確認に使うフォルダ
+    """
+
+    def __init__(self, files: Iterable[str],
+                 is_instrumental_name: Callable[[str], bool] = is_instrumental_name,
+                 final_name: Optional[Callable[[str], str]] = None,
+                 base_dir: str = ""):
+        self.files = sorted(files)
+        self._is_inst_name = is_instrumental_name
+        self._final_name = final_name or (lambda f: os.path.basename(f))
+        self.base_dir = base_dir
+        self._build_indexes()
+
+    # ------------------------
+    # 索引
+    # ------------------------
+    def is_inst(self, name: str) -> bool:
+        flag = self._inst_flags.get(name)
+        if flag is None:
+            flag = self._is_inst_name(name.lower())
+        return flag
+
+    def _build_indexes(self):
+        self._inst_flags: dict[str, bool] = {f: self._is_inst_name(f.lower()) for f in self.files}
+
+        # ベース名 -> 先頭のファイル
+        self.by_basename: dict[str, str] = {}
+        for f in self.files:
+            self.by_basename.setdefault(os.path.basename(f), f)
+
+        # 1) 先頭のトラック番号で紐づけ辞書を作る (最優先)
+        #    同じトラック番号で「(Inst)」と通常版が両方ある場合は通常版を優先
+        self.by_tracknum: dict[int, str] = {}
+        for f in self.files:
+            m = _RE_LEADING_NUM_SEP.match(os.path.basename(f))
+            if m:
+                idx = int(m.group(1))
+                self.by_tracknum[idx] = self._prefer_normal(self.by_tracknum.get(idx), f)
+
+        # 2) トラック番号が無い/重複時のフォールバック: タイトル正規化での一致
+        self.by_title: dict[str, str] = {}
+        self.by_title_inst: dict[str, str] = {}
+        self.by_title_no_ver_vocal: dict[str, list[str]] = {}
+        # 元曲ファイル名からトラック番号なしのタイトルへのマッピング
+        # 例: "02-虹.flac" -> "虹"
+        self.original_to_title_map: dict[str, str] = {}
+
+        for f in self.files:
+            # 通常マッチング: バージョン情報を保持
+            key = norm_title(f, remove_version_info=False)
+            self.by_title[key] = self._prefer_normal(self.by_title.get(key), f)
+
+            key_no_ver = norm_title(f, remove_version_info=True)
+            if not self.is_inst(f):
+                self.by_title_no_ver_vocal.setdefault(key_no_ver, []).append(f)
+                self.original_to_title_map[key_no_ver] = f
+                continue
+
+            # Inst専用マップ: バージョン情報を削除して広くマッチング
+            if key_no_ver not in self.by_title_inst:
+                self.by_title_inst[key_no_ver] = f
+                print(f"[DEBUG] Instマップに追加: '{key_no_ver}' -> '{f}'")
+            else:
+                # 既存のファイルと比較して、より適切な方を選択
+                existing = self.by_title_inst[key_no_ver]
+                # "02-虹 (Inst).flac" よりも "2 虹 (Instrumental) (StemRoller).flac" を優先
+                # 判定: より長いファイル名、または (StemRoller) を含む方を優先
+                if "(StemRoller)" in f or len(f) > len(existing):
+                    self.by_title_inst[key_no_ver] = f
+                    print(f"[DEBUG] Instマップを更新: '{key_no_ver}' -> '{f}' (旧: '{existing}')")
+
+        self.title_index = NgramIndex(self.by_title.items())
+        self.title_inst_index = NgramIndex(self.by_title_inst.items())
+
+    def _prefer_normal(self, existing: Optional[str], candidate: str) -> str:
+        # 既存が通常版なら維持、候補が通常版なら置換、どちらもInstなら候補で上書き
+        if not existing:
+            return candidate
+        if not self.is_inst(os.path.basename(existing)):
+            return existing  # 既に通常版を採用済み
+        return candidate
+
+    def find_by_basename(self, filename: str) -> Optional[str]:
+        """ベース名だけで一致するファイル"""
+        return self.by_basename.get(os.path.basename(filename)) if filename else None
+
+    # ------------------------
+    # 紐づけ
+    # ------------------------
+    def apply(self, album: AlbumState) -> MatchResult:
+        """
+        アルバムの各トラックを紐づけ、track dict を更新する
+
+        未処理のインストファイルは新規トラックとして album に追加し、
+        独立インストトラックの finalFile はボーカル曲の後ろへ再採番する。
+        """
+        result = MatchResult()
+        tracks = [t.data for t in album.tracks]
+        print(f"[DEBUG][Step3] state tracks 読込: track_count={len(tracks)}")
+
+        for i, track in enumerate(tracks):
+            self._match_track(i, track, result)
+
+        # track dict を直接更新したので索引を作り直す
+        album.reindex()
+
+        # 未処理のインストファイル（state.jsonに存在しない新規Demucs生成ファイル）を独立トラックとして追加
+        for flac_file in self.files:
+            if flac_file not in result.processed_files and self.is_inst(flac_file):
+                final_filename = self._final_name(flac_file)
+                new_track = {
+                    "id": album.next_track_id(),
+                    "originalFile": flac_file,
+                    "finalFile": final_filename,
+                    "currentFile": flac_file,
+                    "demucsTarget": False,
+                    "isInstrumental": True,
+                    "hasInstrumental": False
+                }
+                album.add_track(new_track)
+                result.added_tracks.append(new_track)
+                result.processed_files.add(flac_file)
+                result.rows.append(MatchRow("inst_only", flac_file, final_filename))
+                print(f"[DEBUG][Step3][INST] 未処理の新規インストトラックを追加: {flac_file} -> {final_filename}")
+
+        self._renumber_independent_inst([t.data for t in album.tracks])
+
+        print(f"[DEBUG][Step3] update_file_mapping 完了: assigned_vocal={len(result.assigned_vocal_files)}, processed_files={len(result.processed_files)}, final_tracks={len(album)}")
+        return result
+
+    def _is_vocal_candidate_available(self, track: dict, candidate: Optional[str], assigned: set[str]) -> bool:
+        if not candidate:
+            return False
+        if self.is_inst(candidate):
+            return False
+        if candidate in assigned:
+            current = track.get("currentFile", "")
+            return bool(current and os.path.basename(current) == os.path.basename(candidate))
+        return True
+
+    def _match_vocal(self, track: dict, original_file: str, orig_norm: str, orig_norm_no_ver: str,
+                     original_track_num: Optional[int], assigned: set[str]) -> Optional[str]:
+        available = lambda f: self._is_vocal_candidate_available(track, f, assigned)
+
+        # 先頭番号でマッチ（ボーカル入りトラック用）
+        new_file = None
+        m = _RE_LEADING_NUM.match(original_file)
+        if m:
+            idx = int(m.group(1))
+            candidate = self.by_tracknum.get(idx)
+            # トラック番号だけが変わった場合に誤紐づけしないよう、タイトル正規化で一致確認
+            if candidate is not None:
+                cand_norm = norm_title(candidate, remove_version_info=False)
+                # 候補がインストファイルの場合は除外（ボーカル入りを優先）
+                if not self.is_inst(candidate) and available(candidate):
+                    # 完全一致、または類似度が一定以上（タイポ修正等）なら許容する
+                    if (cand_norm == orig_norm or not orig_norm
+                            or difflib.SequenceMatcher(None, cand_norm, orig_norm).ratio() > FUZZY_THRESHOLD):
+                        new_file = candidate
+                        print(f"[DEBUG][Step3][MATCH] strategy=tracknum idx={idx} candidate='{candidate}'")
+                    else:
+                        # 番号マッチは不一致と見なし、タイトルで改めて探す
+                        print(f"[DEBUG][Step3][MATCH] strategy=tracknum-rejected idx={idx} candidate='{candidate}' cand_norm='{cand_norm}'")
+                else:
+                    print(f"[DEBUG][Step3][MATCH] strategy=tracknum-skip idx={idx} candidate='{candidate}' reason=inst_or_assigned")
+
+        # タイトル正規化でマッチ（インストファイルを除外）
+        if not new_file:
+            candidate = self.by_title.get(orig_norm)
+            if candidate and available(candidate):
+                new_file = candidate
+                print(f"[DEBUG][Step3][MATCH] strategy=title-exact candidate='{candidate}'")
+            else:
+                # バージョン情報を除いたキーで一意に特定できる場合のみ採用
+                vocal_candidates_no_ver = [
+                    path for path in self.by_title_no_ver_vocal.get(orig_norm_no_ver, [])
+                    if available(path)
+                ]
+                if len(vocal_candidates_no_ver) == 1:
+                    new_file = vocal_candidates_no_ver[0]
+                    print(f"[DEBUG][Step3][MATCH] strategy=title-no-ver-unique candidate='{new_file}'")
+                elif len(vocal_candidates_no_ver) > 1:
+                    print(f"[WARN][Step3][MATCH] strategy=title-no-ver-ambiguous key='{orig_norm_no_ver}' candidates={vocal_candidates_no_ver}")
+
+        # トラック番号が付いている曲は、他番号への誤紐づけ防止のため fuzzy を抑制
+        if not new_file and original_track_num is None:
+            best_match, best_ratio = self.title_index.best(orig_norm, FUZZY_THRESHOLD, accept=available)
+            if best_match:
+                new_file = best_match
+                print(f"[DEBUG][Step3][MATCH] strategy=fuzzy best_match='{best_match}' best_ratio={best_ratio}")
+        elif not new_file:
+            print(f"[DEBUG][Step3][MATCH] strategy=fuzzy-skipped reason=has_track_number original='{original_file}'")
+
+        # マッチしない場合は、従来の安全策: 同名が存在すればそれを使う
+        if not new_file:
+            found_original = self.find_by_basename(original_file)
+            if found_original and not self.is_inst(found_original) and available(found_original):
+                new_file = found_original
+                print(f"[DEBUG][Step3][MATCH] strategy=basename candidate='{found_original}'")
+
+        # 全てのマッチングに失敗しても、現在の currentFile が有効（存在し、Instでない）なら尊重する
+        if not new_file:
+            old_curr = track.get("currentFile", "")
+            found_old = self.find_by_basename(old_curr)
+            if found_old and not self.is_inst(found_old) and available(found_old):
+                new_file = found_old
+                print(f"[DEBUG][Step3][MATCH] strategy=currentFile candidate='{found_old}'")
+            elif old_curr:
+                check_path = old_curr if os.path.isabs(old_curr) else os.path.join(self.base_dir, old_curr)
+                if os.path.exists(check_path) and not self.is_inst(old_curr):
+                    new_file = old_curr
+                    print(f"[DEBUG][Step3][MATCH] strategy=currentFile-direct candidate='{old_curr}'")
+
+        return new_file
+
+    def _find_inst_partner(self, track: dict, original_file: str, new_file: str, orig_norm_no_ver: str) -> Optional[str]:
+        # new_file のタイトルから探す（original_fileのタイポが修正されている可能性があるため）
+        new_norm_no_ver = norm_title(new_file, remove_version_info=True)
+
+        # まず完全一致で自動検出を試す（originalFile のタイトルでも一応試す）
+        auto_detected = self.by_title_inst.get(new_norm_no_ver) or self.by_title_inst.get(orig_norm_no_ver)
+        if not auto_detected:
+            # 類似タイトルをインストマップから探す
+            auto_detected, _ = self.title_inst_index.best(new_norm_no_ver, FUZZY_THRESHOLD)
+
+        if auto_detected:
+            print(f"[DEBUG][Step3][INST] 自動検出でinstrumentalFileを発見: title_key='{new_norm_no_ver}' -> '{auto_detected}'")
+            return auto_detected
+
+        # 自動検出できない場合、state.jsonに記録済みのinstrumentalFile（無ければcurrentInstFile）を使用
+        found_inst = self.find_by_basename(track.get("instrumentalFile")) \
+            or self.find_by_basename(track.get("currentInstFile"))
+        if found_inst:
+            print(f"[DEBUG][Step3][INST] 既存のinstrumentalFileを使用: {original_file} -> {found_inst}")
+            return found_inst
+
+        print(f"[DEBUG][Step3][INST] インストファイルが見つかりません: {original_file} (normalized: '{new_norm_no_ver}')")
+        # inst関連の古い情報をクリア
+        track.pop("instrumentalFile", None)
+        track.pop("currentInstFile", None)
+        return None
+
+    def _match_track(self, i: int, track: dict, result: MatchResult):
+        original_file = track.get("originalFile", "")
+        orig_norm = norm_title(original_file, remove_version_info=False)
+        orig_norm_no_ver = norm_title(original_file, remove_version_info=True)
+        original_track_num = track_number_from_name(original_file)
+        print(
+            f"[DEBUG][Step3][TRACK] idx={i} id={track.get('id','')} original='{original_file}' "
+            f"track_num={original_track_num} orig_norm='{orig_norm}' orig_norm_no_ver='{orig_norm_no_ver}'"
+        )
+
+        # originalFileがインストファイルそのものの場合、紐づけをスキップして独立表示
+        if self.is_inst(original_file):
+            found_original = self.find_by_basename(original_file)
+            if found_original:
+                final_filename = self._final_name(found_original)
+                track["finalFile"] = final_filename
+                track["currentFile"] = found_original
+                track["isInstrumental"] = True
+                result.processed_files.add(found_original)
+                result.rows.append(MatchRow("inst_only", found_original, final_filename))
+                print(f"[DEBUG] 独立インストトラック: {found_original} -> {final_filename}")
+            return
+
+        new_file = self._match_vocal(
+            track, original_file, orig_norm, orig_norm_no_ver, original_track_num, result.assigned_vocal_files
+        )
+
+        # それでも無ければ未検出（古い（誤った）情報を残さないようクリアする）
+        if not new_file:
+            result.rows.append(MatchRow("not_found", original_file))
+            print(f"[WARN][Step3][MATCH] strategy=not-found original='{original_file}'")
+            track["currentFile"] = ""
+            track.pop("isInstrumental", None)
+            track.pop("instrumentalFile", None)
+            track.pop("currentInstFile", None)
+            return
+
+        result.assigned_vocal_files.add(new_file)
+        result.processed_files.add(new_file)
+        print(f"[DEBUG][Step3][MATCH] selected original='{original_file}' -> current='{new_file}'")
+
+        inst_partner = self._find_inst_partner(track, original_file, new_file, orig_norm_no_ver)
+
+        # FLACファイルからタグ情報を読み取り、最終ファイル名を生成
+        final_filename = self._final_name(new_file)
+        is_new_file_inst = self.is_inst(new_file)
+
+        # 通常ケース: new_file を最終成果物とし、Instが別にあれば派生として表示
+        track["finalFile"] = final_filename
+        track["isInstrumental"] = is_new_file_inst
+
+        # new_fileがインストの場合は、inst_partnerは表示しない（自分自身がインスト）
+        if inst_partner and inst_partner != new_file and not is_new_file_inst:
+            # state.jsonには最終ファイル名、表示は現在のファイル名
+            inst_final_filename = self._final_name(inst_partner)
+            track["instrumentalFile"] = inst_final_filename
+            track["currentInstFile"] = inst_partner
+            track["hasInstrumental"] = True
+            track["currentFile"] = new_file
+            # instrumentalFileとして紐づいたファイルは独立トラックとして追加しない
+            result.processed_files.add(inst_partner)
+            result.rows.append(MatchRow("with_inst", original_file, final_filename, inst_partner))
+            print(f"[DEBUG][Step3][UI] 表示に追加: {original_file} -> {final_filename} + Inst: {inst_partner}")
+        else:
+            # new_file 自体が Inst の場合はバッジ表示、それ以外は通常表示
+            track["currentFile"] = new_file
+            kind = "inst_only" if is_new_file_inst else "normal"
+            result.rows.append(MatchRow(kind, original_file, final_filename))
+
+    @staticmethod
+    def _renumber_independent_inst(tracks: list[dict]):
+        """独立インストトラックの finalFile をボーカル入りトラックの後ろへ連番で振り直す"""
+        vocal_count = 0
+        independent_inst_tracks = []
+        for track in tracks:
+            if not track.get("finalFile"):
+                continue
+            if track.get("isInstrumental", False):
+                independent_inst_tracks.append(track)
+            else:
+                vocal_count += 1
+
+        next_track_num = vocal_count + 1
+        for inst_track in independent_inst_tracks:
+            m = _RE_FINAL_NUM.match(inst_track["finalFile"])
+            if not m:
+                continue
+            old_num, title_part = m.group(1), m.group(2)
+            new_num = str(next_track_num).zfill(2)
+            inst_track["finalFile"] = f"{new_num} {title_part}"
+            print(f"[DEBUG][Step3][INST] 独立インストトラックのトラック番号を再採番: {old_num} -> {new_num} ({title_part})")
+            next_track_num += 1
+
+
+def _benchmark(track_count: int, seed: int = 0) -> tuple[float, int, int]:
+    """
+    合成データで apply() を測る
+
+    Returns:
+        (所要時間（秒）, 実際の採点回数, 全件比較した場合の採点回数)
+    """
+    import contextlib
+    import io
+    import random
+
+    rng = random.Random(seed)
+    words = ["虹", "夜空", "約束", "未来", "Star", "Light", "Dream", "Heart", "Blue", "Road", "Wing",
+             "Memory", "Shine", "Song", "Days", "Rain", "Sky", "Love", "Smile", "Wish", "Moon", "Story"]
+
+    def make_title() -> str:
+        return " ".join(rng.sample(words, 3))
+
+    files = []
+    tracks = []
+    for n in range(1, track_count + 1):
+        title = make_title()
+        files.append(f"{n:02d} {title}.flac")
+        files.append(f"{n:02d} {title} (Inst).flac")
+        tracks.append({"id": f"track_{n:03d}", "originalFile": f"{n:02d}-{title}.flac"})
+    # 番号なし・表記揺れのある曲（fuzzy 経路）
+    for n in range(track_count // 4):
+        title = make_title()
+        files.append(f"{title} (Remix).flac")
+        tracks.append({"id": f"bonus_{n:03d}", "originalFile": f"{title.lower()}!.flac"})
+
+    album = AlbumState({"tracks": tracks})
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        matcher = TrackMatcher(files)
+        matcher.apply(album)
+    elapsed = time.perf_counter() - started
+    scored = matcher.title_index.scored + matcher.title_inst_index.scored
+    fuzzy_queries = track_count // 4
+    naive = fuzzy_queries * (len(matcher.title_index) + len(matcher.title_inst_index))
+    return elapsed, scored, naive
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    import argparse
+    parser = argparse.ArgumentParser(description="トラック紐づけエンジンのベンチマーク")
+    parser.add_argument("--bench", type=int, default=100, help="合成するトラック数")
+    args = parser.parse_args(argv)
+    elapsed, scored, naive = _benchmark(args.bench)
+    print(f"[INFO] tracks={args.bench} elapsed={elapsed:.3f}s scored={scored} (全件比較なら約 {naive})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
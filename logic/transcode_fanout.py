@@ -0,0 +1,359 @@
+"""
+1回のデコードを複数エンコーダーへ配る（Step4 AAC / Step5 Opus の同時変換）
+
+各トラックの FLAC を flac -d -c で1度だけ WAV にデコードし、その標準出力を
+AAC・Opus（将来の出力プロファイルも）のエンコーダーの標準入力へ同時に流す。
+ソースの読み込みとデコードはトラックあたり1回で済む。
+
+メモリはエンコーダーごとの有限キュー（チャンク数 × チャンクサイズ）で上限を決める。
+遅いエンコーダーのキューが埋まると読み取り側が待ち、デコーダーもパイプで止まるので、
+他のエンコーダーの分が際限なく溜まることはない（全体が一番遅いエンコーダーの速さに揃う）。
+途中で終了したエンコーダーはその場で外し、残りのエンコーダーは続行する。
+
+出力の一時ファイル・スキップ判定・キャンセルは logic/encoders.py の EncodeRunner と同じ。
+"""
+import os
+import queue
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Optional
+
+from .encoders import (
+    ENCODE_TIMEOUT, CommandEncoder, EncodeJob, EncodeResult, Encoder,
+    default_worker_count, is_up_to_date, partial_path, remove_quietly,
+)
+from .tag_writer import copy_flac_tags
+
+
+# パイプから読み取るチャンクサイズと、エンコーダーごとに溜めてよいチャンク数
+CHUNK_SIZE = 64 * 1024
+QUEUE_CHUNKS = 16
+
+# 変換後に FLAC のタグをコピーできる出力（tag_writer.copy_flac_tags が扱える形式）
+TAG_COPY_EXTENSIONS = (".m4a", ".mp4", ".opus", ".ogg", ".oga")
+
+# エラー出力は末尾だけ残す
+STDERR_TAIL = 4096
+
+
+class FanoutTarget:
+    """1トラック分の出力先1つ（エンコーダー + 出力パス）"""
+
+    __slots__ = ("encoder", "job")
+
+    def __init__(self, encoder: Encoder, job: EncodeJob):
+        self.encoder = encoder
+        self.job = job
+
+
+class FanoutJob:
+    """1トラック分（入力 FLAC 1つ → 出力複数）"""
+
+    __slots__ = ("input_path", "targets")
+
+    def __init__(self, input_path: str, targets: Optional[list[FanoutTarget]] = None):
+        self.input_path = input_path
+        self.targets: list[FanoutTarget] = list(targets or [])
+
+
+def group_jobs(jobs_by_encoder: list[tuple[Encoder, list[EncodeJob]]]) -> list[FanoutJob]:
+    """エンコーダーごとのジョブを入力ファイル単位にまとめる（入力の出現順を保つ）"""
+    grouped: dict[str, FanoutJob] = {}
+    for encoder, jobs in jobs_by_encoder:
+        for job in jobs:
+            key = os.path.normcase(os.path.abspath(job.input_path))
+            fanout = grouped.get(key)
+            if fanout is None:
+                fanout = grouped[key] = FanoutJob(job.input_path)
+            fanout.targets.append(FanoutTarget(encoder, job))
+    return list(grouped.values())
+
+
+class FlacDecoder:
+    """flac -d -c で WAV を標準出力に書くデコーダー"""
+
+    def __init__(self, flac_path: str):
+        self.flac_path = flac_path
+
+    def is_available(self) -> bool:
+        return bool(self.flac_path) and os.path.exists(self.flac_path)
+
+    def build_command(self, input_path: str) -> list[str]:
+        return [self.flac_path, "-d", "-c", "-s", input_path]
+
+
+class _EncoderSink:
+    """
+    エンコーダー1つ分の書き込み口
+
+    有限キューを書き込みスレッドが消費して標準入力に書く。
+    エンコーダーが途中で終了したら以降のチャンクは読み捨てる（読み取り側を止めないため）。
+    """
+
+    def __init__(self, target: FanoutTarget, proc: subprocess.Popen, stderr_file, partial: str):
+        self.target = target
+        self.proc = proc
+        self.stderr_file = stderr_file
+        self.partial = partial
+        self.broken = False
+        self.queue: queue.Queue = queue.Queue(maxsize=QUEUE_CHUNKS)
+        self.thread = threading.Thread(target=self._pump, name="fanout-writer", daemon=True)
+        self.thread.start()
+
+    def put(self, chunk: Optional[bytes]):
+        """チャンクを渡す（キューが一杯なら空くまで待つ。None で終端）"""
+        self.queue.put(chunk)
+
+    def _pump(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                break
+            if self.broken:
+                continue
+            try:
+                self.proc.stdin.write(chunk)
+            except (BrokenPipeError, OSError, ValueError):
+                self.broken = True
+        try:
+            self.proc.stdin.close()
+        except (BrokenPipeError, OSError, ValueError):
+            pass
+
+    def stderr_tail(self) -> str:
+        try:
+            self.stderr_file.seek(0, os.SEEK_END)
+            size = self.stderr_file.tell()
+            self.stderr_file.seek(max(0, size - STDERR_TAIL))
+            return self.stderr_file.read().decode('utf-8', errors='ignore').strip()
+        except Exception:
+            return ""
+
+
+class FanoutTranscoder:
+    """
+    デコード1回・エンコード複数の並列変換
+
+    Args:
+        decoder: FlacDecoder
+        jobs: FanoutJob のリスト（group_jobs で作る）
+        max_workers: 同時に処理するトラック数（0 / None ならコア数）
+        working_dir: 外部ツールの作業ディレクトリ
+        skip_existing: 入力より新しい出力が既にあればその出力はスキップする
+    """
+
+    def __init__(self, decoder: FlacDecoder, jobs: list[FanoutJob], max_workers: Optional[int] = None,
+                 working_dir: Optional[str] = None, skip_existing: bool = True):
+        self.decoder = decoder
+        self.jobs = list(jobs)
+        self.max_workers = max_workers or default_worker_count()
+        self.working_dir = working_dir
+        self.skip_existing = skip_existing
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._procs: set[subprocess.Popen] = set()
+
+    def cancel(self):
+        """未着手のトラックを取りやめ、実行中のデコーダー・エンコーダーを終了させる"""
+        self._cancel.set()
+        with self._lock:
+            procs = list(self._procs)
+        for proc in procs:
+            try:
+                proc.terminate()
+            except Exception:
+                pass
+
+    def is_cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def run(self, progress_callback: Optional[Callable[[int, int, list[EncodeResult]], None]] = None) -> list[EncodeResult]:
+        """
+        全トラックを処理して出力ごとの結果を返す（jobs・targets と同じ順）
+
+        Args:
+            progress_callback: 1トラック終わるごとに (完了数, 総数, そのトラックの結果) で呼ばれる
+        """
+        total = len(self.jobs)
+        per_job: list[list[EncodeResult]] = [[] for _ in range(total)]
+        if not total:
+            return []
+
+        workers = max(1, min(self.max_workers, total))
+        outputs = sum(len(job.targets) for job in self.jobs)
+        print(f"[INFO] 同時変換開始: {total} トラック → {outputs} ファイル (同時実行数={workers})")
+        done = 0
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fanout") as pool:
+            futures = {pool.submit(self._process, job): i for i, job in enumerate(self.jobs)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results = future.result()
+                except Exception as e:
+                    results = [EncodeResult(t.job, False, f"予期しないエラー: {e}") for t in self.jobs[i].targets]
+                per_job[i] = results
+                done += 1
+                if progress_callback:
+                    progress_callback(done, total, results)
+        return [r for results in per_job for r in results]
+
+    # ------------------------
+    # 1トラック分の処理（ワーカースレッド）
+    # ------------------------
+    def _process(self, job: FanoutJob) -> list[EncodeResult]:
+        results: dict[int, EncodeResult] = {}
+        pending: list[tuple[int, FanoutTarget]] = []
+        for i, target in enumerate(job.targets):
+            if self.is_cancelled():
+                results[i] = EncodeResult(target.job, False, "キャンセル", cancelled=True)
+            elif self.skip_existing and is_up_to_date(job.input_path, target.job.output_path):
+                results[i] = EncodeResult(target.job, True, "変換済み", skipped=True)
+            else:
+                pending.append((i, target))
+
+        if pending:
+            for i, result in self._transcode(job.input_path, pending).items():
+                results[i] = result
+        return [results[i] for i in range(len(job.targets))]
+
+    def _transcode(self, input_path: str, pending: list[tuple[int, FanoutTarget]]) -> dict[int, EncodeResult]:
+        """デコーダー1つとエンコーダー複数をパイプでつなぎ、出力ごとの結果を返す"""
+        if not self.decoder.is_available():
+            message = f"デコーダーが見つかりません: {self.decoder.flac_path}"
+            return {i: EncodeResult(t.job, False, message) for i, t in pending}
+
+        source = os.path.abspath(input_path)
+        results: dict[int, EncodeResult] = {}
+        sinks: dict[int, _EncoderSink] = {}
+        decoder_proc = None
+        decoder_err = tempfile.TemporaryFile()
+        try:
+            # エンコーダーを先に起動（失敗したものはそこで結果を確定）
+            for i, target in pending:
+                output_path = os.path.abspath(target.job.output_path)
+                partial = partial_path(output_path)
+                if not target.encoder.is_available():
+                    results[i] = EncodeResult(target.job, False, f"エンコーダーが見つかりません: {target.encoder!r}")
+                    continue
+                try:
+                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                    remove_quietly(partial)
+                    err = tempfile.TemporaryFile()
+                    proc = self._popen(target.encoder.build_command("-", partial, source),
+                                       stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=err)
+                except Exception as e:
+                    results[i] = EncodeResult(target.job, False, f"実行エラー: {e}")
+                    continue
+                sinks[i] = _EncoderSink(target, proc, err, partial)
+
+            if sinks:
+                try:
+                    decoder_proc = self._popen(self.decoder.build_command(source),
+                                               stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=decoder_err)
+                except Exception as e:
+                    decoder_proc = None
+                    decode_error = f"デコーダー実行エラー: {e}"
+                else:
+                    decode_error = self._pump(decoder_proc, list(sinks.values()))
+                # 終端を送ってエンコーダーの終了を待つ（デコード失敗時も標準入力は閉じる）
+                for sink in sinks.values():
+                    sink.put(None)
+                for i, sink in sinks.items():
+                    results[i] = self._finish(sink, source, decode_error)
+        finally:
+            for sink in sinks.values():
+                self._discard(sink.proc)
+                sink.stderr_file.close()
+            if decoder_proc is not None:
+                self._discard(decoder_proc)
+            decoder_err.close()
+        return results
+
+    def _pump(self, decoder_proc: subprocess.Popen, sinks: list[_EncoderSink]) -> str:
+        """デコーダーの出力を全エンコーダーに配る。デコードに失敗した場合はエラーメッセージを返す"""
+        stdout = decoder_proc.stdout
+        try:
+            while not self.is_cancelled():
+                chunk = stdout.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                live = [s for s in sinks if not s.broken]
+                if not live:
+                    break  # 全エンコーダーが終了した
+                for sink in live:
+                    sink.put(chunk)
+        finally:
+            stdout.close()
+        try:
+            decoder_proc.wait(timeout=ENCODE_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            decoder_proc.kill()
+            decoder_proc.wait()
+            return "タイムアウト: デコードが終了しませんでした"
+        if self.is_cancelled():
+            return "キャンセル"
+        if decoder_proc.returncode != 0 and not all(s.broken for s in sinks):
+            return f"デコード失敗: 終了コード {decoder_proc.returncode}"
+        return ""
+
+    def _finish(self, sink: _EncoderSink, source: str, decode_error: str) -> EncodeResult:
+        """エンコーダーの終了を待ち、成功なら一時ファイルを本来の名前に置き換える"""
+        target = sink.target
+        output_path = os.path.abspath(target.job.output_path)
+        sink.thread.join()
+        try:
+            sink.proc.wait(timeout=ENCODE_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            sink.proc.kill()
+            sink.proc.wait()
+            remove_quietly(sink.partial)
+            return EncodeResult(target.job, False, f"タイムアウト: エンコードに{ENCODE_TIMEOUT // 60}分以上かかりました")
+
+        if self.is_cancelled():
+            remove_quietly(sink.partial)
+            return EncodeResult(target.job, False, "キャンセル", cancelled=True)
+        if decode_error:
+            remove_quietly(sink.partial)
+            return EncodeResult(target.job, False, decode_error)
+        if sink.proc.returncode != 0 or not os.path.isfile(sink.partial):
+            remove_quietly(sink.partial)
+            message = sink.stderr_tail() or f"終了コード {sink.proc.returncode}"
+            print(f"[ERROR] {target.encoder.name} エンコード失敗: {target.job.label}: {message}")
+            return EncodeResult(target.job, False, message)
+
+        try:
+            # 標準入力の WAV にはタグが無い。{source} から読めないエンコーダーの出力はここでコピーする
+            # （表紙はアートワークのステップで最適化したものを入れるので、元 FLAC の大きな画像は複製しない）
+            reads_source = isinstance(target.encoder, CommandEncoder) and target.encoder.reads_source_tags
+            if not reads_source and output_path.lower().endswith(TAG_COPY_EXTENSIONS):
+                report = copy_flac_tags(source, sink.partial, include_cover=False)
+                if not report.ok:
+                    raise OSError(f"タグのコピーに失敗: {report.error}")
+            os.replace(sink.partial, output_path)
+        except Exception as e:
+            remove_quietly(sink.partial)
+            print(f"[ERROR] {target.encoder.name} 出力の仕上げに失敗: {target.job.label}: {e}")
+            return EncodeResult(target.job, False, str(e))
+        return EncodeResult(target.job, True)
+
+    def _popen(self, args: list[str], **kwargs) -> subprocess.Popen:
+        proc = subprocess.Popen(args, cwd=self.working_dir, **kwargs)
+        with self._lock:
+            self._procs.add(proc)
+        # キャンセル直前に起動した場合に備えて再確認
+        if self.is_cancelled():
+            proc.terminate()
+        return proc
+
+    def _discard(self, proc: subprocess.Popen):
+        """終わっていなければ終了させて管理対象から外す"""
+        if proc.poll() is None:
+            try:
+                proc.kill()
+                proc.wait()
+            except Exception:
+                pass
+        with self._lock:
+            self._procs.discard(proc)
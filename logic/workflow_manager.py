@@ -35,6 +35,9 @@ class WorkflowManager:
         Returns:
             読み込み成功時 True
         """
+        # 保留中の変更を書き出してから切り替える
+        if self.state:
+            self.state.flush()
         self.current_album_folder = album_folder
         self.state = StateManager(album_folder)
         return self.state.load()
@@ -66,17 +69,18 @@ class WorkflowManager:
         # 最大ステップチェック（Step 7で完了）
         if next_step > 7:
             print(f"[DEBUG] advance_step: Step 7 完了、COMPLETED 状態へ")
-            self.state.set_status("COMPLETED")
-            self.state.save()  # 明示的に保存
-            return True
-        
-        # ステップを進めて保存
-        result = self.state.set_current_step(next_step)
+            with self.state.transaction():
+                self.state.set_status("COMPLETED")
+            return not self.state.is_dirty()
+        
+        # ステップを進めて保存（保留中の変更と合わせて1回で書き込む）
+        with self.state.transaction():
+            self.state.set_current_step(next_step)
+        result = not self.state.is_dirty()
         if result:
-            self.state.save()  # 明示的に保存
             print(f"[DEBUG] advance_step: Step {next_step} に進みました（保存完了）")
         else:
-            print(f"[ERROR] advance_step: set_current_step が失敗しました")
+            print(f"[ERROR] advance_step: state.json の保存に失敗しました")
         
         return result
     
@@ -167,11 +171,20 @@ class WorkflowManager:
         """アルバムの表示名を取得"""
         if not self.state:
             return "Unknown"
-        
-        step = self.get_current_step()
-        status = self.state.get_status()
-        album_name = self.state.get_album_name()
-        
+        return self.format_album_display_name(self.state.state)
+
+    @classmethod
+    def format_album_display_name(cls, state: dict) -> str:
+        """
+        state.json の内容からアルバムの表示名を生成
+
+        アルバムリストの更新時に WorkflowManager を都度生成しなくて済むよう、
+        読み込み済みの state 辞書だけで組み立てる。
+        """
+        step = state.get("currentStep", 1)
+        status = state.get("status", "WAITING_USER")
+        album_name = state.get("albumName", "Unknown Album")
+
         status_icon = ""
         if status == "ERROR":
             status_icon = "⚠️ "
@@ -179,5 +192,5 @@ class WorkflowManager:
             status_icon = "✓ "
         
         # STEP_NAMESの最大値を使用（動的に取得）
-        max_step = max(self.STEP_NAMES.keys())
+        max_step = max(cls.STEP_NAMES.keys())
         return f"{status_icon}[Step {step}/{max_step}] {album_name}"
@@ -131,4 +131,7 @@ def main():
 
 
 if __name__ == "__main__":
+    # ReplayGain 測定のプロセスプール（spawn）を実行ファイル化した場合でも動かすため
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
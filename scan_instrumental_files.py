@@ -5,9 +5,9 @@
 _flac_src/アルバム名 フォルダ内の (Inst).flac ファイルを検出し、対応する元トラックに紐づけます。
 """
 import os
-import json
 import sys
 from logic.utils import sanitize_foldername
+from logic.state_manager import StateManager
 
 
 def _sanitize_foldername(name: str) -> str:
@@ -28,13 +28,12 @@ def scan_instrumental_files(album_folder):
         print(f"[ERROR] state.json が見つかりません: {state_path}")
         return False
     
-    # state.json を読み込み
-    try:
-        with open(state_path, 'r', encoding='utf-8') as f:
-            state = json.load(f)
-    except Exception as e:
-        print(f"[ERROR] state.json の読み込みに失敗: {e}")
+    # state.json を読み込み（未畳み込みのジャーナルも反映される）
+    state_manager = StateManager(album_folder)
+    if not state_manager.load():
+        print(f"[ERROR] state.json の読み込みに失敗: {state_path}")
         return False
+    state = state_manager.state
     
     # アルバム名を取得してサニタイズ
     album_name = state.get("albumName", "Unknown")
@@ -104,14 +103,11 @@ def scan_instrumental_files(album_folder):
     
     # state.json を保存
     if updated_count > 0:
-        try:
-            with open(state_path, 'w', encoding='utf-8') as f:
-                json.dump(state, f, ensure_ascii=False, indent=2)
+        if state_manager.save():
             print(f"\n[SUCCESS] state.json を更新しました ({updated_count} トラック)")
             return True
-        except Exception as e:
-            print(f"\n[ERROR] state.json の保存に失敗: {e}")
-            return False
+        print(f"\n[ERROR] state.json の保存に失敗: {state_path}")
+        return False
     else:
         print(f"\n[INFO] 更新するトラックがありませんでした")
         return False